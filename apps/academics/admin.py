@@ -1,5 +1,6 @@
 # apps/academics/admin.py
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
 
 # ────────────────────────────────────────────────────────────────────────────────
 # Soporte opcional para import-export
@@ -17,6 +18,10 @@ except Exception:  # import-export no instalado
 # Import del módulo de modelos completo (para poder preguntar si existen)
 # ────────────────────────────────────────────────────────────────────────────────
 from . import models as m  # p. ej. m.Course, m.CourseGroup, etc.
+from .grade_history import name_or_id, with_names
+from .registry import registry
+from .services_capacity import shard_group, unshard_group
+from .views_import import enqueue_upload, upload_form
 
 
 # ────────────────────────────────────────────────────────────────────────────────
@@ -31,13 +36,30 @@ def safe_list_display(Model, candidates):
     en el modelo, para que el admin no reviente por AttributeError.
     """
     safe = []
-    # Campos del modelo (FKs incluidos)
-    field_names = {f.name for f in Model._meta.get_fields()}
+    # Campos del modelo (FKs incluidos), resueltos una vez en el registro
+    field_names = registry.field_names(Model)
     for n in candidates:
         if n in field_names or hasattr(Model, n):
             safe.append(n)
     return tuple(safe)
 
+class QueuedImportMixin:
+    """
+    El botón Importar de import-export encola el CSV (jobs.py) en vez de
+    procesarlo dentro de la petición; redirige al estado del trabajo.
+    """
+    import_job_kind = None
+    import_job_columns = ""
+
+    def import_action(self, request, **kwargs):
+        if not self.has_import_permission(request):
+            raise PermissionDenied
+        if request.method == "POST" and "import_file" in request.FILES:
+            return enqueue_upload(request, self.import_job_kind, request.FILES["import_file"])
+        title = f"Importar {self.model._meta.verbose_name_plural} (en segundo plano)"
+        return upload_form(request, title, self.import_job_columns, field="import_file")
+
+
 def register_safe(model_name: str, admin_cls=None):
     """
     Registra el modelo en el admin si existe.
@@ -77,11 +99,23 @@ if model_exists("Course"):
 
 # CourseGroup
 if model_exists("CourseGroup"):
+    class SeatShardInline(admin.TabularInline):
+        # Solo lectura: los fragmentos los mueven el motor de capacidad y rebalance()
+        model = m.SeatShard
+        fields = readonly_fields = ("index", "capacity", "taken")
+        extra = 0
+        can_delete = False
+
+        def has_add_permission(self, request, obj=None):
+            return False
+
     class CourseGroupAdmin(admin.ModelAdmin):
+        inlines = (SeatShardInline,)
         def get_list_display(self, request):
             Model = m.CourseGroup
-            # incluye 'available_slots' si existe como @property en el modelo
-            candidates = ("course", "section", "is_lab", "capacity", "enrolled_count", "available_slots")
+            # enrolled_count/available_slots son columnas denormalizadas (sin N+1)
+            # (en grupos calientes enrolled_count se pone al día en el barrido)
+            candidates = ("course", "section", "is_lab", "capacity", "enrolled_count", "available_slots", "is_hot")
             return safe_list_display(Model, candidates)
 
         def get_search_fields(self, request):
@@ -91,9 +125,22 @@ if model_exists("CourseGroup"):
 
         def get_list_filter(self, request):
             Model = m.CourseGroup
-            candidates = ("is_lab", "course")
+            candidates = ("is_lab", "is_hot", "course")
             return safe_list_display(Model, candidates)
 
+        # Grupos calientes: marcarlos antes de abrir la ventana de matrícula
+        actions = ("mark_hot", "unmark_hot")
+
+        @admin.action(description="Marcar como caliente (repartir cupo en fragmentos)")
+        def mark_hot(self, request, queryset):
+            n = sum(1 for pk in queryset.filter(is_hot=False).values_list("pk", flat=True) if shard_group(pk))
+            self.message_user(request, f"Grupos marcados como calientes: {n}.")
+
+        @admin.action(description="Quitar marca de caliente (volver a contador único)")
+        def unmark_hot(self, request, queryset):
+            n = sum(1 for pk in queryset.filter(is_hot=True).values_list("pk", flat=True) if unshard_group(pk))
+            self.message_user(request, f"Grupos devueltos a contador único: {n}.")
+
     admin.site.register(m.CourseGroup, CourseGroupAdmin)
 
 # Enrollment (con import-export si está)
@@ -114,9 +161,11 @@ if EnrollmentModel:
     else:
         EnrollmentResource = None
 
-    class EnrollmentAdmin(ImportExportModelAdmin):
+    class EnrollmentAdmin(QueuedImportMixin, ImportExportModelAdmin):
         if EnrollmentResource:
             resource_class = EnrollmentResource
+        import_job_kind = "enrollments"
+        import_job_columns = "student__username,course_group__course__code,course_group__section"
 
         def get_list_display(self, request):
             Model = m.Enrollment
@@ -205,9 +254,11 @@ if GradeModel:
     else:
         GradeResource = None
 
-    class GradeAdmin(ImportExportModelAdmin):
+    class GradeAdmin(QueuedImportMixin, ImportExportModelAdmin):
         if GradeResource:
             resource_class = GradeResource
+        import_job_kind = "grades"
+        import_job_columns = "student_username,assessment,points,course_code,section"
 
         def get_list_display(self, request):
             Model = m.Grade
@@ -220,7 +271,7 @@ if GradeModel:
             fields = ["student__username"]
             Assess = model_exists("Assessment")
             if Assess:
-                assess_field_names = {f.name for f in Assess._meta.get_fields()}
+                assess_field_names = registry.field_names(Assess)
                 if "title" in assess_field_names:
                     fields.append("assessment__title")
                 if "name" in assess_field_names:
@@ -232,7 +283,7 @@ if GradeModel:
             filters = []
             Assess = model_exists("Assessment")
             if Assess:
-                assess_field_names = {f.name for f in Assess._meta.get_fields()}
+                assess_field_names = registry.field_names(Assess)
                 if "kind" in assess_field_names:
                     filters.append("assessment__kind")
             # si CourseGroup y Course existen, intentamos el code
@@ -403,6 +454,76 @@ if model_exists("CapReservation"):
             return safe_list_display(m.CapReservation, ("course_group", "student", "term"))
     admin.site.register(m.CapReservation, CapReservationAdmin)
 
+if model_exists("FinalGrade"):
+    class FinalGradeAdmin(admin.ModelAdmin):
+        # Solo lectura: la mantienen las señales de notas y rebuild_final_grades
+        def get_list_display(self, request):
+            return safe_list_display(m.FinalGrade, ("student", "course_group", "score", "updated_at"))
+        def get_search_fields(self, request):
+            return safe_list_display(m.FinalGrade, ("student__username", "course_group__course__code"))
+        def get_readonly_fields(self, request, obj=None):
+            return ("student", "course_group", "score", "updated_at")
+        def has_add_permission(self, request):
+            return False
+    admin.site.register(m.FinalGrade, FinalGradeAdmin)
+
+if model_exists("GradeEvent"):
+    class GradeEventAdmin(admin.ModelAdmin):
+        # Solo lectura y sin borrar: el historial solo crece (grade_history.py)
+        # Alumno y evaluación por subconsulta, no por JOIN: los eventos de
+        # borrados siguen en la lista, con el id
+        list_display = ("created_at", "student_display", "assessment_display", "old_score", "new_score", "source", "actor", "import_job")
+        list_filter = ("source",)
+        search_fields = ("student__username",)
+        date_hierarchy = "created_at"
+        list_select_related = ("actor",)
+        def get_queryset(self, request):
+            return with_names(super().get_queryset(request))
+        @admin.display(description="Alumno", ordering="student_id")
+        def student_display(self, obj):
+            return name_or_id(obj.student_name, obj.student_id)
+        @admin.display(description="Evaluación", ordering="assessment_id")
+        def assessment_display(self, obj):
+            return name_or_id(obj.assessment_name, obj.assessment_id)
+        def get_readonly_fields(self, request, obj=None):
+            return [f.name for f in m.GradeEvent._meta.fields]
+        def has_add_permission(self, request):
+            return False
+        def has_delete_permission(self, request, obj=None):
+            return False
+    admin.site.register(m.GradeEvent, GradeEventAdmin)
+
+if model_exists("ImportJob"):
+    class ImportJobAdmin(admin.ModelAdmin):
+        # Solo lectura: los crean las vistas de carga y los mueve run_import_worker
+        list_display = ("id", "kind", "status", "rows_done", "rows_total", "rows_skipped", "created_by", "created_at", "finished_at")
+        list_filter = ("status", "kind")
+        search_fields = ("created_by__username",)
+        date_hierarchy = "created_at"
+        actions = ("requeue",)
+        def get_readonly_fields(self, request, obj=None):
+            return [f.name for f in m.ImportJob._meta.fields]
+        def has_add_permission(self, request):
+            return False
+
+        @admin.action(description="Reencolar (fallidos)")
+        def requeue(self, request, queryset):
+            n = queryset.filter(status=m.ImportJob.FAILED).update(status=m.ImportJob.QUEUED, attempts=0, worker="", message="")
+            self.message_user(request, f"Importaciones reencoladas: {n}.")
+    admin.site.register(m.ImportJob, ImportJobAdmin)
+
+if model_exists("WaitlistEntry"):
+    class WaitlistEntryAdmin(admin.ModelAdmin):
+        def get_list_display(self, request):
+            return safe_list_display(m.WaitlistEntry, ("course_group", "student", "status", "created_at", "offered_until"))
+        def get_search_fields(self, request):
+            return safe_list_display(m.WaitlistEntry, ("student__username", "course_group__course__code", "course_group__section"))
+        def get_list_filter(self, request):
+            return safe_list_display(m.WaitlistEntry, ("status",))
+        def get_autocomplete_fields(self, request):
+            return safe_list_display(m.WaitlistEntry, ("course_group", "student"))
+    admin.site.register(m.WaitlistEntry, WaitlistEntryAdmin)
+
 if model_exists("PaymentOrder"):
     class PaymentOrderAdmin(admin.ModelAdmin):
         def get_list_display(self, request):
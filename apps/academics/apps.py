@@ -4,3 +4,8 @@ class AcademicsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.academics"
     verbose_name = "Académico"
+
+    def ready(self):
+        from . import signals  # noqa: F401  (conecta receptores)
+        from .registry import registry
+        registry.build()
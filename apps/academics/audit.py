@@ -0,0 +1,110 @@
+# apps/academics/audit.py
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections
+
+from .registry import registry
+
+logger = logging.getLogger(__name__)
+
+# ────────────────────────────────────────────────────────────────
+# Auditoría de intentos de matrícula (EnrollmentAttempt)
+#
+# Los intentos no se insertan dentro de la petición: se acumulan en memoria
+# por proceso y se escriben con bulk_create cuando el búfer llega a
+# AUDIT_BUFFER_SIZE o cada AUDIT_FLUSH_INTERVAL segundos (hilo daemon), y
+# una última vez al terminar el proceso. Con AUDIT_SYNC=True se escribe en
+# el acto (tests, shell, comandos cortos). Si el proceso muere sin salir
+# limpio se pierde a lo más un búfer: es auditoría, no matrícula.
+# ────────────────────────────────────────────────────────────────
+
+
+def _conf(name: str, default):
+    return getattr(settings, f"AUDIT_{name}", default)
+
+
+class AttemptSink:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer: list = []
+        self._thread = None
+        self._wake = threading.Event()
+        self._fields = None
+
+    # Campos opcionales: se resuelven una vez, no en cada intento
+    def _optional_fields(self, Model) -> tuple[bool, bool]:
+        if self._fields is None:
+            self._fields = (registry.has_field(Model, "payload"), registry.has_field(Model, "result"))
+        return self._fields
+
+    def _build(self, Model, user, term, action, error=None, payload=None, result=None):
+        has_payload, has_result = self._optional_fields(Model)
+        kwargs = {"student": user, "term": term, "action": action}
+        if has_payload:
+            kwargs["payload"] = payload
+        if has_result:
+            kwargs["result"] = {"error": error} if error else result
+        return Model(**kwargs)
+
+    def record(self, user, term, actions, error: str | None = None, payload=None, result=None):
+        """Encola uno o varios intentos (acciones) del mismo alumno."""
+        Model = registry.model("academics", "EnrollmentAttempt")
+        if Model is None or not actions:
+            return
+        rows = [self._build(Model, user, term, a, error, payload, result) for a in actions]
+        if _conf("SYNC", False):
+            self._write(Model, rows)
+            return
+        with self._lock:
+            self._buffer.extend(rows)
+            full = len(self._buffer) >= _conf("BUFFER_SIZE", 200)
+        self._ensure_thread()
+        if full:
+            # Escribe el hilo, no la petición (ni su transacción)
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Escribe lo acumulado en un solo bulk_create. Retorna filas escritas."""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return 0
+        return self._write(type(rows[0]), rows)
+
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def _write(self, Model, rows) -> int:
+        try:
+            Model.objects.bulk_create(rows, batch_size=_conf("BUFFER_SIZE", 200))
+            return len(rows)
+        except Exception:
+            # La auditoría nunca interrumpe la matrícula
+            logger.exception("No se pudieron guardar %s intentos de matrícula", len(rows))
+            return 0
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="audit-flusher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(_conf("FLUSH_INTERVAL", 2.0))
+            self._wake.clear()
+            if self._buffer:
+                self.flush()
+                # El hilo tiene su propia conexión; no la dejamos abierta entre pasadas
+                connections.close_all()
+
+
+attempt_sink = AttemptSink()
+atexit.register(attempt_sink.flush)
@@ -0,0 +1,96 @@
+# apps/academics/catalog.py
+from __future__ import annotations
+
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import CourseGroup
+from .registry import registry
+
+# ────────────────────────────────────────────────────────────────
+# Catálogo de ofertas
+#
+# Lo que casi no cambia durante el término (curso, sección, docente,
+# créditos) se guarda como una lista de dicts en la caché de Django, por
+# término y versión. Guardar/borrar un Course, o cambiar la parte de
+# catálogo de un CourseGroup, cambia la versión (signals.py). Los cupos
+# NO están en la foto: vienen de seat_overlay(), una consulta por página
+# sobre las columnas denormalizadas, así que matricular o cambiar la
+# capacidad no obliga a reconstruir el catálogo.
+# ────────────────────────────────────────────────────────────────
+VERSION_KEY = "academics:catalog:version"
+
+# Campos de CourseGroup que forman parte de la foto (no los cupos)
+CATALOG_FIELDS = ("course_id", "section", "is_lab")
+
+
+def catalog_version() -> str:
+    return cache.get_or_set(VERSION_KEY, lambda: uuid.uuid4().hex, timeout=None)
+
+
+def invalidate(*args, **kwargs):
+    """Receptor de señales: nueva versión tras el commit."""
+    transaction.on_commit(lambda: cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None))
+
+
+def catalog_snapshot(term) -> list[dict]:
+    """Foto del catálogo del término (o de todos los grupos si no hay Term)."""
+    term_key = getattr(term, "pk", None) or "all"
+    key = f"academics:catalog:{term_key}:{catalog_version()}"
+    rows = cache.get(key)
+    if rows is None:
+        qs = CourseGroup.objects.all()
+        if term is not None and registry.has_field(CourseGroup, "term"):
+            qs = qs.filter(term=term)
+        rows = list(
+            qs.order_by("course__code", "section").values(
+                "id",
+                "section",
+                "is_lab",
+                "course__code",
+                "course__name",
+                "course__credits",
+                "course__teacher__username",
+            )
+        )
+        cache.set(key, rows, timeout=getattr(settings, "CATALOG_CACHE_TTL", 3600))
+    return rows
+
+
+def filter_by_code(rows: list[dict], code: str) -> list[dict]:
+    """Filtra por prefijo de código de curso (sin distinguir mayúsculas)."""
+    code = (code or "").strip().upper()
+    if not code:
+        return rows
+    return [r for r in rows if r["course__code"].upper().startswith(code)]
+
+
+def seat_overlay(group_ids) -> dict[int, dict]:
+    """{id: {capacity, enrolled, available}} con una sola consulta (grupos calientes: suma de fragmentos)."""
+    rows = CourseGroup.objects.filter(pk__in=list(group_ids)).with_seat_totals().values_list(
+        "pk", "capacity", "seats_taken"
+    )
+    return {
+        pk: {"capacity": capacity, "enrolled": taken, "available": max(capacity - taken, 0)}
+        for pk, capacity, taken in rows
+    }
+
+
+def page_etag(*parts) -> str:
+    """ETag débil a partir de la versión del catálogo, filtros y cupos de la página."""
+    digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+    return f'W/"{digest}"'
+
+
+def catalog_changed(instance) -> bool:
+    """True si un CourseGroup existente cambió algún campo de la foto."""
+    if instance.pk is None:
+        return True
+    old = CourseGroup.objects.filter(pk=instance.pk).values(*CATALOG_FIELDS).first()
+    if old is None:
+        return True
+    return any(old[f] != getattr(instance, f) for f in CATALOG_FIELDS)
@@ -0,0 +1,131 @@
+# apps/academics/credit_rules.py
+from __future__ import annotations
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .registry import registry
+from .term_cache import term_cache
+
+# ────────────────────────────────────────────────────────────────
+# Carga de créditos por término (TermRule + StudentProfile.gpa)
+#
+# Las reglas del término vienen de term_cache (memoria del proceso) y el
+# GPA del alumno de la caché de Django (se invalida al guardar su
+# StudentProfile). El total del carrito se lleva en
+# EnrollmentCart.credits_total si el campo existe: add/remove lo mueven
+# con UPDATE ... F() y el barrido lo descuenta al borrar items vencidos
+# (hasta entonces un item vencido sigue sumando). Sin el campo se
+# calcula con una consulta agregada sobre los items vigentes.
+# ────────────────────────────────────────────────────────────────
+GPA_KEY = "academics:credits:gpa:{}"
+_NO_GPA = "none"
+
+
+def _student_gpa(user):
+    key = GPA_KEY.format(user.pk)
+    gpa = cache.get(key)
+    if gpa is None:
+        Profile = registry.model("academics", "StudentProfile")
+        value = None
+        if Profile is not None and registry.has_field(Profile, "gpa"):
+            value = Profile.objects.filter(user=user).values_list("gpa", flat=True).first()
+        gpa = _NO_GPA if value is None else float(value)
+        cache.set(key, gpa, timeout=getattr(settings, "ELIGIBILITY_CACHE_TTL", 6 * 3600))
+    return None if gpa == _NO_GPA else gpa
+
+
+def invalidate_gpa(sender, instance, **kwargs):
+    """Receptor de post_save/post_delete de StudentProfile."""
+    user_id = getattr(instance, "user_id", None)
+    if user_id is not None:
+        transaction.on_commit(lambda: cache.delete(GPA_KEY.format(user_id)))
+
+
+def credit_limits(user, term) -> dict:
+    """
+    Límites efectivos del alumno en el término:
+    {"min": int|None, "max": int|None, "max_rule": nombre del límite,
+     "gpa": float|None, "gpa_threshold": float|None}.
+    """
+    rule = term_cache.term_rule(term)
+    limits = {"min": None, "max": None, "max_rule": "max_credits", "gpa": None, "gpa_threshold": None}
+    if rule is None:
+        return limits
+    limits["min"] = getattr(rule, "min_credits", None)
+    limits["max"] = getattr(rule, "max_credits", None)
+    threshold = getattr(rule, "gpa_threshold", None)
+    low_max = getattr(rule, "max_credits_low_gpa", None)
+    if threshold is not None and low_max is not None:
+        gpa = _student_gpa(user)
+        limits["gpa"], limits["gpa_threshold"] = gpa, float(threshold)
+        if gpa is not None and gpa < float(threshold):
+            limits["max"], limits["max_rule"] = low_max, "max_credits_low_gpa"
+    return limits
+
+
+def over_max(limits: dict, total: int) -> str | None:
+    """Mensaje si `total` supera el máximo efectivo; None si está dentro."""
+    if limits["max"] is None or total <= limits["max"]:
+        return None
+    if limits["max_rule"] == "max_credits_low_gpa":
+        return (
+            f"Superas el máximo de {limits['max']} créditos para promedio menor a "
+            f"{limits['gpa_threshold']:g} (tu promedio: {limits['gpa']:g}; llevarías {total})."
+        )
+    return f"Superas el máximo de {limits['max']} créditos del término (llevarías {total})."
+
+
+def under_min(limits: dict, total: int) -> str | None:
+    if limits["min"] is None or total >= limits["min"]:
+        return None
+    return f"No alcanzas el mínimo de {limits['min']} créditos del término (tienes {total})."
+
+
+# ────────────────────────────────────────────────────────────────
+# Total del carrito
+# ────────────────────────────────────────────────────────────────
+def _running_field(Cart) -> bool:
+    return Cart is not None and registry.has_field(Cart, "credits_total")
+
+
+def cart_credits(cart) -> int:
+    """Créditos del carrito: el total llevado si existe, si no una suma."""
+    if _running_field(type(cart)):
+        return cart.credits_total or 0
+    CartItem = registry.model("academics", "CartItem")
+    if CartItem is None:
+        return 0
+    qs = CartItem.objects.filter(cart=cart)
+    if registry.has_field(CartItem, "reserved_until"):
+        qs = qs.filter(reserved_until__gt=timezone.now())  # solo items vigentes
+    return qs.aggregate(n=Sum("course_group__course__credits"))["n"] or 0
+
+
+def add_credits(cart, delta: int):
+    """Mueve el total llevado (un UPDATE atómico); no-op sin el campo."""
+    if not delta or not _running_field(type(cart)):
+        return
+    type(cart).objects.filter(pk=cart.pk).update(credits_total=F("credits_total") + delta)
+    cart.credits_total = (cart.credits_total or 0) + delta
+
+
+def release_item_credits(item_ids):
+    """Descuenta de cada carrito los créditos de items que se van a borrar (barrido)."""
+    CartItem = registry.model("academics", "CartItem")
+    Cart = registry.model("academics", "EnrollmentCart")
+    if CartItem is None or not _running_field(Cart) or not item_ids:
+        return
+    per_cart = (
+        CartItem.objects.filter(pk__in=list(item_ids))
+        .order_by()
+        .values("cart_id")
+        .annotate(n=Sum("course_group__course__credits"))
+        .values_list("cart_id", "n")
+    )
+    for cart_id, n in per_cart:
+        if n:
+            Cart.objects.filter(pk=cart_id).update(credits_total=F("credits_total") - n)
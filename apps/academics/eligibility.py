@@ -0,0 +1,253 @@
+# apps/academics/eligibility.py
+from __future__ import annotations
+
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .registry import registry
+
+# ────────────────────────────────────────────────────────────────
+# Elegibilidad por prerrequisitos y correquisitos
+#
+# El grafo CoursePrerequisite se compila una vez por término en un índice
+# de cierre transitivo: {curso: {prerrequisito (directo o indirecto):
+# nota mínima}}. Los cursos aprobados de cada alumno ({curso: mejor nota})
+# se materializan desde Grade con el cálculo de final_grades. Así add_to_cart
+# responde con búsquedas en diccionarios. Ambos viven en la caché de
+# Django; signals.py invalida el índice al tocar prerrequisitos y el set
+# del alumno al tocar sus notas.
+# ────────────────────────────────────────────────────────────────
+INDEX_VERSION_KEY = "academics:eligibility:index_version"
+PASSED_VERSION_KEY = "academics:eligibility:passed_version"
+STUDENT_VERSION_PREFIX = "academics:eligibility:student_version:"
+GRADE_SCALE = 20
+
+
+def passing_grade() -> float:
+    return float(getattr(settings, "ELIGIBILITY_PASSING_GRADE", 10.5))
+
+
+def _version(key: str) -> str:
+    return cache.get_or_set(key, lambda: uuid.uuid4().hex, timeout=None)
+
+
+def _bump(key: str):
+    transaction.on_commit(lambda: cache.set(key, uuid.uuid4().hex, timeout=None))
+
+
+def invalidate_index(*args, **kwargs):
+    """Receptor: cambió CoursePrerequisite/CourseCorequisite."""
+    _bump(INDEX_VERSION_KEY)
+
+
+def invalidate_passed(*args, **kwargs):
+    """Receptor: cambió una Assessment (pesos/puntaje); afecta a todos los alumnos."""
+    _bump(PASSED_VERSION_KEY)
+
+
+def invalidate_student(student_id):
+    """Cambió una nota del alumno: se descartan sus sets de todos los términos."""
+    transaction.on_commit(lambda: cache.delete(f"{STUDENT_VERSION_PREFIX}{student_id}"))
+
+
+def _term_key(term) -> str:
+    return str(getattr(term, "pk", None) or "all")
+
+
+# ────────────────────────────────────────────────────────────────
+# Índice de prerrequisitos (cierre transitivo)
+# ────────────────────────────────────────────────────────────────
+def _components(direct) -> list[list[int]]:
+    """
+    Componentes fuertemente conexas del grafo (Tarjan sin recursión). Cada
+    componente sale después de todas las que alcanza.
+    """
+    order: dict[int, int] = {}
+    low: dict[int, int] = {}
+    stack, on_stack, out = [], set(), []
+    for root in list(direct):
+        if root in order:
+            continue
+        order[root] = low[root] = len(order)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(direct.get(root, ())))]
+        while work:
+            node, edges = work[-1]
+            for nxt in edges:
+                if nxt not in order:
+                    order[nxt] = low[nxt] = len(order)
+                    stack.append(nxt)
+                    on_stack.add(nxt)
+                    work.append((nxt, iter(direct.get(nxt, ()))))
+                    break
+                if nxt in on_stack:
+                    low[node] = min(low[node], order[nxt])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == order[node]:
+                    comp = []
+                    while True:
+                        n = stack.pop()
+                        on_stack.discard(n)
+                        comp.append(n)
+                        if n == node:
+                            break
+                    out.append(comp)
+    return out
+
+
+def compile_requirements(edges, default_min: float) -> dict[int, dict[int, float]]:
+    """
+    edges: [(curso, prerrequisito, nota_mínima|None)]. Retorna el cierre
+    transitivo {curso: {requisito: nota mínima}}. Los requisitos indirectos
+    exigen la nota de aprobación; si un curso es requisito directo e
+    indirecto se queda la exigencia mayor. Un ciclo (dato erróneo) se
+    resuelve antes como componente: sus cursos alcanzan lo mismo sin
+    importar por cuál se empiece.
+    """
+    direct = defaultdict(dict)
+    for course, prereq, min_grade in edges:
+        mg = float(min_grade) if min_grade is not None else default_min
+        direct[course][prereq] = max(mg, direct[course].get(prereq, mg))
+
+    # below[n]: lo alcanzable desde n con al menos un paso (compartido por su componente)
+    below: dict[int, set[int]] = {}
+    for comp in _components(direct):
+        members, reach = set(comp), set()
+        for node in comp:
+            for prereq in direct.get(node, ()):
+                reach.add(prereq)
+                if prereq not in members:
+                    reach |= below[prereq]
+        for node in comp:
+            below[node] = reach
+
+    closure: dict[int, dict[int, float]] = {}
+    for course, reqs in direct.items():
+        out = dict(reqs)
+        for prereq in reqs:
+            for p in below.get(prereq, ()):
+                if p != course:
+                    out[p] = max(out.get(p, default_min), default_min)
+        closure[course] = out
+    return closure
+
+
+def prereq_index(term=None) -> dict:
+    """{"requires": {curso: {req: nota}}, "coreqs": {curso: [cursos]}}, cacheado por término."""
+    key = f"academics:eligibility:index:{_term_key(term)}:{_version(INDEX_VERSION_KEY)}"
+    index = cache.get(key)
+    if index is not None:
+        return index
+
+    requires, coreqs = {}, defaultdict(list)
+    Prereq = registry.model("academics", "CoursePrerequisite")
+    if Prereq is not None:
+        cols = ["course_id", "prerequisite_id"]
+        has_min = registry.has_field(Prereq, "min_grade")
+        rows = Prereq.objects.values_list(*cols, *(["min_grade"] if has_min else []))
+        edges = [(r[0], r[1], r[2] if has_min else None) for r in rows]
+        requires = compile_requirements(edges, passing_grade())
+    Coreq = registry.model("academics", "CourseCorequisite")
+    if Coreq is not None:
+        for course, other in Coreq.objects.values_list("course_id", "corequisite_id"):
+            coreqs[course].append(other)
+
+    index = {"requires": requires, "coreqs": dict(coreqs)}
+    cache.set(key, index, timeout=getattr(settings, "ELIGIBILITY_CACHE_TTL", 6 * 3600))
+    return index
+
+
+# ────────────────────────────────────────────────────────────────
+# Cursos aprobados (desde Grade)
+# ────────────────────────────────────────────────────────────────
+def _passed_key(student_id, term=None) -> str:
+    own = _version(f"{STUDENT_VERSION_PREFIX}{student_id}")
+    return f"academics:eligibility:passed:{_term_key(term)}:{_version(PASSED_VERSION_KEY)}:{student_id}:{own}"
+
+
+def _course_grades(student_ids, term=None) -> dict[int, dict[int, float]]:
+    """
+    {alumno: {curso: mejor nota aprobatoria}}. La nota de un grupo es la
+    final de final_grades.compute() (Σ pesos de todas las evaluaciones del
+    grupo, lo que falta cuenta 0), la misma del registro y de FinalGrade.
+    Se toma la mejor entre grupos del mismo curso (repitencias). El término
+    en curso no cuenta si CourseGroup tiene campo term.
+    """
+    from .final_grades import compute  # final_grades importa GRADE_SCALE de aquí
+
+    Grade = registry.model("academics", "Grade")
+    Assessment = registry.model("academics", "Assessment")
+    if Grade is None or Assessment is None or not registry.has_field(Assessment, "course_group"):
+        return {}
+    CourseGroup = registry.model("academics", "CourseGroup")
+
+    student_ids = list(student_ids)
+    qs = Grade.objects.filter(student_id__in=student_ids)
+    if term is not None and registry.has_field(CourseGroup, "term"):
+        qs = qs.exclude(assessment__course_group__term=term)
+    course_of = dict(
+        qs.order_by()
+        .values_list("assessment__course_group_id", "assessment__course_group__course_id")
+        .distinct()
+    )
+    threshold = passing_grade()
+    out: dict[int, dict[int, float]] = defaultdict(dict)
+    for (sid, gid), grade in compute(course_of, student_ids).items():
+        cid = course_of[gid]
+        if grade >= threshold and grade > out[sid].get(cid, -1):
+            out[sid][cid] = grade
+    return out
+
+
+def passed_courses(student_id, term=None) -> dict[int, float]:
+    """{curso: nota} aprobados por el alumno, cacheado hasta que cambien sus notas."""
+    key = _passed_key(student_id, term)
+    passed = cache.get(key)
+    if passed is None:
+        passed = _course_grades([student_id], term).get(student_id, {})
+        cache.set(key, passed, timeout=getattr(settings, "ELIGIBILITY_CACHE_TTL", 6 * 3600))
+    return passed
+
+
+# ────────────────────────────────────────────────────────────────
+# Consultas de elegibilidad
+# ────────────────────────────────────────────────────────────────
+def missing_prereqs(course_id, passed: dict, index: dict) -> list[tuple[int, float]]:
+    """[(curso requisito, nota mínima)] que faltan, directos e indirectos."""
+    return [
+        (req, mg)
+        for req, mg in index["requires"].get(course_id, {}).items()
+        if passed.get(req, -1) < mg
+    ]
+
+
+def missing_coreqs(course_id, passed: dict, taking, index: dict) -> list[int]:
+    """Correquisitos que ni están aprobados ni se llevan en este término."""
+    return [c for c in index["coreqs"].get(course_id, ()) if c not in passed and c not in taking]
+
+
+def cohort_eligibility(student_ids, course_ids, term=None, chunk_size: int = 500):
+    """
+    Modo masivo para consejería: genera (alumno, curso, faltantes) para
+    cada par. Las notas se leen por bloques de alumnos con una consulta
+    agregada por bloque; el índice se compila una sola vez.
+    """
+    index = prereq_index(term)
+    student_ids = list(student_ids)
+    course_ids = list(course_ids)
+    for i in range(0, len(student_ids), chunk_size):
+        chunk = student_ids[i:i + chunk_size]
+        grades = _course_grades(chunk, term)
+        for sid in chunk:
+            passed = grades.get(sid, {})
+            for cid in course_ids:
+                yield sid, cid, missing_prereqs(cid, passed, index)
@@ -0,0 +1,174 @@
+# apps/academics/exports.py
+from __future__ import annotations
+
+import csv
+import tempfile
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook
+
+from .registry import registry
+
+# ────────────────────────────────────────────────────────────────
+# Exportaciones en streaming
+#
+# Las filas salen de values_list(...).iterator(chunk_size): tuplas, sin
+# instancias ni select_related, leídas por bloques. csv.writer escribe en
+# un pseudo-archivo que devuelve la línea y StreamingHttpResponse la
+# manda al cliente en paquetes de LINES_PER_CHUNK: el primer byte sale
+# con el primer bloque y la memoria no crece con el número de filas.
+# Las exportaciones de muchos grupos consultan GROUPS_PER_QUERY grupos a
+# la vez, así la memoria queda acotada aunque el driver no tenga cursores
+# del lado del servidor (MariaDB/MySQL carga cada resultado completo).
+#
+# XLSX: openpyxl en modo write_only escribe cada fila al XML de la hoja
+# en disco temporal y arma el zip al final; el resultado va a un archivo
+# temporal (en memoria hasta XLSX_SPOOL bytes) que FileResponse envía por
+# bloques. Una hoja admite SHEET_MAX_ROWS filas; lo demás sigue en otra.
+# ────────────────────────────────────────────────────────────────
+CHUNK_SIZE = 2000
+LINES_PER_CHUNK = 500
+GROUPS_PER_QUERY = 50
+XLSX_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+XLSX_SPOOL = 8 * 1024 * 1024
+SHEET_MAX_ROWS = 1_048_576  # límite de Excel, con la cabecera
+
+
+class _Echo:
+    """Pseudo-archivo para csv.writer: write() devuelve lo escrito."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_chunks(header, rows):
+    writer = csv.writer(_Echo())
+    buf = [writer.writerow(header)]
+    for row in rows:
+        buf.append(writer.writerow(row))
+        if len(buf) >= LINES_PER_CHUNK:
+            yield "".join(buf)
+            buf = []
+    if buf:
+        yield "".join(buf)
+
+
+def csv_response(filename: str, header, rows) -> StreamingHttpResponse:
+    """CSV en streaming a partir de un iterable de filas."""
+    resp = StreamingHttpResponse(_csv_chunks(header, rows), content_type="text/csv; charset=utf-8")
+    resp["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return resp
+
+
+def workbook_response(filename: str, write) -> FileResponse:
+    """XLSX como descarga; `write(archivo)` guarda el libro en el archivo temporal."""
+    out = tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL)
+    write(out)
+    out.seek(0)
+    return FileResponse(out, as_attachment=True, filename=filename, content_type=XLSX_TYPE)
+
+
+def write_rows_xlsx(fileobj, header, rows, title: str = "datos") -> None:
+    """Una hoja (o varias, si pasa el límite de Excel) en modo write_only."""
+    wb = Workbook(write_only=True)
+    sheets, used = 0, SHEET_MAX_ROWS
+    for row in rows:
+        if used >= SHEET_MAX_ROWS:
+            sheets += 1
+            ws = wb.create_sheet(title=title[:31] if sheets == 1 else f"{title[:26]} ({sheets})")
+            ws.append(header)
+            used = 1
+        ws.append(row)
+        used += 1
+    if not sheets:
+        wb.create_sheet(title=title[:31]).append(header)
+    wb.save(fileobj)
+
+
+def xlsx_response(filename: str, header, rows, title: str = "datos") -> FileResponse:
+    """XLSX a partir de un iterable de filas (memoria acotada, como csv_response)."""
+    return workbook_response(filename, lambda out: write_rows_xlsx(out, header, rows, title))
+
+
+def table_response(fmt: str, basename: str, header, rows, title: str = "datos"):
+    """csv_response o xlsx_response según `fmt` ("csv" / "xlsx")."""
+    if fmt == "xlsx":
+        return xlsx_response(f"{basename}.xlsx", header, rows, title)
+    return csv_response(f"{basename}.csv", header, rows)
+
+
+# ────────────────────────────────────────────────────────────────
+# Notas
+# ────────────────────────────────────────────────────────────────
+def grade_columns() -> tuple[str, str] | None:
+    """(campo de etiqueta de Assessment, campo de puntaje de Grade) o None si faltan."""
+    Grade = registry.model("academics", "Grade")
+    Assessment = registry.model("academics", "Assessment")
+    if Grade is None or Assessment is None:
+        return None
+    label, points = registry.label_field(Assessment), registry.points_field(Grade)
+    if label is None or points is None:
+        return None
+    return label, points
+
+
+def grade_rows(group_ids, chunk_size: int = CHUNK_SIZE):
+    """
+    Genera (username, curso, sección, evaluación, puntaje) de las notas de los
+    grupos dados, ordenadas por curso, sección, alumno y evaluación. Los ids
+    deben venir en ese mismo orden (curso, sección) para que los lotes se
+    encadenen sin reordenar.
+    """
+    Grade = registry.model("academics", "Grade")
+    cols = grade_columns()
+    if cols is None:
+        return
+    label, points = cols
+    group_ids = list(group_ids)
+    for i in range(0, len(group_ids), GROUPS_PER_QUERY):
+        yield from (
+            Grade.objects.filter(assessment__course_group_id__in=group_ids[i:i + GROUPS_PER_QUERY])
+            .order_by(
+                "assessment__course_group__course__code",
+                "assessment__course_group__section",
+                "student__username",
+                f"assessment__{label}",
+                "assessment_id",
+            )
+            .values_list(
+                "student__username",
+                "assessment__course_group__course__code",
+                "assessment__course_group__section",
+                f"assessment__{label}",
+                points,
+            )
+            .iterator(chunk_size=chunk_size)
+        )
+
+
+# ────────────────────────────────────────────────────────────────
+# Matrículas (mismas columnas que EnrollmentResource: se pueden reimportar)
+# ────────────────────────────────────────────────────────────────
+ENROLLMENT_COLUMNS = ["student__username", "course_group__course__code", "course_group__section", "created_at"]
+
+
+def enrollment_rows(group_ids, chunk_size: int = CHUNK_SIZE):
+    """Genera (username, curso, sección, fecha local sin zona) por curso, sección y alumno."""
+    Enrollment = registry.model("academics", "Enrollment")
+    if Enrollment is None:
+        return
+    group_ids = list(group_ids)
+    has_created = registry.has_field(Enrollment, "created_at")
+    for i in range(0, len(group_ids), GROUPS_PER_QUERY):
+        rows = (
+            Enrollment.objects.filter(course_group_id__in=group_ids[i:i + GROUPS_PER_QUERY])
+            .order_by("course_group__course__code", "course_group__section", "student__username")
+            .values_list("student__username", "course_group__course__code", "course_group__section",
+                         *(("created_at",) if has_created else ()))
+            .iterator(chunk_size=chunk_size)
+        )
+        for username, code, section, *created in rows:
+            # Excel no admite fechas con zona horaria
+            when = timezone.localtime(created[0]).replace(tzinfo=None) if created and created[0] else None
+            yield username, code, section, when
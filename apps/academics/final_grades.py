@@ -0,0 +1,196 @@
+# apps/academics/final_grades.py
+from __future__ import annotations
+
+import threading
+
+from django.db import connections, router, transaction
+from django.db.models import Avg, Count, FloatField, Sum
+from django.db.models.functions import Cast, NullIf
+
+from .eligibility import GRADE_SCALE
+from .registry import registry
+
+# ────────────────────────────────────────────────────────────────
+# Notas finales materializadas (FinalGrade)
+#
+# Una fila por (alumno, grupo) con el mismo cálculo que el registro de
+# notas (gradebook.py):
+#     final = GRADE_SCALE · Σ(weight · score / total_points) / Σ weight
+# sobre todas las evaluaciones del grupo (lo que falta cuenta 0; pesos en
+# 0 → promedio simple), acotado a [0, GRADE_SCALE]: un puntaje sobre el
+# total no desborda score (max_digits=5). recompute() lo hace por conjuntos: una consulta
+# agregada de notas por (alumno, grupo), otra de pesos por grupo y un
+# upsert por bloques. Las señales de Grade/Assessment y la importación
+# masiva solo anotan qué recalcular (schedule*); el recálculo corre una
+# vez al confirmar la transacción, así un borrado en cascada de 40 notas
+# es un solo recálculo. rebuild_final_grades lo rehace todo.
+# ────────────────────────────────────────────────────────────────
+CHUNK_SIZE = 1000
+_pending = threading.local()
+
+
+def _models():
+    return (
+        registry.model("academics", "FinalGrade"),
+        registry.model("academics", "Grade"),
+        registry.model("academics", "Assessment"),
+    )
+
+
+def compute(group_ids, student_ids=None) -> dict[tuple[int, int], float]:
+    """{(alumno, grupo): final} de los alumnos con al menos una nota en esos grupos."""
+    _Final, Grade, Assessment = _models()
+    points = registry.points_field(Grade) if Grade is not None else None
+    group_ids = list(group_ids)
+    if points is None or Assessment is None or not group_ids:
+        return {}
+    weights = {
+        gid: (float(w or 0), n)
+        for gid, w, n in Assessment.objects.filter(course_group_id__in=group_ids)
+        .order_by()
+        .values("course_group_id")
+        .annotate(w=Sum("weight"), n=Count("pk"))
+        .values_list("course_group_id", "w", "n")
+    }
+    qs = Grade.objects.filter(assessment__course_group_id__in=group_ids)
+    if student_ids is not None:
+        qs = qs.filter(student_id__in=list(student_ids))
+    # Cast: SQLite guarda decimales enteros como INTEGER y dividiría entero;
+    # total_points = 0 da NULL y no suma
+    ratio = Cast(points, FloatField()) / NullIf(Cast("assessment__total_points", FloatField()), 0.0)
+    rows = (
+        qs.order_by()
+        .values_list("student_id", "assessment__course_group_id")
+        .annotate(
+            weighted=Sum(ratio * Cast("assessment__weight", FloatField()), output_field=FloatField()),
+            plain=Sum(ratio, output_field=FloatField()),
+        )
+    )
+    out = {}
+    for sid, gid, weighted, plain in rows:
+        wsum, n = weights.get(gid, (0.0, 0))
+        share = (weighted or 0.0) / wsum if wsum > 0 else ((plain or 0.0) / n if n else 0.0)
+        out[(sid, gid)] = round(GRADE_SCALE * min(max(share, 0.0), 1.0), 2)
+    return out
+
+
+def recompute(group_ids, student_ids=None, chunk_size: int = CHUNK_SIZE) -> int:
+    """Recalcula y guarda las finales de esos grupos (y alumnos). Retorna cuántas escribió."""
+    FinalGrade = _models()[0]
+    group_ids = list(set(group_ids))
+    if FinalGrade is None or not group_ids:
+        return 0
+    finals = compute(group_ids, student_ids)
+
+    # Alumnos que ya no tienen notas en el grupo: su final se borra
+    scope = FinalGrade.objects.filter(course_group_id__in=group_ids)
+    if student_ids is not None:
+        scope = scope.filter(student_id__in=list(student_ids))
+    stale = [pk for pk, sid, gid in scope.values_list("pk", "student_id", "course_group_id") if (sid, gid) not in finals]
+    for i in range(0, len(stale), chunk_size):
+        FinalGrade.objects.filter(pk__in=stale[i:i + chunk_size]).delete()
+
+    kwargs = {"update_conflicts": True, "update_fields": ["score", "updated_at"]}
+    if connections[router.db_for_write(FinalGrade)].features.supports_update_conflicts_with_target:
+        kwargs["unique_fields"] = ["student", "course_group"]  # ON CONFLICT (...) en PostgreSQL/SQLite
+    items = list(finals.items())
+    for i in range(0, len(items), chunk_size):
+        FinalGrade.objects.bulk_create(
+            [FinalGrade(student_id=sid, course_group_id=gid, score=score) for (sid, gid), score in items[i:i + chunk_size]],
+            **kwargs,
+        )
+    return len(items)
+
+
+def rebuild(group_ids=None, groups_per_batch: int = 200) -> tuple[int, int]:
+    """Recalcula todo (o esos grupos) por lotes de grupos. Retorna (grupos, finales escritas)."""
+    CourseGroup = registry.model("academics", "CourseGroup")
+    ids = list(CourseGroup.objects.order_by("pk").values_list("pk", flat=True)) if group_ids is None else list(group_ids)
+    written = 0
+    for i in range(0, len(ids), groups_per_batch):
+        with transaction.atomic():
+            written += recompute(ids[i:i + groups_per_batch])
+    return len(ids), written
+
+
+# ────────────────────────────────────────────────────────────────
+# Recálculo incremental (al confirmar la transacción)
+# ────────────────────────────────────────────────────────────────
+def _state() -> dict:
+    state = getattr(_pending, "state", None)
+    if state is None:
+        state = _pending.state = {"groups": set(), "students": {}, "assessment_group": {}}
+    return state
+
+
+def _flush():
+    state = getattr(_pending, "state", None)
+    if state is None:
+        return  # ya lo recalculó un callback anterior de la misma transacción
+    _pending.state = None
+    groups = state["groups"]
+    if groups:
+        recompute(groups)
+    for gid, sids in state["students"].items():
+        if gid not in groups:
+            recompute([gid], sids)
+
+
+def _ensure_flush():
+    # Un callback por cada anotación: si un savepoint o la transacción se
+    # deshace, Django descarta los suyos y quedan los demás. Solo el primero
+    # que corre recalcula; los siguientes encuentran el estado vacío.
+    transaction.on_commit(_flush)
+
+
+def schedule_students(group_id, student_ids):
+    """Recalcular la final de estos alumnos en el grupo (cambió alguna de sus notas)."""
+    if group_id is None:
+        return
+    _state()["students"].setdefault(group_id, set()).update(student_ids)
+    _ensure_flush()
+
+
+def schedule_group(group_id):
+    """Recalcular todo el grupo (cambió el peso, el puntaje total o el número de evaluaciones)."""
+    if group_id is None:
+        return
+    _state()["groups"].add(group_id)
+    _ensure_flush()
+
+
+def grade_changed(sender, instance, **kwargs):
+    """Receptor de post_save/post_delete de Grade."""
+    # evaluación → grupo se recuerda en la transacción: en un borrado en
+    # cascada todas las notas son de la misma evaluación
+    known = _state()["assessment_group"]
+    if instance.assessment_id not in known:
+        known[instance.assessment_id] = (
+            _models()[2].objects.filter(pk=instance.assessment_id).values_list("course_group_id", flat=True).first()
+        )
+    schedule_students(known[instance.assessment_id], [instance.student_id])
+
+
+def assessment_changed(sender, instance, **kwargs):
+    """Receptor de post_save/post_delete de Assessment."""
+    schedule_group(getattr(instance, "course_group_id", None))
+
+
+# ────────────────────────────────────────────────────────────────
+# Lecturas
+# ────────────────────────────────────────────────────────────────
+def finals_for_student(student) -> dict[int, float]:
+    """{grupo: final} del alumno (una consulta por índice)."""
+    FinalGrade = _models()[0]
+    if FinalGrade is None:
+        return {}
+    return {gid: float(score) for gid, score in FinalGrade.objects.filter(student=student).values_list("course_group_id", "score")}
+
+
+def group_average(group) -> float | None:
+    """Promedio de las finales del grupo, o None si no hay."""
+    FinalGrade = _models()[0]
+    if FinalGrade is None:
+        return None
+    avg = FinalGrade.objects.filter(course_group=group).aggregate(v=Avg("score"))["v"]
+    return None if avg is None else round(float(avg), 2)
@@ -0,0 +1,209 @@
+# apps/academics/grade_history.py
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.contrib.auth import get_user_model
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .registry import registry
+
+# ────────────────────────────────────────────────────────────────
+# Historial de notas (GradeEvent), solo inserciones
+#
+# Cada escritura de Grade deja un evento (alumno, evaluación, grupo,
+# puntaje anterior → nuevo, quién, desde dónde, cuándo) en la misma
+# transacción que el cambio:
+#   · save()/delete() uno a uno (admin, shell): señales de Grade;
+#   · importación masiva: services_grades llama a record_written() por
+#     bloque con un solo bulk_create, y omite las filas que no cambian;
+#   · borrar una evaluación (o su grupo): un bulk_create en el pre_delete
+#     de Assessment y las notas de la cascada no insertan una por una.
+# Quién y desde dónde lo pone context(): el middleware (web/admin con el
+# usuario de la petición) y run_job (importación, con su ImportJob). Sin
+# contexto el origen es "consola/comando".
+#
+# Lecturas por rango de índice: scores_as_of() recorre los eventos del
+# grupo hasta la fecha por (course_group, created_at) y se queda con el
+# último por nota; import_changes() filtra por import_job.
+# ────────────────────────────────────────────────────────────────
+BATCH_SIZE = 1000
+_context: ContextVar[dict | None] = ContextVar("grade_history_context", default=None)
+_cascade = threading.local()
+
+
+def _models():
+    return registry.model("academics", "GradeEvent"), registry.model("academics", "Grade")
+
+
+@contextmanager
+def context(source: str, actor=None, job=None):
+    """Origen de los cambios de nota dentro del bloque; actor es un usuario (puede ser perezoso) o su id."""
+    token = _context.set({"source": source, "actor": actor, "job": job})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def import_context(job):
+    """context() de una importación en cola: origen importación, autor quien la subió."""
+    GradeEvent = _models()[0]
+    return context(GradeEvent.IMPORT if GradeEvent is not None else "", actor=job.created_by_id, job=job.pk)
+
+
+def _origin(GradeEvent) -> dict:
+    ctx = _context.get() or {"source": GradeEvent.SHELL, "actor": None, "job": None}
+    actor = ctx["actor"]
+    if actor is not None and not isinstance(actor, int):
+        # request.user se resuelve recién aquí: las peticiones que no tocan notas no lo cargan
+        actor = actor.pk if getattr(actor, "is_authenticated", False) else None
+    return {"source": ctx["source"], "actor_id": actor, "import_job_id": getattr(ctx["job"], "pk", ctx["job"])}
+
+
+def _group_of(assessment_id):
+    Assessment = registry.model("academics", "Assessment")
+    return Assessment.objects.filter(pk=assessment_id).values_list("course_group_id", flat=True).first()
+
+
+def _insert(GradeEvent, items) -> int:
+    """items: (alumno, evaluación, grupo, anterior, nuevo). Un bulk_create con el mismo origen y hora."""
+    origin, now = _origin(GradeEvent), timezone.now()
+    events = [
+        GradeEvent(student_id=sid, assessment_id=aid, course_group_id=gid, old_score=old, new_score=new, created_at=now, **origin)
+        for sid, aid, gid, old, new in items
+    ]
+    GradeEvent.objects.bulk_create(events, batch_size=BATCH_SIZE)
+    return len(events)
+
+
+def record_written(group_id, objs, previous: dict, field: str) -> int:
+    """
+    Eventos de un bloque escrito con bulk_create. previous = {(alumno, evaluación):
+    puntaje antes de escribir} (sin clave = nota nueva); lo que no cambió no se anota.
+    """
+    GradeEvent = _models()[0]
+    if GradeEvent is None or group_id is None:
+        return 0
+    items = []
+    for obj in objs:
+        key = (obj.student_id, obj.assessment_id)
+        old, new = previous.get(key), getattr(obj, field)
+        if old is not None and old == new:
+            continue
+        items.append((*key, group_id, old, new))
+    return _insert(GradeEvent, items) if items else 0
+
+
+# ────────────────────────────────────────────────────────────────
+# Señales (signals.py)
+# ────────────────────────────────────────────────────────────────
+def grade_presave(sender, instance, raw=False, **kwargs):
+    field = registry.points_field(sender)
+    instance._history_old = (
+        sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+        if instance.pk and field and not raw else None
+    )
+
+
+def grade_saved(sender, instance, created, raw=False, **kwargs):
+    GradeEvent, field = _models()[0], registry.points_field(sender)
+    if GradeEvent is None or field is None or raw:
+        return
+    old, new = (None if created else getattr(instance, "_history_old", None)), getattr(instance, field)
+    if old is not None and old == new:
+        return
+    _insert(GradeEvent, [(instance.student_id, instance.assessment_id, _group_of(instance.assessment_id), old, new)])
+    instance._history_old = new
+
+
+def _skipped() -> dict:
+    skip = getattr(_cascade, "skip", None)
+    if skip is None:
+        skip = _cascade.skip = {}
+    return skip
+
+
+def grade_deleted(sender, instance, origin=None, **kwargs):
+    GradeEvent, field = _models()[0], registry.points_field(sender)
+    if GradeEvent is None or field is None:
+        return
+    # Ya la anotó el pre_delete de su evaluación (mismo borrado: mismo origin)
+    if instance.assessment_id in _skipped() and _skipped()[instance.assessment_id] is origin:
+        return
+    _insert(GradeEvent, [(instance.student_id, instance.assessment_id, _group_of(instance.assessment_id), getattr(instance, field), None)])
+
+
+def assessment_deleting(sender, instance, origin=None, **kwargs):
+    GradeEvent, Grade = _models()
+    field = registry.points_field(Grade) if Grade is not None else None
+    if GradeEvent is None or field is None:
+        return
+    rows = Grade.objects.filter(assessment_id=instance.pk).values_list("student_id", field)
+    _insert(GradeEvent, [(sid, instance.pk, instance.course_group_id, score, None) for sid, score in rows])
+    _skipped()[instance.pk] = origin
+
+
+def assessment_deleted(sender, instance, **kwargs):
+    _skipped().pop(instance.pk, None)
+
+
+# ────────────────────────────────────────────────────────────────
+# Lecturas
+# ────────────────────────────────────────────────────────────────
+def scores_as_of(group_ids, when) -> list[tuple[int, int, int, object]]:
+    """[(grupo, alumno, evaluación, puntaje)] de las notas que existían en `when` (una consulta por rango)."""
+    GradeEvent = _models()[0]
+    group_ids = list(group_ids)
+    if GradeEvent is None or not group_ids:
+        return []
+    rows = (
+        GradeEvent.objects.filter(course_group_id__in=group_ids, created_at__lte=when)
+        .order_by("created_at", "pk")
+        .values_list("course_group_id", "student_id", "assessment_id", "new_score")
+    )
+    last = {}
+    for gid, sid, aid, score in rows.iterator(chunk_size=BATCH_SIZE):
+        last[(gid, sid, aid)] = score
+    return [(*key, score) for key, score in last.items() if score is not None]
+
+
+def with_names(qs):
+    """
+    Anota student_name y assessment_name con subconsultas: un JOIN por
+    student/assessment (FK no nulas → INNER JOIN) escondería justo los
+    eventos de alumnos o evaluaciones borrados. Quedan en None si no existen.
+    """
+    Assessment = registry.model("academics", "Assessment")
+    label = registry.label_field(Assessment) if Assessment is not None else None
+    return qs.annotate(
+        student_name=Subquery(get_user_model().objects.filter(pk=OuterRef("student_id")).values("username")[:1]),
+        assessment_name=Subquery(Assessment.objects.filter(pk=OuterRef("assessment_id")).values(label or "pk")[:1]),
+    )
+
+
+def name_or_id(name, pk) -> str:
+    """Nombre, o el id (#12) si ya no existe."""
+    return name if name is not None else f"#{pk}"
+
+
+CHANGE_COLUMNS = ["student_username", "assessment", "old_score", "new_score", "created_at"]
+
+
+def import_changes(job):
+    """Filas (CHANGE_COLUMNS) de lo que cambió una importación, en orden de escritura."""
+    GradeEvent = _models()[0]
+    if GradeEvent is None:
+        return iter(())
+    rows = (
+        with_names(GradeEvent.objects.filter(import_job_id=job.pk))
+        .order_by("pk")
+        .values_list("student_name", "student_id", "assessment_name", "assessment_id", "old_score", "new_score", "created_at")
+    )
+    return (
+        (name_or_id(username, sid), name_or_id(assessment, aid), old, new, timezone.localtime(at).replace(tzinfo=None))
+        for username, sid, assessment, aid, old, new, at in rows.iterator(chunk_size=BATCH_SIZE)
+    )
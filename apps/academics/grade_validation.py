@@ -0,0 +1,111 @@
+# apps/academics/grade_validation.py
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+from django.contrib.auth import get_user_model
+
+from . import jobs
+from .services_grades import REQUIRED_COLUMNS, assessment_table
+
+# ────────────────────────────────────────────────────────────────
+# Validación en seco (dry-run) de una importación de notas
+#
+# El archivo entero pasa a un DataFrame de texto y se valida en bloque,
+# sin escribir nada. Dos tablas de búsqueda se traen una vez, los
+# usuarios citados (username → id) y las evaluaciones del grupo
+# (etiqueta → id, total_points), y se cruzan con merge. Cada regla es
+# una máscara vectorizada:
+#   faltan datos · alumno no encontrado · evaluación no encontrada ·
+#   puntaje no numérico · puntaje negativo · puntaje mayor que el total ·
+#   fila repetida (la importación se queda con la última)
+# Una fila puede acumular varios errores, separados por "; ".
+# ────────────────────────────────────────────────────────────────
+USERS_PER_QUERY = 2000
+
+
+def load_frame(fileobj) -> pd.DataFrame:
+    """DataFrame de texto con "linea" y las columnas (normalizadas) de un CSV o XLSX; cierra el archivo."""
+    close, header, _total, rows = jobs.open_rows(fileobj)
+    try:
+        lines, records = [], []
+        for line, row in rows:
+            lines.append(line)
+            records.append(row)
+    finally:
+        close()
+    frame = pd.DataFrame.from_records(records, columns=[h for h in dict.fromkeys(header) if h])
+    frame.insert(0, "linea", lines)
+    return frame
+
+
+def _users(usernames) -> pd.DataFrame:
+    User = get_user_model()
+    found = []
+    for i in range(0, len(usernames), USERS_PER_QUERY):
+        found.extend(User.objects.filter(username__in=usernames[i:i + USERS_PER_QUERY]).values_list("username", "pk"))
+    return pd.DataFrame.from_records(found, columns=["student_username", "sid"])
+
+
+def _assessments(group) -> pd.DataFrame:
+    return pd.DataFrame.from_records(
+        [(label, aid, np.nan if total is None else float(total)) for label, (aid, total) in assessment_table(group).items()],
+        columns=["assessment", "aid", "total"],
+    )
+
+
+def validate_grades(group, frame: pd.DataFrame) -> dict:
+    """
+    Retorna {"rows": filas leídas, "invalid": filas con error,
+             "report": DataFrame (linea, columnas del archivo, error) solo con las filas con error}.
+    """
+    columns = [c for c in frame.columns if c != "linea"]
+    if frame.empty:
+        # Solo cabecera: nada que validar (y las reglas no son seguras sobre un marco vacío)
+        return {"rows": 0, "invalid": 0, "report": pd.DataFrame(columns=["linea", *columns, "error"])}
+    df = frame.copy()
+    for c in REQUIRED_COLUMNS:
+        df[c] = df[c].fillna("").astype(str).str.strip() if c in df else ""
+
+    df = (
+        df.merge(_users(df.loc[df["student_username"] != "", "student_username"].unique().tolist()),
+                 on="student_username", how="left")
+        .merge(_assessments(group), on="assessment", how="left")
+    )
+    has_user, has_label, has_points = df["student_username"] != "", df["assessment"] != "", df["points"] != ""
+    score = pd.to_numeric(df["points"].str.replace(",", ".", regex=False), errors="coerce")
+    score = score.where(np.isfinite(score))
+    known = df["sid"].notna() & df["aid"].notna()
+    last_line = df.groupby(["student_username", "assessment"])["linea"].transform("last")
+
+    rules = [
+        (~(has_user & has_label & has_points), "faltan datos"),
+        (has_user & df["sid"].isna(), "alumno no encontrado"),
+        (has_label & df["aid"].isna(), "evaluación no encontrada en el grupo"),
+        (has_points & score.isna(), "puntaje no numérico"),
+        (score < 0, "puntaje negativo"),
+        (score > df["total"], "puntaje mayor que el total (" + df["total"].map("{:g}".format).astype(str) + ")"),
+        (known & df.duplicated(["student_username", "assessment"], keep="last"),
+         "fila repetida: se usa la línea " + last_line.astype(str)),
+    ]
+    error = pd.Series("", index=df.index)
+    for mask, message in rules:
+        mask = mask.fillna(False).astype(bool)
+        if not mask.any():
+            continue
+        text = message[mask] if isinstance(message, pd.Series) else message
+        error[mask] = error[mask].where(error[mask] == "", error[mask] + "; ") + text
+
+    report = df.loc[error != "", ["linea", *columns]].assign(error=error[error != ""])
+    return {"rows": len(df), "invalid": len(report), "report": report}
+
+
+def validate_upload(group, fileobj) -> dict:
+    """validate_grades() de un archivo subido (CSV o XLSX)."""
+    return validate_grades(group, load_frame(fileobj))
+
+
+def report_rows(result: dict):
+    """(cabecera, filas) del reporte para csv_response."""
+    report = result["report"]
+    return list(report.columns), report.itertuples(index=False, name=None)
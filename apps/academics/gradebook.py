@@ -0,0 +1,184 @@
+# apps/academics/gradebook.py
+from __future__ import annotations
+
+import re
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from . import grade_history
+from .eligibility import GRADE_SCALE
+from .registry import registry
+
+# ────────────────────────────────────────────────────────────────
+# Registro de notas (alumno × evaluación) con promedio final
+#
+# Cuatro consultas de tuplas planas para todos los grupos del alcance
+# (grupos, evaluaciones, notas y matriculados); pandas pivotea y pondera
+# en una sola pasada vectorizada:
+#     final = GRADE_SCALE · Σ(weight · score / total_points) / Σ weight
+# sobre TODAS las evaluaciones del grupo (una nota que falta cuenta 0).
+# Si los pesos del grupo suman 0 se usa el promedio simple. El resultado
+# se acota a [0, GRADE_SCALE] (puntajes sobre el total). Cada grupo
+# conserva sus propias columnas (evaluaciones en orden de creación); el
+# CSV de varios grupos une las etiquetas y deja en blanco las que no
+# aplican, el XLSX usa una hoja por grupo.
+# Con as_of las notas salen del historial (GradeEvent) tal como estaban en
+# esa fecha; evaluaciones, pesos y matriculados son los de hoy.
+# ────────────────────────────────────────────────────────────────
+SCOPES = ("group", "course", "term")
+_SHEET_BAD = re.compile(r"[\[\]:*?/\\]")
+
+
+def scope_groups(scope: str, pk=None, term=None):
+    """QuerySet de CourseGroup para un grupo, un curso o un término (todos si no hay campo term)."""
+    CourseGroup = registry.model("academics", "CourseGroup")
+    qs = CourseGroup.objects.all()
+    if scope == "group":
+        return qs.filter(pk=pk)
+    if scope == "course":
+        return qs.filter(course_id=pk)
+    if registry.has_field(CourseGroup, "term"):
+        return qs.filter(term_id=pk) if pk else qs.filter(term=term)
+    return qs
+
+
+def _records(qs, columns) -> pd.DataFrame:
+    return pd.DataFrame.from_records(list(qs), columns=columns)
+
+
+def _unique_labels(labels) -> list[str]:
+    seen: dict[str, int] = {}
+    out = []
+    for label in labels:
+        label = label or "?"
+        seen[label] = seen.get(label, 0) + 1
+        out.append(label if seen[label] == 1 else f"{label} ({seen[label]})")
+    return out
+
+
+def _grades_as_of(groups, when) -> pd.DataFrame:
+    User = registry.model("auth", "User")
+    grades = _records(
+        grade_history.scores_as_of(groups.values_list("pk", flat=True), when), ["gid", "sid", "aid", "score"]
+    )
+    names = dict(User.objects.filter(pk__in=grades["sid"].unique().tolist()).values_list("pk", "username")) if len(grades) else {}
+    return grades.assign(username=grades["sid"].map(names))[["gid", "sid", "username", "aid", "score"]]
+
+
+def build_gradebook(groups, as_of=None) -> dict:
+    """
+    as_of: datetime para reconstruir las notas de esa fecha desde el historial.
+    Retorna {"groups": [(gid, curso, sección, [(aid, etiqueta)])],
+             "rows": DataFrame indexado por (gid, student_id) con username,
+                     una columna por aid y "final"}.
+    """
+    Grade = registry.model("academics", "Grade")
+    Assessment = registry.model("academics", "Assessment")
+    Enrollment = registry.model("academics", "Enrollment")
+    label = registry.label_field(Assessment) if Assessment is not None else None
+    points = registry.points_field(Grade) if Grade is not None else None
+
+    group_df = _records(
+        groups.order_by("course__code", "section", "pk").values_list("pk", "course__code", "section"),
+        ["gid", "course", "section"],
+    )
+    if label is None or points is None or group_df.empty:
+        return {"groups": [(g, c, s, []) for g, c, s in group_df.itertuples(index=False)], "rows": pd.DataFrame()}
+
+    assess = _records(
+        Assessment.objects.filter(course_group__in=groups).order_by("course_group_id", "pk")
+        .values_list("pk", "course_group_id", label, "weight", "total_points"),
+        ["aid", "gid", "label", "weight", "total"],
+    ).astype({"weight": float, "total": float})
+    grades = (
+        _grades_as_of(groups, as_of) if as_of is not None else _records(
+            Grade.objects.filter(assessment__course_group__in=groups)
+            .values_list("assessment__course_group_id", "student_id", "student__username", "assessment_id", points),
+            ["gid", "sid", "username", "aid", "score"],
+        )
+    ).astype({"score": float})
+    # Notas de evaluaciones que ya no existen no entran al registro
+    grades = grades[grades["aid"].isin(assess["aid"])]
+    roster = _records(
+        Enrollment.objects.filter(course_group__in=groups).values_list("course_group_id", "student_id", "student__username"),
+        ["gid", "sid", "username"],
+    ) if Enrollment is not None else pd.DataFrame(columns=["gid", "sid", "username"])
+
+    # Promedio final de todos los grupos a la vez
+    g = grades.merge(assess[["aid", "weight", "total"]], on="aid")
+    g["ratio"] = (g["score"] / g["total"].where(g["total"] > 0)).fillna(0.0)
+    g["weighted"] = g["ratio"] * g["weight"]
+    per = g.groupby(["gid", "sid"])[["weighted", "ratio"]].sum()
+    per_group = assess.groupby("gid").agg(wsum=("weight", "sum"), n=("aid", "size"))
+    per = per.join(per_group, on="gid")
+    share = np.where(per["wsum"] > 0, per["weighted"] / per["wsum"].where(per["wsum"] > 0), per["ratio"] / per["n"])
+    final = pd.Series(np.round(GRADE_SCALE * np.clip(share, 0.0, 1.0), 2), index=per.index, name="final")
+
+    wide = (
+        grades.pivot_table(index=["gid", "sid"], columns="aid", values="score", aggfunc="first")
+        if not grades.empty else pd.DataFrame(index=pd.MultiIndex.from_arrays([[], []], names=["gid", "sid"]))
+    )
+    students = (
+        pd.concat([roster, grades[["gid", "sid", "username"]]])
+        .drop_duplicates(["gid", "sid"])
+        .set_index(["gid", "sid"])
+    )
+    rows = students.join(wide).join(final)
+    # Matriculado sin notas en un grupo con evaluaciones: final 0
+    rows["final"] = rows["final"].fillna(0.0).where(rows.index.get_level_values("gid").isin(assess["gid"]))
+    rank = {gid: i for i, gid in enumerate(group_df["gid"])}
+    rows = rows.assign(_rank=rows.index.get_level_values("gid").map(rank)).sort_values(["_rank", "username"]).drop(columns="_rank")
+
+    layout = []
+    by_group = {gid: list(zip(a["aid"], _unique_labels(a["label"]))) for gid, a in assess.groupby("gid", sort=False)}
+    for gid, course, section in group_df.itertuples(index=False):
+        layout.append((gid, course, section, by_group.get(gid, [])))
+    return {"groups": layout, "rows": rows}
+
+
+def _cell(value):
+    return None if value is None or (isinstance(value, float) and np.isnan(value)) else value
+
+
+def csv_rows(book: dict):
+    """(cabecera, filas) del registro en un solo CSV: curso, sección, alumno, evaluaciones (unión), final."""
+    labels: list[str] = []
+    for _gid, _c, _s, cols in book["groups"]:
+        labels.extend(lbl for _aid, lbl in cols if lbl not in labels)
+    header = ["curso", "seccion", "username", *labels, "final"]
+    info = {gid: (course, section, {lbl: aid for aid, lbl in cols}) for gid, course, section, cols in book["groups"]}
+
+    def rows():
+        frame = book["rows"]
+        if frame.empty:
+            return
+        for (gid, _sid), rec in zip(frame.index, frame.to_dict("records")):
+            course, section, aids = info[gid]
+            yield [course, section, rec["username"], *(_cell(rec.get(aids[lbl])) if lbl in aids else None for lbl in labels), _cell(rec["final"])]
+    return header, rows()
+
+
+def write_xlsx(book: dict, fileobj) -> None:
+    """Una hoja por grupo con openpyxl en modo write_only (filas directo al zip)."""
+    wb = Workbook(write_only=True)
+    frame = book["rows"]
+    used: set[str] = set()
+    for gid, course, section, cols in book["groups"]:
+        base = _SHEET_BAD.sub("_", f"{course}-{section}")
+        title, n = base[:31], 1
+        while title in used:
+            n += 1
+            title = f"{base[:28]}~{n}"
+        used.add(title)
+        ws = wb.create_sheet(title=title)
+        ws.append(["username", *(lbl for _aid, lbl in cols), "final"])
+        if frame.empty or gid not in frame.index.get_level_values("gid"):
+            continue
+        part = frame.xs(gid, level="gid")
+        for rec in part.to_dict("records"):
+            ws.append([rec["username"], *(_cell(rec.get(aid)) for aid, _lbl in cols), _cell(rec["final"])])
+    if not book["groups"]:
+        wb.create_sheet(title="registro").append(["username", "final"])
+    wb.save(fileobj)
@@ -0,0 +1,200 @@
+# apps/academics/idempotency.py
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, HttpResponseRedirect
+from django.utils import timezone
+
+# ────────────────────────────────────────────────────────────────
+# Idempotencia para POST de matrícula (cart_add, cart_confirm)
+#
+# Cada POST lleva una clave: la cabecera Idempotency-Key o el campo
+# "idempotency_key" del formulario; si no viene, se deriva del token CSRF
+# del formulario (cambia en cada render de la página, pero es igual en un
+# doble clic o en el reintento de un proxy) más la ruta y el cuerpo. La
+# primera petición con esa clave corre la vista y guarda el resultado
+# (redirección y mensajes) por IDEMPOTENCY_TTL segundos; las repeticiones
+# reciben ese resultado sin tocar las tablas de matrícula. Una repetición
+# que llega mientras la primera sigue corriendo espera hasta
+# IDEMPOTENCY_WAIT segundos.
+#
+# Backends:
+#   "cache" → caché de Django (cache.add es atómico en memcached/redis/db)
+#   "db"    → tabla IdempotencyRecord (la limpia el barrido de reservas)
+# ────────────────────────────────────────────────────────────────
+HEADER = "HTTP_IDEMPOTENCY_KEY"
+FORM_FIELD = "idempotency_key"
+PENDING = "pending"
+
+
+def _conf(name: str, default):
+    return getattr(settings, f"IDEMPOTENCY_{name}", default)
+
+
+class CacheStore:
+    PREFIX = "academics:idem:"
+
+    def begin(self, key: str, ttl: int) -> bool:
+        return cache.add(self.PREFIX + key, PENDING, timeout=ttl)
+
+    def get(self, key: str):
+        return cache.get(self.PREFIX + key)
+
+    def finish(self, key: str, result: dict, ttl: int):
+        cache.set(self.PREFIX + key, result, timeout=ttl)
+
+    def abort(self, key: str):
+        cache.delete(self.PREFIX + key)
+
+    def purge(self) -> int:
+        return 0  # la caché expira sola
+
+
+class DbStore:
+    def _model(self):
+        from .models import IdempotencyRecord
+        return IdempotencyRecord
+
+    def begin(self, key: str, ttl: int) -> bool:
+        R = self._model()
+        now = timezone.now()
+        R.objects.filter(key=key, expires_at__lte=now).delete()
+        try:
+            with transaction.atomic():
+                R.objects.create(key=key, expires_at=now + timedelta(seconds=ttl))
+            return True
+        except IntegrityError:
+            return False
+
+    def get(self, key: str):
+        R = self._model()
+        row = R.objects.filter(key=key, expires_at__gt=timezone.now()).values_list("state", "result").first()
+        if row is None:
+            return None
+        return PENDING if row[0] == R.PENDING else row[1]
+
+    def finish(self, key: str, result: dict, ttl: int):
+        R = self._model()
+        R.objects.filter(key=key).update(
+            state=R.DONE, result=result, expires_at=timezone.now() + timedelta(seconds=ttl)
+        )
+
+    def abort(self, key: str):
+        self._model().objects.filter(key=key).delete()
+
+    def purge(self) -> int:
+        return self._model().objects.filter(expires_at__lte=timezone.now()).delete()[0]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = DbStore() if _conf("BACKEND", "cache") == "db" else CacheStore()
+        return _store
+
+
+def request_key(request) -> str | None:
+    """Clave de la petición (por usuario); None si no hay con qué derivarla."""
+    raw = request.META.get(HEADER) or request.POST.get(FORM_FIELD)
+    if not raw:
+        token = request.POST.get("csrfmiddlewaretoken")
+        if not token:
+            return None
+        body = sorted((k, v) for k, v in request.POST.items() if k != "csrfmiddlewaretoken")
+        raw = f"csrf:{token}:{body}"
+    digest = hashlib.sha256(f"{request.user.pk}:{request.path}:{raw}".encode("utf-8")).hexdigest()
+    return digest
+
+
+def _queued_messages(request) -> list:
+    storage = getattr(request, "_messages", None)
+    return list(getattr(storage, "_queued_messages", []))
+
+
+def _snapshot(request, response, before: int) -> dict | None:
+    """Lo necesario para repetir la respuesta: redirección + mensajes nuevos."""
+    if response.status_code >= 500 or getattr(response, "streaming", False):
+        return None
+    return {
+        "status": response.status_code,
+        "location": response.get("Location"),
+        "messages": [(m.level, m.message, m.extra_tags) for m in _queued_messages(request)[before:]],
+        "content": None if response.get("Location") else response.content.decode("utf-8", "replace"),
+        "content_type": response.get("Content-Type"),
+    }
+
+
+def _replay(request, result: dict) -> HttpResponse:
+    for level, text, tags in result.get("messages", []):
+        messages.add_message(request, level, text, extra_tags=tags or "")
+    if result.get("location"):
+        resp = HttpResponseRedirect(result["location"])
+        resp.status_code = result["status"]
+    else:
+        resp = HttpResponse(result.get("content") or "", status=result["status"], content_type=result.get("content_type"))
+    resp["Idempotent-Replay"] = "true"
+    return resp
+
+
+def _wait_for(store, key: str):
+    deadline = time.monotonic() + _conf("WAIT", 5)
+    while time.monotonic() < deadline:
+        result = store.get(key)
+        if result != PENDING:
+            return result
+        time.sleep(0.1)
+    return PENDING
+
+
+def idempotent(view):
+    """Decorador para POST: una sola ejecución por clave durante IDEMPOTENCY_TTL."""
+    @wraps(view)
+    def _wrapped(request, *args, **kwargs):
+        if request.method != "POST":
+            return view(request, *args, **kwargs)
+        key = request_key(request)
+        if key is None:
+            return view(request, *args, **kwargs)
+
+        store, ttl = get_store(), _conf("TTL", 600)
+        # Si la primera falló y soltó la clave, esta la toma y corre
+        # normalmente; un solo reintento: si otra se la gana de nuevo, 409
+        for attempt in range(2):
+            if store.begin(key, ttl):
+                break
+            result = _wait_for(store, key)
+            if result is None and attempt == 0:
+                continue
+            if result is None or result == PENDING:
+                resp = HttpResponse("Tu solicitud anterior aún se está procesando.", status=409)
+                resp["Retry-After"] = "2"
+                return resp
+            return _replay(request, result)
+
+        before = len(_queued_messages(request))
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            store.abort(key)
+            raise
+        result = _snapshot(request, response, before)
+        if result is None:
+            store.abort(key)
+        else:
+            store.finish(key, result, ttl)
+        return response
+    return _wrapped
@@ -0,0 +1,581 @@
+# apps/academics/jobs.py
+from __future__ import annotations
+
+import csv
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from io import TextIOWrapper
+from zipfile import BadZipFile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.validators import validate_email
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+from . import grade_history, services_grades
+from .registry import registry
+from .services_capacity import seat_added
+from .term_cache import term_cache
+
+logger = logging.getLogger(__name__)
+
+# ────────────────────────────────────────────────────────────────
+# Cola local de importaciones (ImportJob)
+#
+# Las vistas de carga (y el botón Importar del admin) guardan el archivo
+# en MEDIA_ROOT, crean un ImportJob en cola y responden de inmediato.
+# run_import_worker (N hilos; puede correr en varias máquinas contra la
+# misma BD) toma trabajos con un UPDATE condicional:
+#     UPDATE ... SET status='R' WHERE id = ? AND status = 'Q'
+# el que afecta la fila se queda con el trabajo, sin SELECT ... FOR UPDATE
+# (SQLite no lo tiene). El archivo se lee por bloques de CHUNK_SIZE filas;
+# cada bloque se escribe en su transacción junto con el progreso (filas,
+# conteos, heartbeat). Las filas omitidas van a un CSV de errores con su
+# número de línea y la razón.
+#
+# Un trabajo "en proceso" sin heartbeat por IMPORT_JOBS_STALE segundos
+# (el worker murió) vuelve a la cola y empieza de nuevo: las tres
+# importaciones son idempotentes (upsert de notas, alumnos y matrículas
+# existentes no se duplican). Tras IMPORT_JOBS_MAX_ATTEMPTS intentos queda
+# fallido. Con IMPORT_JOBS_SYNC=True enqueue() lo procesa en el acto.
+# ────────────────────────────────────────────────────────────────
+CHUNK_SIZE = 500
+
+# Columnas (obligatorias, opcionales) por tipo de importación
+COLUMNS = {
+    "grades": (("student_username", "assessment", "points"), ("course_code", "section")),
+    "students": (("username",), ("first_name", "last_name", "email")),
+    "enrollments": (("student_username", "course_code", "section"), ()),
+}
+# Nombres alternativos de cabecera (los de los recursos de import-export del admin)
+ALIASES = {
+    "student__username": "student_username",
+    "course_group__course__code": "course_code",
+    "course_group__section": "section",
+    "curso": "course_code",
+    "seccion": "section",
+}
+
+
+class JobError(ValueError):
+    """El archivo no se puede procesar (columnas, grupo, tipo)."""
+
+
+class _Lost(RuntimeError):
+    """Otro worker tomó el trabajo (este se dio por muerto y se reencoló)."""
+
+
+def _conf(name: str, default):
+    return getattr(settings, f"IMPORT_JOBS_{name}", default)
+
+
+def _model():
+    return registry.model("academics", "ImportJob")
+
+
+def _cell(value) -> str:
+    return "" if value is None else str(value).strip()
+
+
+def required_columns(kind: str, params=None) -> tuple[str, ...]:
+    """Columnas obligatorias; las notas sin grupo fijo necesitan curso y sección por fila."""
+    required = COLUMNS[kind][0]
+    if kind == "grades" and not (params or {}).get("group_id"):
+        required = (*required, "course_code", "section")
+    return required
+
+
+# ────────────────────────────────────────────────────────────────
+# Lectura del archivo: CSV o XLSX (se reconoce por el contenido)
+#
+# CSV: UTF-8 (con o sin BOM); si no decodifica, Windows-1252, que es lo
+# que guarda Excel en español con "CSV (delimitado por comas)".
+# XLSX: openpyxl en modo read_only lee la primera hoja fila a fila desde
+# el zip, sin cargar el libro: la memoria no crece con las filas.
+# ────────────────────────────────────────────────────────────────
+CSV_ENCODINGS = ("utf-8-sig", "cp1252")
+_XLSX_MAGIC = b"PK\x03\x04"
+
+
+def _normalize(header) -> list[str]:
+    return [ALIASES.get(_cell(h), _cell(h)) for h in header]
+
+
+def _is_xlsx(fileobj) -> bool:
+    head = fileobj.read(4)
+    fileobj.seek(0)
+    return head == _XLSX_MAGIC
+
+
+def _workbook(fileobj):
+    try:
+        return load_workbook(fileobj, read_only=True, data_only=True)
+    except (BadZipFile, InvalidFileException, KeyError, OSError) as exc:
+        raise JobError("El archivo XLSX está dañado o no es un libro de Excel.") from exc
+
+
+def _xlsx_value(value) -> str:
+    """Celda de Excel como texto: 15.0 → "15", fechas en ISO."""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return _cell(value)
+
+
+def _xlsx_rows(sheet):
+    rows = sheet.iter_rows(values_only=True)
+    header = _normalize(next(rows, ()))
+    for number, values in enumerate(rows, start=2):
+        values = [_xlsx_value(v) for v in values]
+        if any(values):
+            yield number, dict(zip(header, values))
+
+
+def _csv_rows(text):
+    """Genera (línea, {columna: valor}) saltando líneas en blanco; la primera es la cabecera."""
+    reader = csv.reader(text)
+    header = _normalize(next(reader, []))
+    for values in reader:
+        if any(v.strip() for v in values):
+            yield reader.line_num, dict(zip(header, values))
+
+
+def _csv_text(fileobj, probe):
+    """TextIOWrapper con la primera codificación con la que `probe(texto)` no falla."""
+    for encoding in CSV_ENCODINGS:
+        text = TextIOWrapper(fileobj, encoding=encoding, errors="replace" if encoding == CSV_ENCODINGS[-1] else "strict", newline="")
+        try:
+            result = probe(text)
+        except UnicodeDecodeError:
+            text.detach()
+            fileobj.seek(0)
+            continue
+        text.seek(0)
+        return text, result
+
+
+def read_header(fileobj) -> list[str]:
+    """Cabecera normalizada de un CSV o XLSX; deja el archivo al inicio."""
+    try:
+        if _is_xlsx(fileobj):
+            wb = _workbook(fileobj)
+            try:
+                return _normalize(next(wb.worksheets[0].iter_rows(max_row=1, values_only=True), ()))
+            finally:
+                wb.close()
+        text, header = _csv_text(fileobj, lambda t: _normalize(next(csv.reader(t), [])))
+        text.detach()
+        return header
+    finally:
+        fileobj.seek(0)
+
+
+def missing_columns(kind: str, fileobj, params=None) -> list[str]:
+    """Columnas obligatorias que no trae el archivo (para rechazarlo al subirlo)."""
+    header = set(read_header(fileobj))
+    return [c for c in required_columns(kind, params) if c not in header]
+
+
+def _open(job):
+    """(cerrar, cabecera, total de filas, iterador de filas) del archivo del trabajo."""
+    return open_rows(job.upload.open("rb"))
+
+
+def open_rows(fh):
+    """
+    (cerrar, cabecera, total de filas, iterador de (línea, fila)) de un CSV
+    o XLSX abierto en binario; cerrar() también cierra `fh`.
+    """
+    try:
+        if _is_xlsx(fh):
+            wb = _workbook(fh)
+            sheet = wb.worksheets[0]
+            header = _normalize(next(sheet.iter_rows(max_row=1, values_only=True), ()))
+            # La dimensión guardada por Excel (sin contar la cabecera); se corrige al terminar
+            total = max((sheet.max_row or 1) - 1, 0)
+
+            def close():
+                wb.close()
+                fh.close()
+            return close, header, total, _xlsx_rows(sheet)
+        text, total = _csv_text(fh, lambda t: sum(1 for _ in _csv_rows(t)))
+        header = _normalize(next(csv.reader(text), []))
+        text.seek(0)
+        return text.close, header, total, _csv_rows(text)
+    except Exception:
+        fh.close()
+        raise
+
+
+def _chunks(rows, size: int):
+    chunk = []
+    for item in rows:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _ErrorReport:
+    """CSV de filas omitidas: línea, columnas originales y razón (en disco temporal)."""
+
+    def __init__(self, header):
+        self.count = 0
+        self._header = header
+        self._raw = tempfile.TemporaryFile()
+        # Con BOM: Excel lo abre como UTF-8
+        self._text = TextIOWrapper(self._raw, encoding="utf-8-sig", newline="")
+        self._writer = csv.writer(self._text)
+        self._writer.writerow(["linea", *header, "error"])
+
+    def add(self, line: int, row: dict, reason: str):
+        self.count += 1
+        self._writer.writerow([line, *(row.get(h, "") for h in self._header), reason])
+
+    def save(self, job):
+        """Guarda el reporte en job.error_file (sin guardar el modelo) si hubo omitidas."""
+        if self.count:
+            self._text.flush()
+            self._raw.seek(0)
+            job.error_file.save(f"job_{job.pk}_errores.csv", File(self._raw), save=False)
+        self.close()
+
+    def close(self):
+        self._text.close()
+
+
+# ────────────────────────────────────────────────────────────────
+# Tipos de importación
+# Cada uno recibe un bloque [(línea, fila)] y retorna
+# (creadas, actualizadas, [(línea, razón)]); `ctx` guarda lo que se
+# resuelve una vez por trabajo.
+# ────────────────────────────────────────────────────────────────
+def _group_index(ctx) -> dict[tuple[str, str], int]:
+    """{(código de curso, sección): grupo} del término actual (todos si no hay término)."""
+    if "groups" not in ctx:
+        CourseGroup = registry.model("academics", "CourseGroup")
+        qs = CourseGroup.objects.all()
+        if registry.has_field(CourseGroup, "term"):
+            term = term_cache.current_term()
+            if term is not None:
+                qs = qs.filter(term=term)
+        ctx["groups"] = {(code, section): pk for pk, code, section in qs.values_list("pk", "course__code", "section")}
+    return ctx["groups"]
+
+
+def _import_grades(job, chunk, ctx):
+    CourseGroup = registry.model("academics", "CourseGroup")
+    group_id = job.params.get("group_id")
+    errors = []
+    if group_id:
+        if "group" not in ctx:
+            ctx["group"] = CourseGroup.objects.filter(pk=group_id).first()
+            if ctx["group"] is None:
+                raise JobError(f"El grupo {group_id} no existe.")
+        by_group = {group_id: chunk}
+    else:
+        index = _group_index(ctx)
+        by_group = defaultdict(list)
+        for line, row in chunk:
+            gid = index.get((_cell(row.get("course_code")), _cell(row.get("section"))))
+            if gid is None:
+                errors.append((line, "grupo no encontrado"))
+            else:
+                by_group[gid].append((line, row))
+
+    created = updated = 0
+    for gid, items in by_group.items():
+        result = services_grades.import_grade_rows(CourseGroup(pk=gid), [row for _line, row in items])
+        created += result["created"]
+        updated += result["updated"]
+        errors.extend((items[i][0], reason) for i, reason in result["errors"])
+    return created, updated, errors
+
+
+def _student_role(User):
+    if not registry.has_field(User, "role"):
+        return None
+    Role = User._meta.get_field("role").related_model
+    return Role.objects.get_or_create(name="Alumno")[0]
+
+
+def _invalid_student(User, username: str, values: dict) -> str | None:
+    if not username:
+        return "faltan datos"
+    try:
+        if len(username) > User._meta.get_field("username").max_length:
+            return "usuario demasiado largo"
+        User.username_validator(username)
+        if "email" in values:
+            validate_email(values["email"])
+    except ValidationError as exc:
+        return f"dato inválido: {exc.messages[0]}"
+    return None
+
+
+def _import_students(job, chunk, ctx):
+    """
+    Crea los usuarios que faltan (rol Alumno, sin contraseña utilizable) y
+    actualiza nombres/email solo de alumnos: un usuario existente con otro
+    rol, o de staff, queda como error de fila y no se toca.
+    """
+    User = get_user_model()
+    if "role" not in ctx:
+        ctx["role"] = _student_role(User)
+    names = {_cell(row.get("username")) for _line, row in chunk}
+    fields = ["pk", "username", "first_name", "last_name", "email", "is_staff", "is_superuser"]
+    if ctx["role"] is not None:
+        fields.append("role")
+    existing = {u.username: u for u in User.objects.filter(username__in=names).only(*fields)}
+    new, changed, errors = {}, {}, []
+    for line, row in chunk:
+        username = _cell(row.get("username"))
+        values = {f: _cell(row.get(f)) for f in COLUMNS["students"][1] if _cell(row.get(f))}
+        reason = _invalid_student(User, username, values)
+        if not reason and username in existing and not _is_plain_student(existing[username], ctx["role"]):
+            reason = "el usuario existe y no es alumno"
+        if reason:
+            errors.append((line, reason))
+            continue
+        if username in existing:
+            user = changed[username] = existing[username]
+        elif username in new:
+            user = new[username]
+        else:
+            user = new[username] = User(username=username, password=make_password(None))
+            if ctx["role"] is not None:
+                user.role = ctx["role"]
+        for field, value in values.items():
+            setattr(user, field, value[:User._meta.get_field(field).max_length])
+
+    User.objects.bulk_create(list(new.values()))
+    if changed:
+        User.objects.bulk_update(list(changed.values()), list(COLUMNS["students"][1]))
+    done = len(chunk) - len(errors)
+    return len(new), done - len(new), errors
+
+
+def _is_plain_student(user, role) -> bool:
+    if user.is_staff or user.is_superuser:
+        return False
+    return role is None or user.role_id == role.pk
+
+
+def _import_enrollments(job, chunk, ctx):
+    """Matricula sin controlar cupo (como el admin); el contador del grupo se ajusta igual."""
+    Enrollment = registry.model("academics", "Enrollment")
+    index = _group_index(ctx)
+    User = get_user_model()
+    users = dict(
+        User.objects.filter(username__in={_cell(row.get("student_username")) for _l, row in chunk})
+        .values_list("username", "pk")
+    )
+    wanted, errors = {}, []
+    for line, row in chunk:
+        username = _cell(row.get("student_username"))
+        sid = users.get(username)
+        gid = index.get((_cell(row.get("course_code")), _cell(row.get("section"))))
+        if not username:
+            errors.append((line, "faltan datos"))
+        elif sid is None:
+            errors.append((line, "alumno no encontrado"))
+        elif gid is None:
+            errors.append((line, "grupo no encontrado"))
+        elif (sid, gid) in wanted:
+            errors.append((line, "fila repetida"))
+        else:
+            wanted[(sid, gid)] = line
+
+    existing = set(
+        Enrollment.objects.filter(
+            student_id__in={s for s, _g in wanted}, course_group_id__in={g for _s, g in wanted}
+        ).values_list("student_id", "course_group_id")
+    ) if wanted else set()
+    errors.extend((line, "ya matriculado") for key, line in wanted.items() if key in existing)
+    new = [key for key in wanted if key not in existing]
+    # bulk_create no dispara post_save: el contador se mueve aquí, una vez por grupo
+    Enrollment.objects.bulk_create([Enrollment(student_id=s, course_group_id=g) for s, g in new], ignore_conflicts=True)
+    for gid, n in Counter(g for _s, g in new).items():
+        seat_added(gid, n)
+    return len(new), 0, errors
+
+
+HANDLERS = {
+    "grades": _import_grades,
+    "students": _import_students,
+    "enrollments": _import_enrollments,
+}
+
+
+# ────────────────────────────────────────────────────────────────
+# Cola
+# ────────────────────────────────────────────────────────────────
+def enqueue(kind: str, upload, user=None, **params):
+    """Guarda el archivo y crea el trabajo en cola. Retorna el ImportJob."""
+    Job = _model()
+    if kind not in HANDLERS:
+        raise JobError(f"Tipo de importación desconocido: {kind}")
+    job = Job(kind=kind, params=params, created_by=user if getattr(user, "is_authenticated", False) else None)
+    job.upload.save(os.path.basename(upload.name or f"{kind}.csv"), upload, save=False)
+    job.save()
+    if _conf("SYNC", False):
+        taken = _take(job.pk, "sync")
+        if taken is not None:
+            run_job(taken)
+        job.refresh_from_db()
+    return job
+
+
+def _take(pk: int, worker: str):
+    Job = _model()
+    now = timezone.now()
+    taken = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+        status=Job.RUNNING, worker=worker[:100], attempts=F("attempts") + 1,
+        started_at=now, heartbeat_at=now, finished_at=None, message="",
+    )
+    return Job.objects.get(pk=pk) if taken else None
+
+
+def claim(worker: str):
+    """Toma el trabajo en cola más antiguo (o None). Seguro con varios workers."""
+    Job = _model()
+    pending = Job.objects.filter(status=Job.QUEUED).order_by("created_at", "pk").values_list("pk", flat=True)[:20]
+    for pk in pending:
+        job = _take(pk, worker)
+        if job is not None:
+            return job
+    return None
+
+
+def requeue_stale() -> int:
+    """Devuelve a la cola (o da por fallidos) los trabajos cuyo worker dejó de responder."""
+    Job = _model()
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=now - timedelta(seconds=_conf("STALE", 300)))
+    max_attempts = _conf("MAX_ATTEMPTS", 3)
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status=Job.FAILED, finished_at=now, message="El worker dejó de responder y se agotaron los intentos."
+    )
+    requeued = stale.filter(attempts__lt=max_attempts).update(
+        status=Job.QUEUED, worker="", message="Reencolado: el worker dejó de responder."
+    )
+    return failed + requeued
+
+
+def _progress(job, **fields) -> None:
+    Job = type(job)
+    fields["heartbeat_at"] = timezone.now()
+    if not Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker).update(**fields):
+        raise _Lost(job.pk)
+
+
+def _finish(job, status: str, message: str) -> None:
+    Job = type(job)
+    now = timezone.now()
+    Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker).update(
+        status=status, message=message, finished_at=now, heartbeat_at=now, error_file=job.error_file.name or "",
+    )
+
+
+def run_job(job, chunk_size: int = CHUNK_SIZE) -> None:
+    """Procesa un trabajo ya tomado (status R) de principio a fin."""
+    Job = type(job)
+    handler = HANDLERS.get(job.kind)
+    close = report = None
+    try:
+        if handler is None:
+            raise JobError(f"Tipo de importación desconocido: {job.kind}")
+        close, header, total, rows = _open(job)
+        missing = [c for c in required_columns(job.kind, job.params) if c not in header]
+        if missing:
+            raise JobError("Faltan columnas: " + ", ".join(missing))
+        _progress(job, rows_total=total, rows_done=0, rows_created=0, rows_updated=0, rows_skipped=0)
+
+        report, ctx = _ErrorReport(header), {}
+        done = created = updated = 0
+        for chunk in _chunks(rows, chunk_size):
+            with transaction.atomic(), grade_history.import_context(job):
+                c, u, errors = handler(job, chunk, ctx)
+                done, created, updated = done + len(chunk), created + c, updated + u
+                lines = dict(chunk)
+                for line, reason in sorted(errors):
+                    report.add(line, lines[line], reason)
+                _progress(job, rows_done=done, rows_created=created, rows_updated=updated, rows_skipped=report.count)
+        _progress(job, rows_total=done)  # en XLSX el total era el de la dimensión de la hoja
+        outcome = (Job.DONE, f"Filas: {done}. Nuevas: {created}, Actualizadas: {updated}, Omitidas: {report.count}.")
+    except _Lost:
+        logger.warning("Importación #%s: la tomó otro worker, se abandona", job.pk)
+        outcome = None
+    except JobError as exc:
+        outcome = (Job.FAILED, str(exc))
+    except Exception as exc:  # noqa: BLE001 — el trabajo queda fallido, el worker sigue
+        logger.exception("Importación #%s falló", job.pk)
+        outcome = (Job.FAILED, f"Error inesperado: {exc}")
+    finally:
+        if close is not None:
+            close()
+    if report is not None:
+        # Si falló a mitad, las omitidas de los bloques ya escritos también se reportan
+        report.save(job) if outcome is not None else report.close()
+    if outcome is not None:
+        _finish(job, *outcome)
+
+
+def work(worker: str, stop: threading.Event | None = None, poll: float = 2.0, once: bool = False) -> int:
+    """Bucle de un worker: toma y procesa trabajos hasta `stop` (o hasta vaciar la cola con once)."""
+    processed = 0
+    try:
+        while stop is None or not stop.is_set():
+            requeue_stale()
+            job = claim(worker)
+            if job is None:
+                if once:
+                    break
+                if stop is not None:
+                    stop.wait(poll)
+                else:
+                    time.sleep(poll)
+                continue
+            run_job(job)
+            processed += 1
+    finally:
+        connection.close()  # cada hilo tiene su conexión
+    return processed
+
+
+def status(job) -> dict:
+    """Estado del trabajo para la vista de progreso."""
+    percent = round(100 * job.rows_done / job.rows_total, 1) if job.rows_total else None
+    return {
+        "id": job.pk,
+        "kind": job.kind,
+        "status": job.status,
+        "status_display": job.get_status_display(),
+        "rows_total": job.rows_total,
+        "rows_done": job.rows_done,
+        "percent": percent,
+        "created": job.rows_created,
+        "updated": job.rows_updated,
+        "skipped": job.rows_skipped,
+        "rows_per_second": job.rows_per_second,
+        "message": job.message,
+        "has_errors": bool(job.error_file),
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -0,0 +1,67 @@
+import csv
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from apps.academics.eligibility import cohort_eligibility, prereq_index
+from apps.academics.models import Course
+from apps.academics.registry import registry
+from apps.academics.term_cache import term_cache
+
+class Command(BaseCommand):
+    help = "Elegibilidad por prerrequisitos de una cohorte (o de todos los alumnos) para consejería"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cohort", help="Código de cohorte (StudentProfile.cohort)")
+        parser.add_argument("--course", action="append", default=[], help="Código de curso (repetible); por defecto los que tienen prerrequisitos")
+        parser.add_argument("--csv", dest="csv_path", help="Escribir alumno/curso/elegible/faltantes en este CSV")
+
+    def handle(self, *args, **options):
+        term = term_cache.current_term()
+        User = get_user_model()
+        students = User.objects.all()
+        if options["cohort"]:
+            Profile = registry.model("academics", "StudentProfile")
+            if Profile is None or not registry.has_field(Profile, "cohort"):
+                raise CommandError("No existe StudentProfile.cohort; no se puede filtrar por cohorte.")
+            students = students.filter(pk__in=Profile.objects.filter(cohort__code=options["cohort"]).values("user_id"))
+        elif registry.has_field(User, "role"):
+            students = students.filter(role__name="Alumno")
+        usernames = dict(students.values_list("pk", "username"))
+
+        index = prereq_index(term)
+        courses = Course.objects.all()
+        if options["course"]:
+            courses = courses.filter(code__in=options["course"])
+        else:
+            courses = courses.filter(pk__in=[c for c, reqs in index["requires"].items() if reqs])
+        codes = dict(courses.values_list("pk", "code"))
+        if not codes or not usernames:
+            self.stdout.write(self.style.WARNING("Sin alumnos o sin cursos con prerrequisitos."))
+            return
+
+        req_ids = {r for cid in codes for r in index["requires"].get(cid, {})}
+        req_codes = dict(Course.objects.filter(pk__in=req_ids).values_list("pk", "code"))
+
+        eligible, total = Counter(), Counter()
+        writer = fh = None
+        if options["csv_path"]:
+            fh = open(options["csv_path"], "w", newline="", encoding="utf-8")
+            writer = csv.writer(fh)
+            writer.writerow(["alumno", "curso", "elegible", "falta_aprobar"])
+        try:
+            for sid, cid, missing in cohort_eligibility(usernames, codes, term):
+                total[cid] += 1
+                eligible[cid] += not missing
+                if writer:
+                    writer.writerow([
+                        usernames[sid], codes[cid], "si" if not missing else "no",
+                        " ".join(req_codes.get(m, str(m)) for m, _ in missing),
+                    ])
+        finally:
+            if fh:
+                fh.close()
+
+        for cid, code in sorted(codes.items(), key=lambda kv: kv[1]):
+            self.stdout.write(f"{code}: elegibles={eligible[cid]}/{total[cid]}")
+        self.stdout.write(self.style.SUCCESS(f"Alumnos={len(usernames)}, cursos={len(codes)}"))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from apps.academics.services_waitlist import promote_waitlist
+
+class Command(BaseCommand):
+    help = "Ofrece los cupos libres a los siguientes alumnos de cada lista de espera"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200, help="Grupos revisados por pasada")
+
+    def handle(self, *args, **options):
+        offered = promote_waitlist(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Ofertas de lista de espera={offered}"))
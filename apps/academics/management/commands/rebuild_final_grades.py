@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from apps.academics.final_grades import rebuild
+
+class Command(BaseCommand):
+    help = "Recalcula por conjuntos las notas finales materializadas (FinalGrade) de todos los grupos o de algunos"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--group", type=int, action="append", dest="groups", help="Solo este grupo (repetible)")
+        parser.add_argument("--batch-size", type=int, default=200, help="Grupos por transacción")
+
+    def handle(self, *args, **options):
+        groups, written = rebuild(options["groups"], groups_per_batch=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Grupos recalculados={groups}, notas finales={written}"))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from apps.academics.models import CourseGroup, Enrollment, SeatShard
+from apps.academics.services_capacity import recount_sharded
+
+class Command(BaseCommand):
+    help = (
+        "Corrige la deriva de CourseGroup.enrolled_count con un único UPDATE; "
+        "en los grupos calientes reparte el número real entre sus fragmentos"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Solo informa, no corrige")
+
+    def handle(self, *args, **options):
+        real = Coalesce(
+            Subquery(
+                Enrollment.objects.filter(course_group=OuterRef("pk"))
+                .order_by()
+                .values("course_group")
+                .annotate(n=Count("pk"))
+                .values("n")
+            ),
+            0,
+        )
+        # En los calientes manda la suma de fragmentos: sync_hot_counters
+        # pisaría un enrolled_count corregido solo en el grupo
+        shard_total = Coalesce(
+            Subquery(
+                SeatShard.objects.filter(course_group=OuterRef("pk"))
+                .order_by()
+                .values("course_group")
+                .annotate(n=Sum("taken"))
+                .values("n")
+            ),
+            0,
+        )
+        drifted = CourseGroup.objects.filter(is_hot=False).exclude(enrolled_count=real)
+        hot = list(
+            CourseGroup.objects.filter(is_hot=True)
+            .alias(real=real, shard_total=shard_total)
+            .exclude(shard_total=F("real"))
+            .values_list("pk", flat=True)
+        )
+        n = drifted.count()
+        if options["dry_run"] or not (n or hot):
+            self.stdout.write(f"Grupos con deriva={n} calientes={len(hot)}")
+            return
+        fixed = drifted.update(enrolled_count=real) if n else 0
+        fixed_hot = sum(recount_sharded(gid) for gid in hot)
+        self.stdout.write(self.style.SUCCESS(f"Grupos corregidos={fixed} calientes={fixed_hot}"))
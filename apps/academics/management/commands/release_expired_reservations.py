@@ -1,14 +1,52 @@
+import logging
+import time
+
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from apps.academics.models import CapReservation, CartItem
+from django.db import DatabaseError, close_old_connections
+from apps.academics.idempotency import get_store as idempotency_store
+from apps.academics.registry import registry
+from apps.academics.services_capacity import sync_hot_counters
+from apps.academics.services_reservations import release_expired
+from apps.academics.services_waitlist import promote_waitlist
+
+logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
-    help = "Libera reservas y items de carrito expirados"
+    help = "Libera reservas y items de carrito expirados, sincroniza grupos calientes, promueve la lista de espera y purga claves de idempotencia (una vez o como barrido continuo con --loop)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Barrido continuo en vez de una sola pasada")
+        parser.add_argument("--interval", type=float, default=5.0, help="Segundos entre pasadas (con --loop)")
+        parser.add_argument("--batch-size", type=int, default=500, help="Filas por DELETE")
 
     def handle(self, *args, **options):
-        now = timezone.now()
-        res_del = CapReservation.objects.filter(reserved_until__lte=now).delete()[0]
-        items_del = CartItem.objects.filter(reserved_until__lte=now).delete()[0]
-        self.stdout.write(self.style.SUCCESS(
-            f"Reservas liberadas={res_del}, items removidos={items_del}"
-        ))
+        if registry.model("academics", "CapReservation") is None and registry.model("academics", "CartItem") is None:
+            self.stdout.write(self.style.WARNING("No existen CapReservation ni CartItem; solo se promueve la lista de espera."))
+
+        while True:
+            try:
+                self._sweep(options)
+            except DatabaseError:
+                # Con --loop una pasada fallida (p. ej. la conexión que MySQL
+                # cerró por wait_timeout) no detiene el barrido: se descarta
+                # la conexión y se reintenta en la siguiente pasada
+                if not options["loop"]:
+                    raise
+                logger.exception("Barrido de reservas: la pasada falló; se reintenta")
+            if not options["loop"]:
+                return
+            close_old_connections()
+            time.sleep(options["interval"])
+
+    def _sweep(self, options):
+        stats = release_expired(batch_size=options["batch_size"])
+        # Grupos calientes: el contador (y available_slots) desde sus fragmentos
+        sync_hot_counters()
+        # Los cupos recién liberados se ofrecen en la misma pasada
+        offered = promote_waitlist()
+        idempotency_store().purge()  # claves vencidas (backend "db")
+        if stats["seats"] or stats["items"] or offered or not options["loop"]:
+            self.stdout.write(self.style.SUCCESS(
+                f"Reservas liberadas={stats['seats']}, items removidos={stats['items']}, "
+                f"ofertas={offered}, pasada={stats['elapsed'] * 1000:.1f} ms"
+            ))
@@ -0,0 +1,40 @@
+import os
+import socket
+import threading
+
+from django.core.management.base import BaseCommand
+from apps.academics import jobs
+from apps.academics.registry import registry
+
+class Command(BaseCommand):
+    help = "Procesa la cola de importaciones (ImportJob) con un pool de workers; se puede correr en varias máquinas a la vez"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2, help="Hilos que toman trabajos en paralelo")
+        parser.add_argument("--poll", type=float, default=2.0, help="Segundos de espera cuando la cola está vacía")
+        parser.add_argument("--once", action="store_true", help="Vaciar la cola y salir")
+
+    def handle(self, *args, **options):
+        if registry.model("academics", "ImportJob") is None:
+            self.stdout.write(self.style.WARNING("No existe ImportJob; nada que procesar."))
+            return
+        stop = threading.Event()
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        done = [0] * options["workers"]
+
+        def loop(i):
+            done[i] = jobs.work(f"{prefix}:{i}", stop=stop, poll=options["poll"], once=options["once"])
+
+        threads = [threading.Thread(target=loop, args=(i,), name=f"import-worker-{i}") for i in range(options["workers"])]
+        for t in threads:
+            t.start()
+        try:
+            for t in threads:
+                while t.is_alive():
+                    t.join(timeout=1.0)
+        except KeyboardInterrupt:
+            # Los hilos terminan el trabajo en curso y salen
+            stop.set()
+            for t in threads:
+                t.join()
+        self.stdout.write(self.style.SUCCESS(f"Importaciones procesadas={sum(done)}"))
@@ -0,0 +1,38 @@
+import csv
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from apps.academics.models import CourseGroup
+from apps.academics.schedule_mask import all_clashes, refresh_group_masks
+from apps.academics.term_cache import term_cache
+
+class Command(BaseCommand):
+    help = "Reporta los cruces de horario de todos los alumnos (matrículas y carritos) usando las máscaras de horario"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true", help="Recalcular antes las máscaras desde Schedule")
+        parser.add_argument("--no-carts", action="store_true", help="Solo matrículas, sin carritos")
+        parser.add_argument("--csv", dest="csv_path", help="Escribir los cruces en este CSV")
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            self.stdout.write(f"Máscaras actualizadas={refresh_group_masks()}")
+
+        clashes = list(all_clashes(term_cache.current_term(), include_carts=not options["no_carts"]))
+        group_ids = {gid for _, a, b in clashes for gid in (a, b)}
+        groups = {g.pk: str(g) for g in CourseGroup.objects.select_related("course").filter(pk__in=group_ids)}
+        users = dict(
+            get_user_model().objects.filter(pk__in={sid for sid, _, _ in clashes}).values_list("pk", "username")
+        )
+        rows = [(users.get(sid, sid), groups.get(a, a), groups.get(b, b)) for sid, a, b in clashes]
+
+        if options["csv_path"]:
+            with open(options["csv_path"], "w", newline="", encoding="utf-8") as fh:
+                w = csv.writer(fh)
+                w.writerow(["alumno", "grupo_a", "grupo_b"])
+                w.writerows(rows)
+        else:
+            for row in rows:
+                self.stdout.write(" | ".join(map(str, row)))
+        style = self.style.WARNING if rows else self.style.SUCCESS
+        self.stdout.write(style(f"Cruces={len(rows)}, alumnos afectados={len({r[0] for r in rows})}"))
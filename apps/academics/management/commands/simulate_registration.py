@@ -0,0 +1,82 @@
+import json
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from apps.academics import simulation
+
+class Command(BaseCommand):
+    help = "Simula el día de matrícula: siembra un término sintético, lanza la carga concurrente y reporta métricas e invariantes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=5000)
+        parser.add_argument("--courses", type=int, default=40)
+        parser.add_argument("--groups-per-course", type=int, default=3)
+        parser.add_argument("--capacity", type=int, default=30, help="Cupo por grupo")
+        parser.add_argument("--picks", type=int, default=5, help="Grupos que intenta cada alumno")
+        parser.add_argument("--drop-ratio", type=float, default=0.2, help="Probabilidad de quitar un grupo antes de confirmar")
+        parser.add_argument("--workers", type=int, default=32)
+        parser.add_argument("--mode", choices=("thread", "process"), default="thread")
+        parser.add_argument("--seed", type=int, default=42, help="Semilla para que las corridas sean comparables")
+        parser.add_argument("--prefix", default="sim_", help="Prefijo de usuarios sembrados (mínimo 4 caracteres, sin uso previo)")
+        parser.add_argument(
+            "--allow-db", action="store_true", help="Permite correr con DEBUG=False (siembra y borra en esa BD)"
+        )
+        parser.add_argument("--keep", action="store_true", help="No borrar los datos sembrados al terminar")
+        parser.add_argument("--json", dest="json_path", help="Guardar el resultado en este archivo JSON")
+
+    def handle(self, *args, **o):
+        if not settings.DEBUG and not o["allow_db"]:
+            raise CommandError("DEBUG=False: esta base puede ser la real. Pasa --allow-db si de verdad quieres sembrar aquí.")
+        try:
+            seeded = simulation.seed(o["prefix"], o["students"], o["courses"], o["groups_per_course"], o["capacity"])
+        except simulation.SimulationError as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            f"Sembrado: alumnos={len(seeded['students'])}, grupos={sum(len(v) for v in seeded['groups'].values())}, "
+            f"BD={connection.vendor}"
+        )
+        locks_before = simulation.lock_wait_counters()
+        try:
+            result = simulation.run(seeded, o["workers"], o["mode"], o["picks"], o["drop_ratio"], o["seed"])
+            summary = simulation.summarize(result)
+            summary["invariants"] = simulation.check(seeded)
+            locks_after = simulation.lock_wait_counters()
+            summary["lock_waits"] = {k: locks_after[k] - locks_before.get(k, 0) for k in locks_after}
+        finally:
+            if o["keep"]:
+                self.stdout.write(f"Datos conservados con el prefijo {o['prefix']!r}; la próxima corrida necesita otro --prefix.")
+            else:
+                simulation.cleanup(seeded)
+
+        self._report(summary)
+        if o["json_path"]:
+            summary["options"] = {k: v for k, v in o.items() if k in {
+                "students", "courses", "groups_per_course", "capacity", "picks", "drop_ratio", "workers", "mode", "seed"}}
+            summary["vendor"] = connection.vendor
+            summary["commit"] = self._commit()
+            with open(o["json_path"], "w", encoding="utf-8") as fh:
+                json.dump(summary, fh, indent=2)
+            self.stdout.write(f"Resultado guardado en {o['json_path']}")
+
+    def _report(self, s):
+        self.stdout.write(f"Modo={s['mode']} flujo={s['flow']} duración={s['wall_s']:.2f} s throughput={s['ops_per_s']:.1f} ops/s")
+        for op, m in s["ops"].items():
+            self.stdout.write(
+                f"  {op:<8} n={m['count']:<6} p50={m['p50_ms']:.1f} ms p95={m['p95_ms']:.1f} ms p99={m['p99_ms']:.1f} ms "
+                f"consultas/op={m['queries_avg']:.1f} ok={m['ok']} rechazos={m['rejected']} bloqueos={m['lock']} errores={m['error']}"
+            )
+        if s["lock_waits"]:
+            self.stdout.write("  Esperas por bloqueo: " + ", ".join(f"{k}={v}" for k, v in s["lock_waits"].items()))
+        inv = s["invariants"]
+        line = (f"Invariantes: sobrecupo={inv['oversubscribed']}, deriva de contador={inv['counter_drift']}, "
+                f"reservas huérfanas={inv['orphan_reservations']}")
+        ok = not any(inv.values())
+        self.stdout.write(self.style.SUCCESS(line) if ok else self.style.ERROR(line))
+
+    def _commit(self):
+        try:
+            return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+        except Exception:
+            return None
@@ -0,0 +1,35 @@
+# apps/academics/middleware.py
+from __future__ import annotations
+
+from django.urls import NoReverseMatch, reverse
+
+from . import grade_history
+from .registry import registry
+
+
+class GradeHistoryMiddleware:
+    """
+    Los cambios de nota de la petición quedan en el historial con su usuario
+    y origen (admin o web). Va después de AuthenticationMiddleware; el
+    usuario se carga solo si la petición escribe notas.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._admin_prefix = None
+
+    def _is_admin(self, request) -> bool:
+        if self._admin_prefix is None:
+            try:
+                self._admin_prefix = reverse("admin:index")
+            except NoReverseMatch:
+                self._admin_prefix = ""
+        return bool(self._admin_prefix) and request.path.startswith(self._admin_prefix)
+
+    def __call__(self, request):
+        GradeEvent = registry.model("academics", "GradeEvent")
+        if GradeEvent is None:
+            return self.get_response(request)
+        source = GradeEvent.ADMIN if self._is_admin(request) else GradeEvent.WEB
+        with grade_history.context(source, actor=getattr(request, "user", None)):
+            return self.get_response(request)
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:19
+
+import django.db.models.expressions
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_enrolled_count(apps, schema_editor):
+    CourseGroup = apps.get_model("academics", "CourseGroup")
+    Enrollment = apps.get_model("academics", "Enrollment")
+    CourseGroup.objects.update(
+        enrolled_count=Coalesce(
+            Subquery(
+                Enrollment.objects.filter(course_group=OuterRef("pk"))
+                .order_by()
+                .values("course_group")
+                .annotate(n=Count("pk"))
+                .values("n")
+            ),
+            0,
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursegroup',
+            name='enrolled_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='coursegroup',
+            name='available_slots',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(capacity__gt=models.F('enrolled_count'), then=django.db.models.expressions.CombinedExpression(models.F('capacity'), '-', models.F('enrolled_count'))), default=models.Value(0)), output_field=models.PositiveIntegerField()),
+        ),
+        migrations.RunPython(backfill_enrolled_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0002_coursegroup_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdmissionTicket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(max_length=40, unique=True)),
+                ('state', models.CharField(choices=[('W', 'En cola'), ('A', 'Admitido')], default='W', max_length=1)),
+                ('enqueued_at', models.DateTimeField()),
+                ('admitted_at', models.DateTimeField(blank=True, null=True)),
+                ('last_seen', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Turno de sala de espera',
+                'verbose_name_plural': 'Turnos de sala de espera',
+                'indexes': [models.Index(fields=['state', 'enqueued_at'], name='academics_a_state_47084b_idx'), models.Index(fields=['state', 'last_seen'], name='academics_a_state_55fe13_idx'), models.Index(fields=['admitted_at'], name='academics_a_admitte_c3f1ad_idx')],
+            },
+        ),
+    ]
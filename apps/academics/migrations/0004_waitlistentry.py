@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:27
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0003_admissionticket'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('W', 'En espera'), ('O', 'Cupo ofrecido'), ('E', 'Matriculado'), ('X', 'Oferta vencida'), ('C', 'Cancelado')], default='W', max_length=1)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('offered_until', models.DateTimeField(blank=True, null=True)),
+                ('course_group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='academics.coursegroup')),
+                ('student', models.ForeignKey(limit_choices_to={'role__name': 'Alumno'}, on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Lista de espera',
+                'verbose_name_plural': 'Listas de espera',
+                'indexes': [models.Index(fields=['course_group', 'status', 'created_at'], name='academics_w_course__a115ad_idx'), models.Index(fields=['status', 'offered_until'], name='academics_w_status_cc8803_idx')],
+                'unique_together': {('course_group', 'student')},
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:30
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+# Copia congelada de schedule_mask.slot_bits (franjas de 5 min, LUN..SAB)
+SLOT_MINUTES = 5
+DAY_ORDER = ("LUN", "MAR", "MIE", "JUE", "VIE", "SAB")
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+
+
+def _slot_bits(day, start, end):
+    if day not in DAY_ORDER:
+        return 0
+    first = (start.hour * 60 + start.minute) // SLOT_MINUTES
+    last = -(-(end.hour * 60 + end.minute) // SLOT_MINUTES)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << (DAY_ORDER.index(day) * SLOTS_PER_DAY + first)
+
+
+def backfill_schedule_mask(apps, schema_editor):
+    CourseGroup = apps.get_model("academics", "CourseGroup")
+    Schedule = apps.get_model("attendance", "Schedule")
+    masks = defaultdict(int)
+    for gid, day, start, end in Schedule.objects.values_list("course_group_id", "day", "start_time", "end_time"):
+        masks[gid] |= _slot_bits(day, start, end)
+    CourseGroup.objects.bulk_update(
+        [CourseGroup(pk=gid, schedule_mask=format(mask, "x")) for gid, mask in masks.items() if mask],
+        ["schedule_mask"],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0004_waitlistentry'),
+        ('attendance', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursegroup',
+            name='schedule_mask',
+            field=models.CharField(blank=True, default='', editable=False, max_length=432),
+        ),
+        migrations.RunPython(backfill_schedule_mask, migrations.RunPython.noop),
+    ]
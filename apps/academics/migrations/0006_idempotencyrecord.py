@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0005_coursegroup_schedule_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('state', models.CharField(choices=[('P', 'En proceso'), ('D', 'Terminado')], default='P', max_length=1)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('expires_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Solicitud idempotente',
+                'verbose_name_plural': 'Solicitudes idempotentes',
+                'indexes': [models.Index(fields=['expires_at'], name='academics_i_expires_835014_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0006_idempotencyrecord'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursegroup',
+            name='is_hot',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.CreateModel(
+            name='SeatShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField()),
+                ('capacity', models.PositiveIntegerField(default=0)),
+                ('taken', models.PositiveIntegerField(default=0)),
+                ('course_group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='academics.coursegroup')),
+            ],
+            options={
+                'verbose_name': 'Fragmento de cupo',
+                'verbose_name_plural': 'Fragmentos de cupo',
+                'unique_together': {('course_group', 'index')},
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, FloatField, Sum
+from django.db.models.functions import Cast, NullIf
+
+# Copia congelada de final_grades.compute (escala 0-20, faltantes cuentan 0)
+GRADE_SCALE = 20
+
+
+def backfill_final_grades(apps, schema_editor):
+    Assessment = apps.get_model("academics", "Assessment")
+    Grade = apps.get_model("academics", "Grade")
+    FinalGrade = apps.get_model("academics", "FinalGrade")
+    weights = {
+        gid: (float(w or 0), n)
+        for gid, w, n in Assessment.objects.order_by().values("course_group_id")
+        .annotate(w=Sum("weight"), n=Count("pk")).values_list("course_group_id", "w", "n")
+    }
+    ratio = Cast("score", FloatField()) / NullIf(Cast("assessment__total_points", FloatField()), 0.0)
+    rows = (
+        Grade.objects.order_by()
+        .values_list("student_id", "assessment__course_group_id")
+        .annotate(
+            weighted=Sum(ratio * Cast("assessment__weight", FloatField()), output_field=FloatField()),
+            plain=Sum(ratio, output_field=FloatField()),
+        )
+    )
+    finals = []
+    for sid, gid, weighted, plain in rows:
+        wsum, n = weights.get(gid, (0.0, 0))
+        share = (weighted or 0.0) / wsum if wsum > 0 else ((plain or 0.0) / n if n else 0.0)
+        finals.append(FinalGrade(student_id=sid, course_group_id=gid, score=round(GRADE_SCALE * share, 2)))
+    FinalGrade.objects.bulk_create(finals, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0007_seat_shards'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FinalGrade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course_group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='final_grades', to='academics.coursegroup')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='final_grades', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Nota final',
+                'verbose_name_plural': 'Notas finales',
+                'unique_together': {('student', 'course_group')},
+            },
+        ),
+        migrations.RunPython(backfill_final_grades, migrations.RunPython.noop),
+    ]
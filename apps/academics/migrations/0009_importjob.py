@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0008_finalgrade'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('grades', 'Notas'), ('students', 'Estudiantes'), ('enrollments', 'Matrículas')], max_length=20)),
+                ('status', models.CharField(choices=[('Q', 'En cola'), ('R', 'Procesando'), ('D', 'Terminado'), ('F', 'Fallido')], default='Q', max_length=1)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('upload', models.FileField(upload_to='imports/%Y/%m/')),
+                ('error_file', models.FileField(blank=True, upload_to='imports/errors/')),
+                ('rows_total', models.PositiveIntegerField(default=0)),
+                ('rows_done', models.PositiveIntegerField(default=0)),
+                ('rows_created', models.PositiveIntegerField(default=0)),
+                ('rows_updated', models.PositiveIntegerField(default=0)),
+                ('rows_skipped', models.PositiveIntegerField(default=0)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='import_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Importación en cola',
+                'verbose_name_plural': 'Importaciones en cola',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='academics_i_status_5a8322_idx'), models.Index(fields=['status', 'heartbeat_at'], name='academics_i_status_0da13e_idx')],
+            },
+        ),
+    ]
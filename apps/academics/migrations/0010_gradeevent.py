@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:07
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_grade_events(apps, schema_editor):
+    # Punto de partida del historial: un evento "migración" por nota existente
+    Grade = apps.get_model("academics", "Grade")
+    GradeEvent = apps.get_model("academics", "GradeEvent")
+    now, batch = timezone.now(), []
+    rows = Grade.objects.order_by("pk").values_list("student_id", "assessment_id", "assessment__course_group_id", "score")
+    for sid, aid, gid, score in rows.iterator(chunk_size=2000):
+        batch.append(GradeEvent(student_id=sid, assessment_id=aid, course_group_id=gid, new_score=score, source="M", created_at=now))
+        if len(batch) >= 2000:
+            GradeEvent.objects.bulk_create(batch)
+            batch = []
+    GradeEvent.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0009_importjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_score', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('new_score', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('source', models.CharField(choices=[('W', 'Web'), ('A', 'Admin'), ('I', 'Importación'), ('S', 'Consola/comando'), ('M', 'Migración')], default='S', max_length=1)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('assessment', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='grade_events', to='academics.assessment')),
+                ('course_group', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='grade_events', to='academics.coursegroup')),
+                ('import_job', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='grade_events', to='academics.importjob')),
+                ('student', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='grade_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Cambio de nota',
+                'verbose_name_plural': 'Historial de notas',
+                'indexes': [models.Index(fields=['course_group', 'created_at'], name='academics_g_course__70c884_idx'), models.Index(fields=['student', 'created_at'], name='academics_g_student_f6f465_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_grade_events, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0010_gradeevent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='admissionticket',
+            name='state',
+            field=models.CharField(choices=[('W', 'En cola'), ('A', 'Admitido'), ('G', 'Torniquete')], default='W', max_length=1),
+        ),
+    ]
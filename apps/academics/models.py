@@ -1,5 +1,8 @@
 from django.db import models
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
 
 # --- Cursos y secciones/grupos ---
 class Course(models.Model):
@@ -20,11 +23,47 @@ class Course(models.Model):
     def __str__(self):
         return f"{self.code} - {self.name}"
 
+class CourseGroupQuerySet(models.QuerySet):
+    def with_seat_totals(self):
+        """Anota `seats_taken`: suma de fragmentos si el grupo es caliente, si no el contador."""
+        shard_sum = (
+            SeatShard.objects.filter(course_group=OuterRef("pk"))
+            .order_by()
+            .values("course_group")
+            .annotate(n=Sum("taken"))
+            .values("n")
+        )
+        return self.annotate(
+            seats_taken=Case(
+                When(is_hot=True, then=Coalesce(Subquery(shard_sum), Value(0))),
+                default=F("enrolled_count"),
+                output_field=models.PositiveIntegerField(),
+            )
+        )
+
 class CourseGroup(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="groups")
     section = models.CharField(max_length=10)  # p.ej. A, B, LAB1
     is_lab = models.BooleanField(default=False)
     capacity = models.PositiveIntegerField(default=30)
+    # Contadores denormalizados: enrolled_count solo se modifica con UPDATE
+    # atómicos (services_capacity / signals); available_slots lo calcula la BD.
+    enrolled_count = models.PositiveIntegerField(default=0, editable=False)
+    available_slots = models.GeneratedField(
+        expression=Case(
+            When(capacity__gt=F("enrolled_count"), then=F("capacity") - F("enrolled_count")),
+            default=Value(0),
+        ),
+        output_field=models.PositiveIntegerField(),
+        db_persist=True,
+    )
+    # Franjas semanales ocupadas (hex); la recalculan las señales de Schedule
+    schedule_mask = models.CharField(max_length=432, blank=True, default="", editable=False)
+    # Grupo caliente: el cupo se reparte en SeatShard (acción del admin);
+    # enrolled_count se sincroniza desde los fragmentos en el barrido.
+    is_hot = models.BooleanField(default=False, editable=False)
+
+    objects = CourseGroupQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Grupo/Sección"
@@ -35,14 +74,44 @@ class CourseGroup(models.Model):
         t = " (LAB)" if self.is_lab else ""
         return f"{self.course.code}-{self.section}{t}"
 
-    @property
-    def enrolled_count(self) -> int:
-        return self.enrollments.count()
+    def save(self, *args, **kwargs):
+        # Un save() con una instancia vieja (p. ej. desde el admin) no debe
+        # pisar el contador que otros procesos vienen incrementando, ni la
+        # marca de grupo caliente (la mueven shard_group/unshard_group).
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and not f.generated and f.name not in ("enrolled_count", "is_hot")
+            ]
+        super().save(*args, **kwargs)
 
     @property
     def has_capacity(self) -> bool:
         return self.enrolled_count < self.capacity
 
+    @property
+    def seats_taken(self) -> int:
+        """Cupos ocupados; en grupos calientes, suma de sus fragmentos (una consulta)."""
+        if not self.is_hot:
+            return self.enrolled_count
+        return self.shards.aggregate(n=Sum("taken"))["n"] or 0
+
+# --- Fragmentos de cupo de grupos calientes ---
+class SeatShard(models.Model):
+    """Parte del cupo de un grupo caliente; cada matrícula toma de un fragmento."""
+    course_group = models.ForeignKey(CourseGroup, on_delete=models.CASCADE, related_name="shards")
+    index = models.PositiveSmallIntegerField()
+    capacity = models.PositiveIntegerField(default=0)
+    taken = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Fragmento de cupo"
+        verbose_name_plural = "Fragmentos de cupo"
+        unique_together = ("course_group", "index")
+
+    def __str__(self):
+        return f"{self.course_group} #{self.index}: {self.taken}/{self.capacity}"
+
 # --- Matrículas ---
 class Enrollment(models.Model):
     student = models.ForeignKey(
@@ -109,3 +178,212 @@ class Grade(models.Model):
 
     def __str__(self):
         return f"{self.student.username} - {self.assessment.title}: {self.score}"
+
+class GradeEvent(models.Model):
+    """
+    Historial de notas, solo inserciones (grade_history.py): un cambio de
+    puntaje por fila. new_score vacío = nota borrada. Las referencias no
+    llevan restricción en la BD para que el historial sobreviva a los borrados.
+    """
+    WEB = "W"
+    ADMIN = "A"
+    IMPORT = "I"
+    SHELL = "S"
+    MIGRATION = "M"
+    SOURCE_CHOICES = [(WEB, "Web"), (ADMIN, "Admin"), (IMPORT, "Importación"), (SHELL, "Consola/comando"), (MIGRATION, "Migración")]
+
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name="grade_events"
+    )
+    assessment = models.ForeignKey(
+        Assessment, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name="grade_events"
+    )
+    course_group = models.ForeignKey(
+        CourseGroup, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name="grade_events"
+    )
+    old_score = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    new_score = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    source = models.CharField(max_length=1, choices=SOURCE_CHOICES, default=SHELL)
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+        null=True, blank=True, related_name="+",
+    )
+    import_job = models.ForeignKey(
+        "ImportJob", on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name="grade_events"
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Cambio de nota"
+        verbose_name_plural = "Historial de notas"
+        indexes = [
+            models.Index(fields=["course_group", "created_at"]),  # registro a una fecha
+            models.Index(fields=["student", "created_at"]),  # historial del alumno
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} - {self.assessment_id}: {self.old_score} → {self.new_score}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("El historial de notas no se modifica.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("El historial de notas no se borra.")
+
+class FinalGrade(models.Model):
+    """Promedio final (0-20) del alumno en el grupo; lo mantiene final_grades.py."""
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="final_grades")
+    course_group = models.ForeignKey(CourseGroup, on_delete=models.CASCADE, related_name="final_grades")
+    score = models.DecimalField(max_digits=5, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Nota final"
+        verbose_name_plural = "Notas finales"
+        unique_together = ("student", "course_group")
+
+    def __str__(self):
+        return f"{self.student_id} - {self.course_group_id}: {self.score}"
+
+# --- Sala de espera (control de admisión en día de matrícula) ---
+class AdmissionTicket(models.Model):
+    """Turno de una sesión en la sala de espera (backend "db" de waiting_room)."""
+    WAITING = "W"
+    ACTIVE = "A"
+    GATE = "G"
+    STATE_CHOICES = [(WAITING, "En cola"), (ACTIVE, "Admitido"), (GATE, "Torniquete")]
+    # Fila fija que serializa las admisiones (SELECT ... FOR UPDATE); ninguna sesión tiene clave vacía
+    GATE_KEY = ""
+
+    session_key = models.CharField(max_length=40, unique=True)
+    state = models.CharField(max_length=1, choices=STATE_CHOICES, default=WAITING)
+    enqueued_at = models.DateTimeField()
+    admitted_at = models.DateTimeField(null=True, blank=True)
+    last_seen = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Turno de sala de espera"
+        verbose_name_plural = "Turnos de sala de espera"
+        indexes = [
+            models.Index(fields=["state", "enqueued_at"]),
+            models.Index(fields=["state", "last_seen"]),
+            models.Index(fields=["admitted_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.session_key} ({self.get_state_display()})"
+
+# --- Lista de espera por grupo ---
+class WaitlistEntry(models.Model):
+    """Un turno por alumno y grupo; promote_waitlist ofrece los cupos que se liberan."""
+    WAITING = "W"
+    OFFERED = "O"
+    ENROLLED = "E"
+    EXPIRED = "X"
+    CANCELLED = "C"
+    STATUS_CHOICES = [
+        (WAITING, "En espera"),
+        (OFFERED, "Cupo ofrecido"),
+        (ENROLLED, "Matriculado"),
+        (EXPIRED, "Oferta vencida"),
+        (CANCELLED, "Cancelado"),
+    ]
+
+    course_group = models.ForeignKey(CourseGroup, on_delete=models.CASCADE, related_name="waitlist")
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        limit_choices_to={"role__name": "Alumno"},
+        related_name="waitlist_entries",
+    )
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default=WAITING)
+    created_at = models.DateTimeField(default=timezone.now)  # orden en la cola
+    offered_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Lista de espera"
+        verbose_name_plural = "Listas de espera"
+        unique_together = ("course_group", "student")
+        indexes = [
+            models.Index(fields=["course_group", "status", "created_at"]),
+            models.Index(fields=["status", "offered_until"]),
+        ]
+
+    def __str__(self):
+        return f"{self.student.username} -> {self.course_group} ({self.get_status_display()})"
+
+# --- Idempotencia de POST (backend "db" de idempotency) ---
+class IdempotencyRecord(models.Model):
+    """Resultado guardado de un POST para responder igual a sus reintentos."""
+    PENDING = "P"
+    DONE = "D"
+    STATE_CHOICES = [(PENDING, "En proceso"), (DONE, "Terminado")]
+
+    key = models.CharField(max_length=64, unique=True)
+    state = models.CharField(max_length=1, choices=STATE_CHOICES, default=PENDING)
+    result = models.JSONField(null=True, blank=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Solicitud idempotente"
+        verbose_name_plural = "Solicitudes idempotentes"
+        indexes = [models.Index(fields=["expires_at"])]
+
+    def __str__(self):
+        return f"{self.key} ({self.get_state_display()})"
+
+# --- Importaciones en segundo plano (apps/academics/jobs.py) ---
+class ImportJob(models.Model):
+    """Archivo subido en cola de importación; lo procesa run_import_worker."""
+    QUEUED = "Q"
+    RUNNING = "R"
+    DONE = "D"
+    FAILED = "F"
+    STATUS_CHOICES = [(QUEUED, "En cola"), (RUNNING, "Procesando"), (DONE, "Terminado"), (FAILED, "Fallido")]
+
+    GRADES = "grades"
+    STUDENTS = "students"
+    ENROLLMENTS = "enrollments"
+    KIND_CHOICES = [(GRADES, "Notas"), (STUDENTS, "Estudiantes"), (ENROLLMENTS, "Matrículas")]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default=QUEUED)
+    params = models.JSONField(default=dict, blank=True)  # p. ej. {"group_id": 12}
+    upload = models.FileField(upload_to="imports/%Y/%m/")
+    error_file = models.FileField(upload_to="imports/errors/", blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="import_jobs"
+    )
+    rows_total = models.PositiveIntegerField(default=0)
+    rows_done = models.PositiveIntegerField(default=0)
+    rows_created = models.PositiveIntegerField(default=0)
+    rows_updated = models.PositiveIntegerField(default=0)
+    rows_skipped = models.PositiveIntegerField(default=0)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Importación en cola"
+        verbose_name_plural = "Importaciones en cola"
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["status", "heartbeat_at"]),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.get_kind_display()} ({self.get_status_display()})"
+
+    @property
+    def rows_per_second(self) -> float | None:
+        """Filas procesadas por segundo desde que empezó (hasta que terminó)."""
+        if self.started_at is None or not self.rows_done:
+            return None
+        elapsed = ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+        return round(self.rows_done / elapsed, 1) if elapsed > 0 else None
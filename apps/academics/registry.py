@@ -0,0 +1,127 @@
+# apps/academics/registry.py
+from __future__ import annotations
+
+import threading
+
+from django.apps import apps
+
+# ────────────────────────────────────────────────────────────────
+# Registro de capacidades del esquema
+#
+# Varias vistas y servicios toleran modelos/campos que aún no existen
+# (Term, CartItem, AttendanceRecord, score vs value, group vs
+# course_group...). En vez de preguntar a apps.get_model() y recorrer
+# _meta.get_fields() en cada petición o fila, todo se resuelve una sola vez
+# en AcademicsConfig.ready() y aquí solo se consultan diccionarios.
+# ────────────────────────────────────────────────────────────────
+OPTIONAL_MODELS = (
+    ("academics", "Course"),
+    ("academics", "CourseGroup"),
+    ("academics", "Enrollment"),
+    ("academics", "Assessment"),
+    ("academics", "Grade"),
+    ("academics", "GradeEvent"),
+    ("academics", "FinalGrade"),
+    ("academics", "ImportJob"),
+    ("academics", "Term"),
+    ("academics", "TermRule"),
+    ("academics", "EnrollmentCart"),
+    ("academics", "CartItem"),
+    ("academics", "CapReservation"),
+    ("academics", "WaitlistEntry"),
+    ("academics", "StudentProfile"),
+    ("academics", "PaymentOrder"),
+    ("academics", "EnrollmentAttempt"),
+    ("academics", "CoursePrerequisite"),
+    ("academics", "CourseCorequisite"),
+    ("attendance", "Schedule"),
+    ("attendance", "Session"),
+    ("attendance", "AttendanceRecord"),
+    ("auth", "User"),
+)
+
+# Nombres alternativos que el código acepta, en orden de preferencia
+GROUP_FK_NAMES = ("course_group", "group")
+POINTS_FIELD_NAMES = ("score", "value")
+LABEL_FIELD_NAMES = ("title", "name")
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = False
+        self._models: dict[tuple[str, str], type | None] = {}
+        self._fields: dict[type, frozenset[str]] = {}
+        self._picks: dict[tuple[type, tuple[str, ...]], str | None] = {}
+
+    # ── construcción ────────────────────────────────────────────
+    def build(self):
+        """Resuelve modelos opcionales y nombres de campos. Idempotente."""
+        with self._lock:
+            if self._built:
+                return
+            for Model in apps.get_models(include_auto_created=True):
+                self._fields[Model] = frozenset(f.name for f in Model._meta.get_fields())
+            for app_label, name in OPTIONAL_MODELS:
+                self._models[(app_label, name.lower())] = self._resolve(app_label, name)
+            self._built = True
+
+    def _ensure(self):
+        # El admin se autodescubre antes que AcademicsConfig.ready()
+        if not self._built:
+            self.build()
+
+    @staticmethod
+    def _resolve(app_label: str, name: str):
+        try:
+            Model = apps.get_model(app_label, name)
+        except LookupError:
+            return None
+        # auth.User queda registrado aunque AUTH_USER_MODEL lo reemplace
+        if Model._meta.swapped:
+            Model = apps.get_model(Model._meta.swapped)
+        return Model
+
+    # ── consultas O(1) ──────────────────────────────────────────
+    def model(self, app_label: str, name: str):
+        """Modelo o None si no existe (equivale al antiguo _gm)."""
+        self._ensure()
+        key = (app_label, name.lower())
+        if key not in self._models:
+            self._models[key] = self._resolve(app_label, name)
+        return self._models[key]
+
+    def field_names(self, Model) -> frozenset[str]:
+        if Model is None:
+            return frozenset()
+        self._ensure()
+        names = self._fields.get(Model)
+        if names is None:
+            names = self._fields[Model] = frozenset(f.name for f in Model._meta.get_fields())
+        return names
+
+    def has_field(self, Model, name: str) -> bool:
+        return name in self.field_names(Model)
+
+    def pick(self, Model, candidates: tuple[str, ...]) -> str | None:
+        """Primer nombre de `candidates` que existe como campo en Model."""
+        key = (Model, candidates)
+        if key not in self._picks:
+            names = self.field_names(Model)
+            self._picks[key] = next((c for c in candidates if c in names), None)
+        return self._picks[key]
+
+    def group_fk(self, Model) -> str | None:
+        """'course_group' o 'group', según cómo se llame la FK al grupo."""
+        return self.pick(Model, GROUP_FK_NAMES)
+
+    def points_field(self, Model) -> str | None:
+        """'score' o 'value' en modelos de notas."""
+        return self.pick(Model, POINTS_FIELD_NAMES)
+
+    def label_field(self, Model) -> str | None:
+        """'title' o 'name' en evaluaciones."""
+        return self.pick(Model, LABEL_FIELD_NAMES)
+
+
+registry = ModelRegistry()
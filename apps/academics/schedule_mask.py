@@ -0,0 +1,158 @@
+# apps/academics/schedule_mask.py
+from __future__ import annotations
+
+import heapq
+from collections import defaultdict
+
+from .models import CourseGroup, Enrollment
+from .registry import registry
+
+# ────────────────────────────────────────────────────────────────
+# Máscara semanal de horario
+#
+# La semana (LUN..SAB) se parte en franjas de SLOT_MINUTES; cada grupo
+# guarda en CourseGroup.schedule_mask (hex) el bit de cada franja que
+# ocupa según sus Schedule. Dos grupos se cruzan si (a & b) != 0: una
+# operación de bits, sin comparar intervalos ni leer Schedule. Los bordes
+# se redondean hacia afuera (inicio hacia abajo, fin hacia arriba), así
+# que horarios que no caen en múltiplos de SLOT_MINUTES se ven un poco
+# más largos. La máscara se recalcula con las señales de Schedule.
+# ────────────────────────────────────────────────────────────────
+SLOT_MINUTES = 5
+DAY_ORDER = ("LUN", "MAR", "MIE", "JUE", "VIE", "SAB")
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+MASK_HEX_LENGTH = (len(DAY_ORDER) * SLOTS_PER_DAY + 3) // 4  # 432 caracteres
+
+
+def slot_bits(day: str, start, end) -> int:
+    """Bits de las franjas que ocupa un bloque (day, start_time, end_time)."""
+    if day not in DAY_ORDER:
+        return 0
+    first = (start.hour * 60 + start.minute) // SLOT_MINUTES
+    last = -(-(end.hour * 60 + end.minute) // SLOT_MINUTES)  # techo
+    if last <= first:
+        return 0
+    base = DAY_ORDER.index(day) * SLOTS_PER_DAY
+    return ((1 << (last - first)) - 1) << (base + first)
+
+
+def to_hex(mask: int) -> str:
+    return format(mask, "x") if mask else ""
+
+
+def from_hex(value: str | None) -> int:
+    return int(value, 16) if value else 0
+
+
+def union(masks) -> int:
+    """OR de máscaras (enteros o hex)."""
+    out = 0
+    for m in masks:
+        out |= from_hex(m) if isinstance(m, str) or m is None else m
+    return out
+
+
+# ────────────────────────────────────────────────────────────────
+# Recalcular máscaras desde Schedule
+# ────────────────────────────────────────────────────────────────
+def refresh_group_masks(group_ids=None, batch_size: int = 1000) -> int:
+    """Recalcula schedule_mask de los grupos dados (o de todos). Retorna cuántos cambiaron."""
+    Schedule = registry.model("attendance", "Schedule")
+    if Schedule is None:
+        return 0
+    groups = CourseGroup.objects.all()
+    if group_ids is not None:
+        groups = groups.filter(pk__in=list(group_ids))
+    current = dict(groups.values_list("pk", "schedule_mask"))
+    if not current:
+        return 0
+
+    masks = defaultdict(int)
+    rows = Schedule.objects.filter(course_group_id__in=list(current)).values_list(
+        "course_group_id", "day", "start_time", "end_time"
+    )
+    for gid, day, start, end in rows:
+        masks[gid] |= slot_bits(day, start, end)
+
+    changed = [
+        CourseGroup(pk=gid, schedule_mask=to_hex(masks[gid]))
+        for gid, old in current.items()
+        if old != to_hex(masks[gid])
+    ]
+    CourseGroup.objects.bulk_update(changed, ["schedule_mask"], batch_size=batch_size)
+    return len(changed)
+
+
+# ────────────────────────────────────────────────────────────────
+# Ocupación del alumno y cruces
+# ────────────────────────────────────────────────────────────────
+def _term_groups(qs, term, prefix: str):
+    if term is not None and registry.has_field(CourseGroup, "term"):
+        return qs.filter(**{f"{prefix}term": term})
+    return qs
+
+
+def enrolled_masks(user, term=None) -> list[tuple[int, int]]:
+    """[(group_id, máscara)] de las matrículas del alumno (del término si aplica), una consulta."""
+    qs = _term_groups(Enrollment.objects.filter(student=user), term, "course_group__")
+    return [
+        (gid, from_hex(m))
+        for gid, m in qs.values_list("course_group_id", "course_group__schedule_mask")
+        if m
+    ]
+
+
+def first_clash(mask: int, others) -> int | None:
+    """Primer group_id de `others` [(gid, máscara)] que se cruza con `mask`."""
+    if not mask:
+        return None
+    for gid, other in others:
+        if mask & other:
+            return gid
+    return None
+
+
+def internal_clashes(items) -> list[tuple[int, int]]:
+    """Pares (gid_a, gid_b) que se cruzan dentro de una lista [(gid, máscara)]."""
+    pairs = []
+    seen: list[tuple[int, int]] = []
+    occupied = 0
+    for gid, mask in items:
+        if mask & occupied:
+            pairs.extend((other, gid) for other, m in seen if m & mask)
+        occupied |= mask
+        seen.append((gid, mask))
+    return pairs
+
+
+def all_clashes(term=None, include_carts: bool = True):
+    """
+    Cruces de todos los alumnos: genera (student_id, gid_a, gid_b). Recorre
+    matrículas (y carritos si existen) ordenadas por alumno, sin cargar
+    todo en memoria ni consultar Schedule.
+    """
+    sources = [
+        _term_groups(Enrollment.objects.all(), term, "course_group__")
+        .exclude(course_group__schedule_mask="")
+        .order_by("student_id")
+        .values_list("student_id", "course_group_id", "course_group__schedule_mask")
+        .iterator(chunk_size=2000)
+    ]
+    CartItem = registry.model("academics", "CartItem")
+    if include_carts and CartItem is not None:
+        sources.append(
+            _term_groups(CartItem.objects.all(), term, "course_group__")
+            .exclude(course_group__schedule_mask="")
+            .order_by("cart__student_id")
+            .values_list("cart__student_id", "course_group_id", "course_group__schedule_mask")
+            .iterator(chunk_size=2000)
+        )
+    student, items = None, {}
+    for sid, gid, mask in heapq.merge(*sources, key=lambda row: row[0]):
+        if sid != student:
+            for a, b in internal_clashes(items.items()):
+                yield student, a, b
+            student, items = sid, {}
+        items[gid] = from_hex(mask)  # un grupo en carrito y matriculado cuenta una vez
+    for a, b in internal_clashes(items.items()):
+        yield student, a, b
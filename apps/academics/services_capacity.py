@@ -0,0 +1,393 @@
+# apps/academics/services_capacity.py
+from __future__ import annotations
+
+import operator
+import random
+from functools import reduce
+
+from django.conf import settings
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import LessThan
+
+from .models import CourseGroup, Enrollment, SeatShard
+
+
+# ────────────────────────────────────────────────────────────────
+# Motor de capacidad
+#
+# Un carrito bloquea sus grupos con un solo SELECT ... FOR UPDATE, SIEMPRE
+# en orden ascendente de pk: dos carritos que compartan grupos esperan en
+# el mismo orden y no hay deadlocks. Con las filas tomadas, el cupo se
+# ocupa con un UPDATE condicional sobre el contador denormalizado:
+#     UPDATE ... SET enrolled_count = enrolled_count + 1
+#     WHERE id IN (...) AND enrolled_count < capacity
+# take_seat() es la variante de un solo grupo (si afecta 0 filas, está lleno).
+# Al confirmar un carrito, `held` descuenta lo que otros alumnos retienen
+# (reservas y ofertas vigentes): la condición pasa a
+# enrolled_count + retenidos < capacity.
+#
+# Los grupos calientes (is_hot) no se bloquean: su cupo vive repartido en
+# SeatShard y cada matrícula toma de un fragmento al azar con el mismo
+# UPDATE condicional; ver "Grupos calientes" más abajo.
+# ────────────────────────────────────────────────────────────────
+class CapacityError(RuntimeError):
+    """No hay cupo en uno o más grupos. `full_groups` lista sus ids."""
+
+    def __init__(self, message: str, full_groups=()):
+        super().__init__(message)
+        self.full_groups = tuple(full_groups)
+
+
+def _ordered_ids(group_ids) -> list[int]:
+    return sorted({int(g) for g in group_ids if g is not None})
+
+
+def _room(group_id: int, held: int = 0) -> Q:
+    # enrolled_count + held < capacity, sin restar: en MariaDB los contadores
+    # son sin signo y capacity - held podría quedar negativo
+    if not held:
+        return Q(pk=group_id, enrolled_count__lt=F("capacity"))
+    return Q(LessThan(F("enrolled_count") + held, F("capacity")), pk=group_id)
+
+
+def take_seat(group_id: int, held: int = 0) -> bool:
+    """Ocupa un cupo si queda alguno además de los `held` retenidos por otros. True si lo consiguió."""
+    return bool(
+        CourseGroup.objects.filter(_room(group_id, held))
+        .update(enrolled_count=F("enrolled_count") + 1)
+    )
+
+
+def seat_added(group_id: int, n: int = 1) -> None:
+    """Refleja en el contador matrículas creadas fuera del motor (admin, importaciones)."""
+    shard = (
+        SeatShard.objects.filter(course_group_id=group_id)
+        .order_by(F("taken") - F("capacity"), "index")
+        .values_list("pk", flat=True)
+        .first()
+    )
+    if shard is not None:
+        SeatShard.objects.filter(pk=shard).update(taken=F("taken") + n)
+        return
+    CourseGroup.objects.filter(pk=group_id).update(enrolled_count=F("enrolled_count") + n)
+
+
+def seat_released(group_id: int, n: int = 1) -> None:
+    """Libera cupos al borrar matrículas; nunca deja el contador en negativo."""
+    shard = (
+        SeatShard.objects.filter(course_group_id=group_id, taken__gte=n)
+        .order_by("-taken", "index")
+        .values_list("pk", flat=True)
+        .first()
+    )
+    if shard is not None:
+        SeatShard.objects.filter(pk=shard, taken__gte=n).update(taken=F("taken") - n)
+        return
+    CourseGroup.objects.filter(pk=group_id, enrolled_count__gte=n).update(
+        enrolled_count=F("enrolled_count") - n
+    )
+
+
+def lock_groups(group_ids) -> dict[int, tuple[int, int]]:
+    """
+    SELECT ... FOR UPDATE de los grupos en orden de pk, en una sola consulta.
+    Retorna {id: (enrolled_count, capacity)}. Debe ir dentro de una transacción.
+    Los grupos calientes no se bloquean ni aparecen en el resultado.
+    """
+    ids = _ordered_ids(group_ids)
+    if not ids:
+        return {}
+    rows = (
+        CourseGroup.objects.select_for_update()
+        .filter(pk__in=ids, is_hot=False)
+        .order_by("pk")
+        .values_list("pk", "enrolled_count", "capacity")
+    )
+    return {pk: (enrolled, capacity) for pk, enrolled, capacity in rows}
+
+
+# ────────────────────────────────────────────────────────────────
+# Grupos calientes
+#
+# shard_group() reparte la capacidad del grupo (y lo ya ocupado) en N filas
+# SeatShard. take_sharded() elige un fragmento con espacio al azar y lo
+# toma con UPDATE ... SET taken = taken + 1 WHERE taken < capacity (con
+# SELECT ... FOR UPDATE SKIP LOCKED delante donde la BD lo tiene, así un
+# fragmento ocupado por otra transacción se salta): N alumnos confirmando
+# el mismo grupo se reparten en N filas distintas en vez de una. Si los fragmentos elegibles se agotan pero al grupo aún le queda
+# cupo (otro fragmento se llenó antes), rebalance() bloquea los fragmentos
+# (no la fila del grupo: la matrícula que otra transacción inserta después
+# de tomar su fragmento la referencia, y esperarían una a la otra) y
+# reparte el sobrante. El total del grupo es la suma de
+# `taken` (CourseGroup.seats_taken / with_seat_totals); enrolled_count se
+# pone al día en cada pasada del barrido con sync_hot_counters().
+# ────────────────────────────────────────────────────────────────
+def _split(total: int, n: int) -> list[int]:
+    return [total // n + (1 if i < total % n else 0) for i in range(n)]
+
+
+def _fill(capacities: list[int], enrolled: int) -> list[int]:
+    """Ocupados por fragmento: se llenan en orden; el sobrecupo previo (capacidad reducida) queda en el primero."""
+    taken, left = [], enrolled
+    for cap in capacities:
+        taken.append(min(cap, left))
+        left -= taken[-1]
+    taken[0] += left
+    return taken
+
+
+@transaction.atomic
+def shard_group(group_id: int, shards: int | None = None) -> int:
+    """Marca el grupo como caliente y crea sus fragmentos. Retorna cuántos creó (0 si ya lo era)."""
+    group = CourseGroup.objects.select_for_update().filter(pk=group_id).first()
+    if group is None or group.is_hot:
+        return 0
+    n = max(1, min(shards or getattr(settings, "SEAT_SHARD_COUNT", 8), group.capacity or 1))
+    capacities = _split(group.capacity, n)
+    taken = _fill(capacities, group.enrolled_count)
+    SeatShard.objects.bulk_create(
+        [SeatShard(course_group_id=group_id, index=i, capacity=c, taken=t) for i, (c, t) in enumerate(zip(capacities, taken))]
+    )
+    CourseGroup.objects.filter(pk=group_id).update(is_hot=True)
+    return n
+
+
+@transaction.atomic
+def unshard_group(group_id: int) -> bool:
+    """Vuelve el grupo al contador único: enrolled_count = suma de fragmentos."""
+    group = CourseGroup.objects.select_for_update().filter(pk=group_id, is_hot=True).first()
+    if group is None:
+        return False
+    shards = SeatShard.objects.select_for_update().filter(course_group_id=group_id).order_by("index")
+    total = shards.aggregate(n=Sum("taken"))["n"] or 0
+    CourseGroup.objects.filter(pk=group_id).update(enrolled_count=total, is_hot=False)
+    SeatShard.objects.filter(course_group_id=group_id).delete()
+    return True
+
+
+@transaction.atomic
+def recount_sharded(group_id: int) -> bool:
+    """
+    Reparte entre los fragmentos el número real de matrículas, como
+    shard_group(), y deja enrolled_count igual. True si los fragmentos
+    tenían deriva. Se cuenta con los fragmentos bloqueados: las tomas en
+    curso ya confirmaron y las nuevas esperan.
+    """
+    capacity = CourseGroup.objects.filter(pk=group_id, is_hot=True).values_list("capacity", flat=True).first()
+    if capacity is None:
+        return False
+    shards = list(SeatShard.objects.select_for_update().filter(course_group_id=group_id).order_by("index"))
+    if not shards:
+        return False
+    real = Enrollment.objects.filter(course_group_id=group_id).count()
+    if real == sum(s.taken for s in shards):
+        return False
+    capacities = _split(capacity, len(shards))
+    for shard, cap, taken in zip(shards, capacities, _fill(capacities, real)):
+        shard.capacity, shard.taken = cap, taken
+    SeatShard.objects.bulk_update(shards, ["capacity", "taken"])
+    CourseGroup.objects.filter(pk=group_id).update(enrolled_count=real)
+    return True
+
+
+@transaction.atomic
+def rebalance(group_id: int) -> int | None:
+    """
+    Reparte el cupo sobrante (capacity - suma de taken) entre los fragmentos.
+    Retorna el sobrante, o None si el grupo ya no es caliente.
+    """
+    capacity = CourseGroup.objects.filter(pk=group_id, is_hot=True).values_list("capacity", flat=True).first()
+    if capacity is None:
+        return None
+    # Todos los fragmentos en orden de índice: dos rebalanceos se turnan y
+    # la suma de taken no cambia mientras se reparte
+    shards = list(SeatShard.objects.select_for_update().filter(course_group_id=group_id).order_by("index"))
+    if not shards:
+        return None
+    spare = max(0, capacity - sum(s.taken for s in shards))
+    for shard, extra in zip(shards, _split(spare, len(shards))):
+        shard.capacity = shard.taken + extra
+    SeatShard.objects.bulk_update(shards, ["capacity"])
+    return spare
+
+
+def _take_shard(pk: int, skip_locked: bool) -> bool:
+    if not skip_locked:
+        return bool(SeatShard.objects.filter(pk=pk, taken__lt=F("capacity")).update(taken=F("taken") + 1))
+    # Un fragmento que otra transacción tiene tomado se salta en vez de
+    # esperarlo: en PostgreSQL el UPDATE que espera deja la fila bloqueada
+    # aunque al final no la cambie, y dos tomas terminarían esperándose
+    free = (
+        SeatShard.objects.select_for_update(skip_locked=True)
+        .filter(pk=pk, taken__lt=F("capacity"))
+        .values_list("pk", flat=True)
+        .first()
+    )
+    return free is not None and bool(SeatShard.objects.filter(pk=pk).update(taken=F("taken") + 1))
+
+
+def take_sharded(group_id: int) -> bool:
+    """Ocupa un cupo en algún fragmento del grupo caliente. True si lo consiguió."""
+    skip_locked = connections[router.db_for_write(SeatShard)].features.has_select_for_update_skip_locked
+    for attempt in range(2):
+        candidates = list(
+            SeatShard.objects.filter(course_group_id=group_id, taken__lt=F("capacity")).values_list("pk", flat=True)
+        )
+        random.shuffle(candidates)
+        for pk in candidates:
+            if _take_shard(pk, skip_locked):
+                return True
+        if attempt == 0:
+            spare = rebalance(group_id)
+            if spare is None:
+                return take_seat(group_id)  # se volvió a contador único entre medio
+            if not spare:
+                return False
+    return False
+
+
+def sync_hot_counters() -> int:
+    """enrolled_count de los grupos calientes = suma de sus fragmentos (un UPDATE)."""
+    total = Coalesce(
+        Subquery(
+            SeatShard.objects.filter(course_group=OuterRef("pk"))
+            .order_by()
+            .values("course_group")
+            .annotate(n=Sum("taken"))
+            .values("n")
+        ),
+        0,
+    )
+    return CourseGroup.objects.filter(is_hot=True).exclude(enrolled_count=total).update(enrolled_count=total)
+
+
+@transaction.atomic
+def reserve_seats(student, group_ids, all_or_none: bool = False, held=None) -> tuple[list[int], list[int]]:
+    """
+    Matricula a `student` en cada grupo con cupo, en un número fijo de consultas.
+    Retorna (ids_matriculados, ids_sin_cupo). Los grupos donde el alumno
+    ya estaba matriculado no cuentan en ninguna de las dos listas. Cada
+    grupo caliente suma unas pocas consultas (ver _reserve_hot).
+
+    held = {group_id: cupos retenidos por otros} (seats_held); un grupo
+    tiene cupo si enrolled_count + retenidos < capacity.
+
+    all_or_none=True: si algún grupo está lleno lanza CapacityError y no
+    matricula ninguno.
+    """
+    ids = _ordered_ids(group_ids)
+    locked = lock_groups(ids)
+    # Lo que no quedó bloqueado es caliente (o no existe): va por fragmentos
+    rest = [gid for gid in ids if gid not in locked]
+    hot = list(CourseGroup.objects.filter(pk__in=rest, is_hot=True).values_list("pk", flat=True)) if rest else []
+    if not locked and not hot:
+        return [], []
+
+    # Lectura con bloqueo, después de bloquear los grupos: con REPEATABLE
+    # READ (InnoDB) una lectura simple usaría la instantánea de las lecturas
+    # previas del carrito y no vería la matrícula que otra confirmación del
+    # mismo alumno acaba de confirmar; el contador subiría de más y
+    # bulk_create(ignore_conflicts) descartaría la fila en silencio.
+    already = set(
+        Enrollment.objects.select_for_update()
+        .filter(student=student, course_group_id__in=[*locked, *hot])
+        .values_list("course_group_id", flat=True)
+    )
+    held = held or {}
+    wanted = [gid for gid in locked if gid not in already]
+    fits = [gid for gid in wanted if locked[gid][0] + held.get(gid, 0) < locked[gid][1]]
+    full = [gid for gid in wanted if gid not in fits]
+
+    if full and all_or_none:
+        raise CapacityError("Uno o más grupos ya no tienen cupo; no se matriculó ninguno.", full)
+    hot_fits, hot_full = _reserve_hot(student, sorted(gid for gid in hot if gid not in already), held)
+    if hot_full and all_or_none:
+        raise CapacityError("Uno o más grupos ya no tienen cupo; no se matriculó ninguno.", hot_full)
+    full += hot_full
+    if not fits:
+        return hot_fits, sorted(full)
+
+    # Con las filas bloqueadas el UPDATE conjunto siempre afecta len(fits)
+    # filas. Sin bloqueo de filas (SQLite) puede quedarse corto: se deshace
+    # y se toma cupo grupo por grupo con el UPDATE condicional de siempre.
+    sid = transaction.savepoint()
+    taken = (
+        CourseGroup.objects.filter(reduce(operator.or_, (_room(gid, held.get(gid, 0)) for gid in fits)))
+        .update(enrolled_count=F("enrolled_count") + 1)
+    )
+    if taken == len(fits):
+        transaction.savepoint_commit(sid)
+    else:
+        transaction.savepoint_rollback(sid)
+        full += [gid for gid in fits if not take_seat(gid, held.get(gid, 0))]
+        fits = [gid for gid in fits if gid not in full]
+        if full and all_or_none:
+            raise CapacityError("Uno o más grupos ya no tienen cupo; no se matriculó ninguno.", full)
+
+    # bulk_create no dispara post_save: el contador ya se movió arriba
+    Enrollment.objects.bulk_create(
+        [Enrollment(student=student, course_group_id=gid) for gid in fits],
+        ignore_conflicts=True,
+    )
+    return sorted(fits + hot_fits), sorted(full)
+
+
+def _reserve_hot(student, hot, held) -> tuple[list[int], list[int]]:
+    """
+    Parte caliente de reserve_seats, en orden de pk. Sin el bloqueo del grupo
+    la matrícula duplicada se detecta por la restricción única: el savepoint
+    devuelve el cupo tomado del fragmento.
+    """
+    fits, full = [], []
+    for gid in hot:
+        sid = transaction.savepoint()
+        if not _take_hot(gid, held.get(gid, 0)):
+            transaction.savepoint_rollback(sid)
+            full.append(gid)
+            continue
+        try:
+            Enrollment.objects.bulk_create([Enrollment(student=student, course_group_id=gid)])
+        except IntegrityError:
+            transaction.savepoint_rollback(sid)  # ya estaba matriculado
+            continue
+        transaction.savepoint_commit(sid)
+        fits.append(gid)
+    return fits, full
+
+
+def _take_hot(group_id: int, held: int) -> bool:
+    """
+    take_sharded() descontando `held` cupos retenidos por otros. Los
+    fragmentos no saben de lo retenido, así que después de tomar se mira el
+    total: cada fragmento tomado por otra transacción sigue bloqueado hasta
+    su commit, de modo que lo que no se ve es a lo sumo un cupo por
+    fragmento. Con ese margen cubierto el cupo queda; si no, se deshace y
+    se cuenta exacto con los fragmentos bloqueados (_take_counted).
+    """
+    if not held:
+        return take_sharded(group_id)
+    sid = transaction.savepoint()
+    if not take_sharded(group_id):
+        transaction.savepoint_rollback(sid)
+        return False
+    totals = SeatShard.objects.filter(course_group_id=group_id).aggregate(
+        taken=Sum("taken"), shards=Count("pk"), capacity=Max("course_group__capacity")
+    )
+    if totals["taken"] + totals["shards"] - 1 + held <= totals["capacity"]:
+        transaction.savepoint_commit(sid)
+        return True
+    transaction.savepoint_rollback(sid)
+    return _take_counted(group_id, held)
+
+
+def _take_counted(group_id: int, held: int) -> bool:
+    # Todos los fragmentos en orden de índice, como rebalance(): el total ya
+    # no se mueve y la comparación con lo retenido es exacta
+    shards = list(SeatShard.objects.select_for_update().filter(course_group_id=group_id).order_by("index"))
+    capacity = CourseGroup.objects.filter(pk=group_id).values_list("capacity", flat=True).first() or 0
+    free = next((s for s in shards if s.taken < s.capacity), None)
+    if free is None or sum(s.taken for s in shards) + held >= capacity:
+        return False
+    return bool(SeatShard.objects.filter(pk=free.pk).update(taken=F("taken") + 1))
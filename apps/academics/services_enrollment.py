@@ -2,19 +2,24 @@
 from __future__ import annotations
 from datetime import timedelta
 
-from django.apps import apps
-from django.db import transaction
+from django.db import DatabaseError, transaction
 from django.utils import timezone
 
+from .audit import attempt_sink
+from .credit_rules import add_credits, cart_credits, credit_limits, over_max, under_min
+from .eligibility import missing_coreqs, missing_prereqs, passed_courses, prereq_index
+from .registry import registry
+from .schedule_mask import enrolled_masks, first_clash, from_hex, internal_clashes, to_hex, union
+from .services_capacity import CapacityError, reserve_seats
+from .services_reservations import active, renew_holds, seats_held
+from .term_cache import term_cache
+
 
 # ────────────────────────────────────────────────────────────────
 # Carga segura de modelos (si no existen, quedan en None)
 # ────────────────────────────────────────────────────────────────
 def _gm(app_label: str, model_name: str):
-    try:
-        return apps.get_model(app_label, model_name)
-    except LookupError:
-        return None
+    return registry.model(app_label, model_name)
 
 Term = _gm("academics", "Term")
 TermRule = _gm("academics", "TermRule")
@@ -26,6 +31,7 @@ CourseGroup = _gm("academics", "CourseGroup")
 StudentProfile = _gm("academics", "StudentProfile")
 PaymentOrder = _gm("academics", "PaymentOrder")
 EnrollmentAttempt = _gm("academics", "EnrollmentAttempt")
+WaitlistEntry = _gm("academics", "WaitlistEntry")
 
 
 # ────────────────────────────────────────────────────────────────
@@ -35,6 +41,18 @@ class EnrollmentError(RuntimeError):
     pass
 
 
+class GroupFullError(EnrollmentError):
+    """El grupo no tiene cupo; la vista ofrece la lista de espera."""
+
+
+class CreditLimitError(EnrollmentError):
+    """Se excede (o no se alcanza) un límite de créditos; `limit` dice cuál."""
+
+    def __init__(self, message: str, limit: str):
+        super().__init__(message)
+        self.limit = limit
+
+
 def _require(model, name: str):
     if model is None:
         raise EnrollmentError(f"El modelo requerido '{name}' aún no está disponible.")
@@ -45,6 +63,12 @@ def _now():
     return timezone.now()
 
 
+def _expired(obj) -> bool:
+    """True si el item/reserva tiene reserved_until y ya pasó (expiración perezosa)."""
+    until = getattr(obj, "reserved_until", None)
+    return until is not None and until <= _now()
+
+
 def _cart_hold_minutes_for_term(term) -> int:
     """
     Obtiene minutos de retención de carrito desde TermRule.cart_hold_minutes si existe,
@@ -53,7 +77,7 @@ def _cart_hold_minutes_for_term(term) -> int:
     if TermRule is None or term is None:
         return 15
     try:
-        rule = TermRule.objects.filter(term=term).first()
+        rule = term_cache.term_rule(term)
         if rule and hasattr(rule, "cart_hold_minutes") and rule.cart_hold_minutes:
             return int(rule.cart_hold_minutes)
     except Exception:
@@ -100,11 +124,12 @@ def add_to_cart(user, term, group):
 
     cart = get_or_create_cart(user, term)
 
-    # Evitar duplicados: si ya existe CartItem para ese grupo
+    # Evitar duplicados: si ya existe CartItem vigente para ese grupo
+    existing = None
     if CartItem is not None:
         try:
-            exists = CartItem.objects.filter(cart=cart, course_group=group).exists()
-            if exists:
+            existing = CartItem.objects.filter(cart=cart, course_group=group).first()
+            if existing is not None and not _expired(existing):
                 # Renovamos reserva si aplica
                 if CapReservation is not None:
                     _renew_capreservation(user, term, group)
@@ -112,10 +137,26 @@ def add_to_cart(user, term, group):
         except Exception as e:
             raise EnrollmentError(f"Error revisando ítem de carrito: {e}")
 
-    # Crear CartItem
+    # Cruce de horario (máscaras de bits; no lee Schedule)
+    _check_schedule(user, term, cart, group)
+
+    # Prerrequisitos: índice compilado + cursos aprobados (búsquedas en dict)
+    _check_prereqs(user, term, group)
+
+    # Créditos: total llevado del carrito + este curso contra los límites
+    credits = group.course.credits
+    _check_credits(user, term, cart, credits if existing is None or not _has_field(EnrollmentCart, "credits_total") else 0)
+
+    # Cupo: matriculados + reservas vigentes de otros alumnos. Las reservas
+    # expiradas cuentan como libres aunque el barrido aún no las borre.
+    held = seats_held([group.pk], exclude_student=user).get(group.pk, 0)
+    if group.seats_taken + held >= group.capacity:
+        raise GroupFullError("Sin cupo disponible en este grupo.")
+
+    # Crear CartItem (o revivir el expirado)
     if CartItem is not None:
         try:
-            ci = CartItem(cart=cart, course_group=group)
+            ci = existing or CartItem(cart=cart, course_group=group)
             # reserved_until si el campo existe
             hold_minutes = _cart_hold_minutes_for_term(term)
             if hasattr(ci, "reserved_until"):
@@ -123,32 +164,135 @@ def add_to_cart(user, term, group):
             ci.save()
         except Exception as e:
             raise EnrollmentError(f"No se pudo agregar al carrito: {e}")
+        if existing is None:
+            add_credits(cart, credits)
     # Crear/renovar reserva de capacidad (si el modelo existe)
     if CapReservation is not None:
         _renew_capreservation(user, term, group)
 
+    if _has_cart_mask():
+        _set_cart_mask(cart, from_hex(cart.schedule_mask) | from_hex(group.schedule_mask))
     return cart
 
 
+def _has_cart_mask() -> bool:
+    return EnrollmentCart is not None and _has_field(EnrollmentCart, "schedule_mask")
+
+
+def _set_cart_mask(cart, mask: int):
+    """Guarda la ocupación acumulada del carrito (EnrollmentCart.schedule_mask)."""
+    if cart.schedule_mask == to_hex(mask):
+        return
+    cart.schedule_mask = to_hex(mask)
+    cart.save(update_fields=["schedule_mask"])
+
+
+def _cart_masks(cart, exclude_group=None) -> list[tuple[int, int]]:
+    """[(group_id, máscara)] de los items vigentes del carrito, una consulta."""
+    if CartItem is None:
+        return []
+    qs = active(CartItem.objects.filter(cart=cart))
+    if exclude_group is not None:
+        qs = qs.exclude(course_group=exclude_group)
+    return [(gid, from_hex(m)) for gid, m in qs.values_list("course_group_id", "course_group__schedule_mask") if m]
+
+
+def _check_credits(user, term, cart, adding: int):
+    limits = credit_limits(user, term)
+    if limits["max"] is None:
+        return
+    msg = over_max(limits, cart_credits(cart) + adding)
+    if msg:
+        raise CreditLimitError(msg, limits["max_rule"])
+
+
+def _course_codes(course_ids) -> str:
+    Course = _gm("academics", "Course")
+    codes = dict(Course.objects.filter(pk__in=list(course_ids)).values_list("pk", "code"))
+    return ", ".join(codes.get(c, str(c)) for c in course_ids)
+
+
+def _check_prereqs(user, term, group):
+    index = prereq_index(term)
+    if not index["requires"].get(group.course_id):
+        return
+    missing = missing_prereqs(group.course_id, passed_courses(user.pk, term), index)
+    if missing:
+        raise EnrollmentError(f"No cumples los prerrequisitos. Falta aprobar: {_course_codes([c for c, _ in missing])}.")
+
+
+def _check_coreqs(user, term, course_ids):
+    """Correquisitos del carrito completo: aprobados, en el carrito o ya matriculados."""
+    index = prereq_index(term)
+    if not any(index["coreqs"].get(c) for c in course_ids):
+        return
+    taking = set(course_ids) | set(
+        Enrollment.objects.filter(student=user).values_list("course_group__course_id", flat=True)
+    )
+    passed = passed_courses(user.pk, term)
+    missing = sorted({m for c in course_ids for m in missing_coreqs(c, passed, taking, index)})
+    if missing:
+        raise EnrollmentError(f"Faltan correquisitos en el carrito: {_course_codes(missing)}.")
+
+
+def _check_schedule(user, term, cart, group):
+    mask = from_hex(group.schedule_mask)
+    if not mask:
+        return
+    # El propio grupo no cruza consigo mismo si el alumno ya está matriculado en él
+    enrolled = [(gid, m) for gid, m in enrolled_masks(user, term) if gid != group.pk]
+    if _has_cart_mask():
+        # Camino rápido: la ocupación acumulada del carrito. Si marca cruce
+        # puede ser por un item ya vencido; se recalcula y se repara.
+        occupied = from_hex(cart.schedule_mask)
+        for _, m in enrolled:
+            occupied |= m
+        if not occupied & mask:
+            return
+    items = _cart_masks(cart, exclude_group=group)
+    if _has_cart_mask():
+        _set_cart_mask(cart, union(m for _, m in items))
+    clash = first_clash(mask, enrolled + items)
+    if clash is not None:
+        other = CourseGroup.objects.select_related("course").filter(pk=clash).first()
+        raise EnrollmentError(f"Cruce de horario con {other or 'otro grupo'}.")
+
+
 def _renew_capreservation(user, term, group):
-    """Crea o renueva la reserva de cupo si el modelo CapReservation existe."""
+    """Crea o renueva la reserva de cupo (un solo upsert) si existe CapReservation."""
     if CapReservation is None:
         return
     try:
-        hold_minutes = _cart_hold_minutes_for_term(term)
-        expires = _now() + timedelta(minutes=hold_minutes)
-        obj, created = CapReservation.objects.get_or_create(
-            course_group=group,
-            student=user,
-            term=term,
-            defaults={"reserved_until": expires} if _has_field(CapReservation, "reserved_until") else {},
-        )
-        if not created and _has_field(CapReservation, "reserved_until"):
-            obj.reserved_until = expires
-            obj.save(update_fields=["reserved_until"])
-    except Exception:
-        # No hacemos hard-fail por reservas; el carrito sigue
-        pass
+        renew_holds(user, term, [group.pk], _cart_hold_minutes_for_term(term))
+    except DatabaseError as e:
+        raise EnrollmentError(f"No se pudo reservar el cupo: {e}")
+
+
+def renew_cart(user, term) -> int:
+    """
+    Extiende todas las reservas vigentes del carrito en dos sentencias: un
+    UPDATE de CartItem.reserved_until y un upsert de CapReservation.
+    Retorna cuántos grupos se renovaron (los items ya vencidos no reviven).
+    """
+    _require(EnrollmentCart, "EnrollmentCart")
+    if CartItem is None:
+        return 0
+    cart = get_or_create_cart(user, term)
+    minutes = _cart_hold_minutes_for_term(term)
+    items = active(CartItem.objects.filter(cart=cart))
+    group_ids = list(items.values_list("course_group_id", flat=True))
+    if not group_ids:
+        return 0
+    with transaction.atomic():
+        if _has_field(CartItem, "reserved_until"):
+            CartItem.objects.filter(cart=cart, course_group_id__in=group_ids).update(
+                reserved_until=_now() + timedelta(minutes=minutes)
+            )
+        try:
+            renew_holds(user, term, group_ids, minutes)
+        except DatabaseError as e:
+            raise EnrollmentError(f"No se pudieron renovar las reservas: {e}")
+    return len(group_ids)
 
 
 @transaction.atomic
@@ -163,9 +307,11 @@ def remove_from_cart(user, term, group):
 
     if CartItem is not None:
         try:
-            CartItem.objects.filter(cart=cart, course_group=group).delete()
+            removed = CartItem.objects.filter(cart=cart, course_group=group).delete()[0]
         except Exception as e:
             raise EnrollmentError(f"No se pudo quitar del carrito: {e}")
+        if removed:
+            add_credits(cart, -group.course.credits)
 
     if CapReservation is not None:
         try:
@@ -173,105 +319,136 @@ def remove_from_cart(user, term, group):
         except Exception:
             pass
 
+    # Si el grupo venía de una oferta de lista de espera, el cupo pasa al siguiente
+    if WaitlistEntry is not None:
+        WaitlistEntry.objects.filter(
+            course_group=group, student=user, status=WaitlistEntry.OFFERED
+        ).update(status=WaitlistEntry.CANCELLED, offered_until=None)
+
+    if _has_cart_mask():
+        # Los items del carrito no se cruzan entre sí: quitar sus bits es exacto
+        _set_cart_mask(cart, from_hex(cart.schedule_mask) & ~from_hex(group.schedule_mask))
+
     return cart
 
 
-@transaction.atomic
-def confirm_cart(user, term) -> int:
+def confirm_cart(user, term, all_or_none: bool = False) -> tuple[int, list[str]]:
     """
-    Convierte los items del carrito en Enrollment(s).
-    Retorna la cantidad de secciones matriculadas.
+    Convierte los items vigentes del carrito en Enrollment(s) con un número
+    fijo de consultas, sin importar cuántos items tenga el carrito.
+    Retorna (secciones matriculadas, nombres de los grupos cuya reserva
+    venció): esos no se confirman y el alumno debe volver a agregarlos.
+
+    El cupo de cada grupo descuenta lo retenido por otros alumnos (reservas
+    y ofertas de lista de espera vigentes), igual que al agregar al carrito.
+
+    all_or_none=True: si algún grupo está lleno no se matricula ninguno
+    y se lanza EnrollmentError.
     """
     _require(Enrollment, "Enrollment")
     _require(EnrollmentCart, "EnrollmentCart")
     _require(CourseGroup, "CourseGroup")
 
-    cart = get_or_create_cart(user, term)
-
-    # Obtener items (si el modelo existe)
-    items_qs = []
-    if CartItem is not None:
-        try:
-            items_qs = list(
-                CartItem.objects.select_related("course_group").filter(cart=cart)
-            )
-        except Exception as e:
-            raise EnrollmentError(f"No se pudo leer el carrito: {e}")
-
-    if not items_qs:
-        return 0
-
-    created_count = 0
-    for it in items_qs:
-        group = getattr(it, "course_group", None)
-        if group is None:
-            continue
-        try:
-            # Enrollment: (student, group) o (student, course_group) según tu modelo
-            kwargs = {}
-            # intentamos ambos nombres habituales
-            if _has_field(Enrollment, "group"):
-                kwargs["group"] = group
-            elif _has_field(Enrollment, "course_group"):
-                kwargs["course_group"] = group
-            else:
-                raise EnrollmentError("El modelo Enrollment no tiene FK al grupo (group/course_group).")
-
-            enr, created = Enrollment.objects.get_or_create(student=user, **kwargs)
-            created_count += int(created)
-        except Exception as e:
-            # Registramos intento si existe el modelo
-            _log_attempt(user, term, action=f"enroll:{getattr(group, 'id', None)}", error=str(e))
-            # Continuamos con el resto (mejor experiencia)
-            continue
-
-    # Marcar carrito como inactivo / confirmado si existen esos campos
+    full = []
     try:
-        updates = []
-        if hasattr(cart, "is_active") and cart.is_active:
-            cart.is_active = False
-            updates.append("is_active")
-        if hasattr(cart, "confirmed_at"):
-            cart.confirmed_at = _now()
-            updates.append("confirmed_at")
-        if updates:
-            cart.save(update_fields=updates)
-    except Exception:
-        pass
-
-    # Limpiar reservas del usuario si existe CapReservation
-    if CapReservation is not None:
-        try:
-            CapReservation.objects.filter(student=user, term=term).delete()
-        except Exception:
-            pass
+        with transaction.atomic():
+            cart = get_or_create_cart(user, term)
+
+            # Items vigentes del carrito en una sola lectura (ids de grupo y
+            # máscaras); los vencidos solo se nombran para avisar al alumno
+            items, expired = [], []
+            if CartItem is not None:
+                now = _now()
+                try:
+                    items = list(
+                        active(CartItem.objects.filter(cart=cart), now).values_list(
+                            "course_group_id",
+                            "course_group__schedule_mask",
+                            "course_group__course_id",
+                            "course_group__course__credits",
+                        )
+                    )
+                    if _has_field(CartItem, "reserved_until"):
+                        expired = [
+                            str(ci.course_group)
+                            for ci in CartItem.objects.filter(cart=cart, reserved_until__lte=now)
+                            .select_related("course_group", "course_group__course")
+                        ]
+                except Exception as e:
+                    raise EnrollmentError(f"No se pudo leer el carrito: {e}")
+            group_ids = [gid for gid, _, _, _ in items]
+
+            if not group_ids:
+                return 0, expired
+
+            # Cruces de horario: entre items y contra lo ya matriculado. Un
+            # item ya matriculado (reconfirmación tras una parcial) cuenta una vez
+            enrolled = enrolled_masks(user, term)
+            mine = {gid for gid, _ in enrolled}
+            clashes = internal_clashes(enrolled + [(gid, from_hex(m)) for gid, m, _, _ in items if gid not in mine])
+            if clashes:
+                names = dict(
+                    (g.pk, str(g)) for g in CourseGroup.objects.select_related("course").filter(pk__in=clashes[0])
+                )
+                a, b = clashes[0]
+                raise EnrollmentError(f"Cruce de horario entre {names.get(a, a)} y {names.get(b, b)}.")
+
+            _check_coreqs(user, term, [cid for _, _, cid, _ in items])
+
+            # Créditos exactos del carrito (ya leídos con los items)
+            limits = credit_limits(user, term)
+            total = sum(c or 0 for _, _, _, c in items)
+            for msg, limit in ((over_max(limits, total), limits["max_rule"]), (under_min(limits, total), "min_credits")):
+                if msg:
+                    raise CreditLimitError(msg, limit)
+
+            enrolled, full = reserve_seats(
+                user, group_ids, all_or_none=all_or_none, held=seats_held(group_ids, exclude_student=user)
+            )
 
-    return created_count
+            # Marcar carrito como inactivo / confirmado si existen esos campos
+            try:
+                updates = []
+                if hasattr(cart, "is_active") and cart.is_active:
+                    cart.is_active = False
+                    updates.append("is_active")
+                if hasattr(cart, "confirmed_at"):
+                    cart.confirmed_at = _now()
+                    updates.append("confirmed_at")
+                if updates:
+                    cart.save(update_fields=updates)
+            except Exception:
+                pass
+
+            # Limpiar reservas del usuario si existe CapReservation (un solo DELETE)
+            if CapReservation is not None:
+                try:
+                    CapReservation.objects.filter(student=user, term=term).delete()
+                except Exception:
+                    pass
+    except CapacityError as e:
+        full = list(e.full_groups)
+        raise EnrollmentError(str(e)) from e
+    finally:
+        # Fuera de la transacción: los intentos fallidos quedan aunque se deshaga todo
+        if full:
+            _log_attempts(user, term, [f"enroll:{gid}" for gid in full], error="Sin cupo disponible.")
+
+    return len(enrolled), expired
 
 
 # ────────────────────────────────────────────────────────────────
 # Utilidades privadas
 # ────────────────────────────────────────────────────────────────
 def _has_field(Model, field_name: str) -> bool:
-    if Model is None:
-        return False
-    try:
-        return any(f.name == field_name for f in Model._meta.get_fields())
-    except Exception:
-        return False
+    return registry.has_field(Model, field_name)
 
 
 def _log_attempt(user, term, action: str, error: str | None = None, payload=None, result=None):
-    """Registra un intento de matrícula si existe el modelo EnrollmentAttempt."""
-    if EnrollmentAttempt is None:
-        return
-    try:
-        kwargs = {"student": user, "term": term, "action": action}
-        if _has_field(EnrollmentAttempt, "payload"):
-            kwargs["payload"] = payload
-        if _has_field(EnrollmentAttempt, "result"):
-            kwargs["result"] = {"error": error} if error else result
-        EnrollmentAttempt.objects.create(**kwargs)
-    except Exception:
-        # logging opcional; no interrumpimos el flujo principal
-        pass
+    """Registra un intento de matrícula (búfer de audit.py) si existe EnrollmentAttempt."""
+    attempt_sink.record(user, term, [action], error, payload, result)
+
+
+def _log_attempts(user, term, actions, error: str | None = None):
+    """Igual que _log_attempt, pero varios intentos; se escriben juntos con el búfer."""
+    attempt_sink.record(user, term, actions, error)
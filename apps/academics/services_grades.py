@@ -0,0 +1,220 @@
+# apps/academics/services_grades.py
+from __future__ import annotations
+
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connections, router, transaction
+
+from . import eligibility, final_grades, grade_history
+from .registry import registry
+
+# ────────────────────────────────────────────────────────────────
+# Importación masiva de notas de un grupo
+#
+# Filas {student_username, assessment, points} (CSV del docente). El
+# pipeline es:
+#   1) cargar: usuarios citados (una consulta) y evaluaciones del grupo
+#      (otra) en diccionarios, más las notas que ya existen para saber qué
+#      fila crea y cuál actualiza;
+#   2) validar en memoria: alumno, evaluación y puntaje que quepa en el
+#      campo de la nota; lo inválido se omite y queda en "errors" con su
+#      razón (índice de fila dentro de `rows`);
+#   3) escribir con bulk_create(update_conflicts=True) por bloques de
+#      `chunk_size` filas, cada bloque en su transacción.
+# Conteos como la importación fila a fila: una clave repetida en el
+# archivo cuenta como creada la primera vez y actualizada las demás (gana
+# el último puntaje). bulk_create no dispara post_save: la invalidación de
+# elegibilidad, el recálculo de FinalGrade de los alumnos tocados y el
+# historial (GradeEvent, un bulk_create por bloque en su misma
+# transacción, solo de los puntajes que cambian) se hacen aquí.
+# ────────────────────────────────────────────────────────────────
+CHUNK_SIZE = 500
+REQUIRED_COLUMNS = ("student_username", "assessment", "points")
+
+
+def parse_points(s: str | None):
+    """Convierte el valor de 'points' a número (int / float). Si falla, None."""
+    if s is None:
+        return None
+    s = str(s).strip().replace(",", ".")
+    try:
+        if s.isdigit() or (s.startswith("-") and s[1:].isdigit()):
+            return int(s)
+        return float(s)
+    except ValueError:
+        return None
+
+
+def _fits(field, raw) -> Decimal | None:
+    """El puntaje como Decimal si entra en el DecimalField de la nota; None si no."""
+    value = parse_points(raw)
+    if value is None:
+        return None
+    try:
+        value = Decimal(str(value))
+        if field.decimal_places is not None:
+            value = value.quantize(Decimal(1).scaleb(-field.decimal_places))
+    except InvalidOperation:
+        return None
+    if not value.is_finite():
+        return None
+    if field.max_digits is not None and abs(value) >= Decimal(10) ** (field.max_digits - (field.decimal_places or 0)):
+        return None
+    return value
+
+
+def assessment_table(group) -> dict[str, tuple[int, Decimal | None]]:
+    """{etiqueta: (assessment_id, total_points)} del grupo en una consulta; title gana sobre name."""
+    Assessment = registry.model("academics", "Assessment")
+    if Assessment is None or group is None:
+        return {}
+    labels = [f for f in ("title", "name") if registry.has_field(Assessment, f)]
+    if not labels:
+        return {}
+    total = ("total_points",) if registry.has_field(Assessment, "total_points") else ()
+    by_label: dict[str, tuple[int, Decimal | None]] = {}
+    rows = Assessment.objects.filter(course_group=group).order_by("pk").values_list("pk", *total, *labels)
+    # Igual que la búsqueda por título y luego por nombre: la primera (menor pk) gana
+    for i in range(len(labels)):
+        for row in rows:
+            if row[len(total) + 1 + i]:
+                by_label.setdefault(row[len(total) + 1 + i], (row[0], row[1] if total else None))
+    return by_label
+
+
+def assessment_index(group) -> dict[str, int]:
+    """{etiqueta: assessment_id} del grupo en una consulta; title gana sobre name."""
+    return {label: aid for label, (aid, _total) in assessment_table(group).items()}
+
+
+def _cell(value) -> str:
+    return "" if value is None else str(value).strip()
+
+
+def _user_index(usernames) -> dict[str, int]:
+    User = get_user_model()
+    return dict(User.objects.filter(username__in=list(usernames)).values_list("username", "pk"))
+
+
+def plan_import(group, rows) -> dict:
+    """
+    Pasos 1 y 2: valida las filas y retorna
+    {"values": {(alumno, evaluación): Decimal}, "counts": {clave: [creadas, actualizadas]},
+     "skipped": int, "errors": [(índice de fila, razón)], "lines": {clave: [índices]},
+     "previous": {clave: puntaje actual} de las notas que ya existen,
+     "field": nombre del campo de puntaje, "group_id": id del grupo}.
+    """
+    Grade = registry.model("academics", "Grade")
+    field_name = registry.points_field(Grade) if Grade is not None else None
+    rows = list(rows)
+    plan = {
+        "values": {}, "counts": defaultdict(lambda: [0, 0]), "skipped": 0,
+        "errors": [], "lines": defaultdict(list), "previous": {},
+        "field": field_name, "group_id": getattr(group, "pk", None),
+    }
+    if field_name is None:
+        plan["skipped"] = len(rows)
+        plan["errors"] = [(i, "Grade no tiene campo de puntaje") for i in range(len(rows))]
+        return plan
+    field = Grade._meta.get_field(field_name)
+
+    clean = [tuple(_cell(r.get(c)) for c in REQUIRED_COLUMNS) for r in rows]
+    users = _user_index({u for u, _, _ in clean if u})
+    assessments = assessment_index(group)
+    existing = plan["previous"] = {
+        (sid, aid): score
+        for sid, aid, score in Grade.objects.filter(
+            assessment_id__in=list(assessments.values()), student_id__in=list(users.values())
+        ).values_list("student_id", "assessment_id", field_name)
+    } if users and assessments else {}
+
+    for i, (username, label, raw) in enumerate(clean):
+        sid, aid = users.get(username), assessments.get(label)
+        value = _fits(field, raw) if sid and aid else None
+        if value is None:
+            plan["skipped"] += 1
+            plan["errors"].append((i, _reason(username, label, sid, aid)))
+            continue
+        key = (sid, aid)
+        plan["counts"][key][0 if key not in existing and key not in plan["values"] else 1] += 1
+        plan["values"][key] = value
+        plan["lines"][key].append(i)
+    return plan
+
+
+def _reason(username, label, sid, aid) -> str:
+    if not username or not label:
+        return "faltan datos"
+    if not sid:
+        return "alumno no encontrado"
+    if not aid:
+        return "evaluación no encontrada en el grupo"
+    return "puntaje inválido"
+
+
+def _write_chunk(Grade, objs, kwargs, on_written=None) -> list:
+    """
+    Escribe un bloque; si la BD lo rechaza, fila por fila. on_written(objs)
+    corre en la misma transacción que lo escrito. Retorna las claves que fallaron.
+    """
+    try:
+        with transaction.atomic():
+            Grade.objects.bulk_create(objs, **kwargs)
+            if on_written is not None:
+                on_written(objs)
+        return []
+    except DatabaseError:
+        failed = []
+        for obj in objs:
+            try:
+                with transaction.atomic():
+                    Grade.objects.bulk_create([obj], **kwargs)
+                    if on_written is not None:
+                        on_written([obj])
+            except DatabaseError:
+                failed.append((obj.student_id, obj.assessment_id))
+        return failed
+
+
+def write_plan(plan: dict, chunk_size: int = CHUNK_SIZE) -> dict:
+    """Paso 3: upsert por bloques. Retorna {"created", "updated", "skipped", "errors"}."""
+    Grade = registry.model("academics", "Grade")
+    field_name = plan["field"]
+    counts = plan["counts"]
+    skipped = plan["skipped"]
+    errors = list(plan.get("errors", ()))
+    items = list(plan["values"].items())
+    if items:
+        kwargs = {"update_conflicts": True, "update_fields": [field_name]}
+        if connections[router.db_for_write(Grade)].features.supports_update_conflicts_with_target:
+            kwargs["unique_fields"] = ["student", "assessment"]  # ON CONFLICT (...) en PostgreSQL/SQLite
+        previous = plan.get("previous", {})
+
+        def history(objs):
+            grade_history.record_written(plan["group_id"], objs, previous, field_name)
+
+        for i in range(0, len(items), chunk_size):
+            objs = [
+                Grade(student_id=sid, assessment_id=aid, **{field_name: value})
+                for (sid, aid), value in items[i:i + chunk_size]
+            ]
+            for key in _write_chunk(Grade, objs, kwargs, on_written=history):
+                skipped += sum(counts.pop(key))
+                errors.extend((i, "la base de datos rechazó la fila") for i in plan.get("lines", {}).get(key, ()))
+        touched = {sid for sid, _ in counts}
+        for sid in touched:
+            eligibility.invalidate_student(sid)
+        final_grades.schedule_students(plan["group_id"], touched)
+    return {
+        "created": sum(c for c, _ in counts.values()),
+        "updated": sum(u for _, u in counts.values()),
+        "skipped": skipped,
+        "errors": sorted(errors),
+    }
+
+
+def import_grade_rows(group, rows, chunk_size: int = CHUNK_SIZE) -> dict:
+    """Importa filas {student_username, assessment, points}; retorna {"created", "updated", "skipped", "errors"}."""
+    return write_plan(plan_import(group, rows), chunk_size=chunk_size)
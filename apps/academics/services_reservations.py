@@ -0,0 +1,162 @@
+# apps/academics/services_reservations.py
+from __future__ import annotations
+
+import time
+from datetime import timedelta
+
+from django.db import connections, router
+from django.db.models import Count, Exists, OuterRef, UniqueConstraint
+from django.utils import timezone
+
+from .credit_rules import release_item_credits
+from .models import WaitlistEntry
+from .registry import registry
+
+# ────────────────────────────────────────────────────────────────
+# Reservas de cupo (CapReservation) e items de carrito (CartItem)
+#
+# Expiración perezosa: una reserva con reserved_until <= ahora se considera
+# libre en toda lectura, aunque el barrido todavía no la haya borrado.
+# El barrido (release_expired_reservations --loop) solo limpia filas, en
+# lotes pequeños por pk para no bloquear las tablas en horas pico.
+# ────────────────────────────────────────────────────────────────
+CapReservation = registry.model("academics", "CapReservation")
+CartItem = registry.model("academics", "CartItem")
+
+
+def active(qs, now=None):
+    """Filtra un queryset de reservas/items dejando solo las vigentes."""
+    if not registry.has_field(qs.model, "reserved_until"):
+        return qs
+    return qs.filter(reserved_until__gt=now or timezone.now())
+
+
+def seats_held(group_ids, exclude_student=None) -> dict[int, int]:
+    """
+    {group_id: cupos retenidos} en pocas consultas: reservas vigentes más
+    ofertas vigentes de la lista de espera. Ignora lo expirado.
+    """
+    if not group_ids:
+        return {}
+    group_ids = list(group_ids)
+    held: dict[int, int] = {}
+    reservations = None
+    if CapReservation is not None:
+        reservations = active(CapReservation.objects.filter(course_group_id__in=group_ids))
+        qs = reservations if exclude_student is None else reservations.exclude(student=exclude_student)
+        held.update(_count_by_group(qs))
+
+    offers = WaitlistEntry.objects.filter(
+        course_group_id__in=group_ids,
+        status=WaitlistEntry.OFFERED,
+        offered_until__gt=timezone.now(),
+    )
+    if exclude_student is not None:
+        offers = offers.exclude(student=exclude_student)
+    if reservations is not None:
+        # Una oferta ya convertida en reserva de carrito no se cuenta dos veces
+        offers = offers.exclude(
+            Exists(reservations.filter(student=OuterRef("student"), course_group=OuterRef("course_group")))
+        )
+    for gid, n in _count_by_group(offers).items():
+        held[gid] = held.get(gid, 0) + n
+    return held
+
+
+def _count_by_group(qs) -> dict[int, int]:
+    return dict(
+        qs.order_by().values("course_group_id").annotate(n=Count("pk")).values_list("course_group_id", "n")
+    )
+
+
+# ────────────────────────────────────────────────────────────────
+# Renovación de reservas en una sola sentencia (upsert)
+#
+# bulk_create(update_conflicts=True) genera INSERT ... ON DUPLICATE KEY
+# UPDATE en MariaDB/MySQL e INSERT ... ON CONFLICT (...) DO UPDATE en
+# PostgreSQL/SQLite: crear o extender N reservas es un solo viaje y no
+# hay carrera entre el SELECT y el INSERT de get_or_create.
+# ────────────────────────────────────────────────────────────────
+def _conflict_fields(Model) -> list[str] | None:
+    """Campos de la restricción única (alumno, grupo[, término]) de CapReservation."""
+    candidates = [list(u) for u in Model._meta.unique_together]
+    candidates += [
+        list(c.fields) for c in Model._meta.constraints
+        if isinstance(c, UniqueConstraint) and c.fields and c.condition is None
+    ]
+    for fields in candidates:
+        if {"course_group", "student"} <= set(fields):
+            return fields
+    return None
+
+
+def renew_holds(user, term, group_ids, minutes: int) -> int:
+    """
+    Crea o extiende hasta ahora+minutes las reservas del alumno en los
+    grupos dados con un único INSERT ... ON CONFLICT/ON DUPLICATE KEY.
+    Retorna cuántas filas se enviaron. Los errores de BD se propagan.
+    """
+    group_ids = list(dict.fromkeys(group_ids))
+    if CapReservation is None or not group_ids:
+        return 0
+    with_term = registry.has_field(CapReservation, "term")
+    conflict = _conflict_fields(CapReservation)
+    until = timezone.now() + timedelta(minutes=minutes)
+
+    def row(gid):
+        obj = CapReservation(course_group_id=gid, student=user)
+        if with_term:
+            obj.term = term
+        if registry.has_field(CapReservation, "reserved_until"):
+            obj.reserved_until = until
+        return obj
+
+    if conflict is None or not registry.has_field(CapReservation, "reserved_until"):
+        # Sin restricción única no hay conflicto que detectar: camino clásico
+        for gid in group_ids:
+            lookup = {"course_group_id": gid, "student": user, **({"term": term} if with_term else {})}
+            CapReservation.objects.update_or_create(
+                **lookup, defaults={"reserved_until": until} if registry.has_field(CapReservation, "reserved_until") else {}
+            )
+        return len(group_ids)
+
+    kwargs = {"update_conflicts": True, "update_fields": ["reserved_until"]}
+    features = connections[router.db_for_write(CapReservation)].features
+    if features.supports_update_conflicts_with_target:
+        kwargs["unique_fields"] = conflict  # ON CONFLICT (...) en PostgreSQL/SQLite
+    CapReservation.objects.bulk_create([row(gid) for gid in group_ids], **kwargs)
+    return len(group_ids)
+
+
+def _delete_expired(Model, now, batch_size: int) -> int:
+    if Model is None or not registry.has_field(Model, "reserved_until"):
+        return 0
+    total = 0
+    while True:
+        # Se recorre el índice de reserved_until y se borra por pk: cada
+        # DELETE toca a lo más `batch_size` filas y se confirma aparte.
+        ids = list(
+            Model.objects.filter(reserved_until__lte=now)
+            .order_by("reserved_until")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        if Model is CartItem:
+            release_item_credits(ids)  # total de créditos llevado en el carrito
+        total += Model.objects.filter(pk__in=ids).delete()[0]
+        if len(ids) < batch_size:
+            break
+    return total
+
+
+def release_expired(batch_size: int = 500) -> dict:
+    """
+    Una pasada del barrido. Retorna cuántas reservas (cupos) e items se
+    liberaron y cuánto tardó la pasada en segundos.
+    """
+    started = time.monotonic()
+    now = timezone.now()
+    seats = _delete_expired(CapReservation, now, batch_size)
+    items = _delete_expired(CartItem, now, batch_size)
+    return {"seats": seats, "items": items, "elapsed": time.monotonic() - started}
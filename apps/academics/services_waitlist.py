@@ -0,0 +1,133 @@
+# apps/academics/services_waitlist.py
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef
+from django.utils import timezone
+
+from .models import CourseGroup, Enrollment, WaitlistEntry
+from .registry import registry
+from .services_enrollment import EnrollmentError, _cart_hold_minutes_for_term, add_to_cart
+from .services_reservations import seats_held
+from .term_cache import term_cache
+
+# ────────────────────────────────────────────────────────────────
+# Lista de espera
+#
+# Un alumno con grupo lleno entra UNA vez a la cola del grupo en vez de
+# reintentar cart_add/confirm. promote_waitlist() (lo corre el barrido de
+# reservas en cada pasada, o el comando promote_waitlist) ofrece los cupos
+# libres a los siguientes de la cola con una retención temporal; la
+# oferta cuenta como reserva vigente mientras no venza.
+# ────────────────────────────────────────────────────────────────
+OPEN_STATUSES = (WaitlistEntry.WAITING, WaitlistEntry.OFFERED)
+
+
+def position(entry) -> int:
+    """Posición 1-based de un turno en espera (0 si no está esperando)."""
+    if entry.status != WaitlistEntry.WAITING:
+        return 0
+    ahead = WaitlistEntry.objects.filter(
+        course_group_id=entry.course_group_id,
+        status=WaitlistEntry.WAITING,
+        created_at__lt=entry.created_at,
+    ).count()
+    return ahead + 1
+
+
+@transaction.atomic
+def join_waitlist(user, group) -> WaitlistEntry:
+    """Encola al alumno (idempotente: un solo turno por grupo)."""
+    if Enrollment.objects.filter(student=user, course_group=group).exists():
+        raise EnrollmentError("Ya estás matriculado en este grupo.")
+    entry, created = WaitlistEntry.objects.get_or_create(course_group=group, student=user)
+    if not created and entry.status not in OPEN_STATUSES:
+        # Volver a la cola tras cancelar o dejar vencer una oferta: al final
+        entry.status = WaitlistEntry.WAITING
+        entry.created_at = timezone.now()
+        entry.offered_until = None
+        entry.save(update_fields=["status", "created_at", "offered_until"])
+    return entry
+
+
+def leave_waitlist(user, group) -> None:
+    WaitlistEntry.objects.filter(course_group=group, student=user, status__in=OPEN_STATUSES).update(
+        status=WaitlistEntry.CANCELLED, offered_until=None
+    )
+
+
+def _close_stale_entries(now) -> None:
+    # Ofertas vencidas liberan su cupo para el siguiente
+    WaitlistEntry.objects.filter(status=WaitlistEntry.OFFERED, offered_until__lte=now).update(
+        status=WaitlistEntry.EXPIRED
+    )
+    # Quien ya se matriculó (por la oferta o por otra vía) sale de la cola
+    enrolled = Enrollment.objects.filter(student=OuterRef("student"), course_group=OuterRef("course_group"))
+    WaitlistEntry.objects.filter(status__in=OPEN_STATUSES).filter(Exists(enrolled)).update(
+        status=WaitlistEntry.ENROLLED, offered_until=None
+    )
+
+
+def promote_waitlist(batch_size: int = 200) -> int:
+    """
+    Ofrece los cupos libres a los siguientes de cada cola. Retorna cuántas
+    ofertas se hicieron. Pensado para correr en lote, no por petición.
+    """
+    now = timezone.now()
+    _close_stale_entries(now)
+
+    # Grupos con cola y cupo libre, en una consulta
+    candidates = dict(
+        CourseGroup.objects.filter(available_slots__gt=0, waitlist__status=WaitlistEntry.WAITING)
+        .order_by("pk")
+        .values_list("pk", "available_slots")
+        .distinct()[:batch_size]
+    )
+    if not candidates:
+        return 0
+
+    holds = seats_held(candidates.keys())  # reservas + ofertas vigentes
+    term = term_cache.current_term()
+    until = now + timedelta(minutes=_cart_hold_minutes_for_term(term))
+    offered = 0
+    for gid, available in candidates.items():
+        free = available - holds.get(gid, 0)
+        if free <= 0:
+            continue
+        with transaction.atomic():
+            nxt = list(
+                WaitlistEntry.objects.select_for_update()
+                .filter(course_group_id=gid, status=WaitlistEntry.WAITING)
+                .order_by("created_at", "pk")[:free]
+            )
+            WaitlistEntry.objects.filter(pk__in=[e.pk for e in nxt]).update(
+                status=WaitlistEntry.OFFERED, offered_until=until
+            )
+        offered += len(nxt)
+        _place_in_carts(nxt, term)
+    return offered
+
+
+def _place_in_carts(entries, term) -> None:
+    """Si hay carrito, el cupo ofrecido aparece ya reservado en él."""
+    if registry.model("academics", "EnrollmentCart") is None:
+        return
+    for e in entries:
+        try:
+            add_to_cart(e.student, term, e.course_group)
+        except Exception:
+            # La oferta sigue vigente aunque el carrito falle
+            continue
+
+
+def waitlist_depths(group_ids) -> dict[int, int]:
+    """{group_id: alumnos en espera} en una consulta (para listados)."""
+    return dict(
+        WaitlistEntry.objects.filter(course_group_id__in=list(group_ids), status=WaitlistEntry.WAITING)
+        .order_by()
+        .values("course_group_id")
+        .annotate(n=Count("pk"))
+        .values_list("course_group_id", "n")
+    )
@@ -0,0 +1,137 @@
+# apps/academics/signals.py
+from __future__ import annotations
+
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import catalog, credit_rules, eligibility, final_grades, grade_history, schedule_mask
+from .models import Assessment, Course, CourseGroup, Enrollment, Grade
+from .registry import registry
+from .services_capacity import rebalance, seat_added, seat_released
+from .term_cache import term_cache
+
+
+# ────────────────────────────────────────────────────────────────
+# Contadores de CourseGroup
+# Matrículas creadas con save() (admin, import-export, shell) o borradas
+# (admin, cascadas, queryset.delete) ajustan enrolled_count. El motor de
+# capacidad usa bulk_create y mueve el contador por su cuenta.
+# ────────────────────────────────────────────────────────────────
+@receiver(post_save, sender=Enrollment, dispatch_uid="academics_enrollment_counter_add")
+def enrollment_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        seat_added(instance.course_group_id)
+
+
+@receiver(post_delete, sender=Enrollment, dispatch_uid="academics_enrollment_counter_release")
+def enrollment_deleted(sender, instance, **kwargs):
+    seat_released(instance.course_group_id)
+
+
+# ────────────────────────────────────────────────────────────────
+# Caché de términos: Term/TermRule son opcionales, se conectan si existen
+# ────────────────────────────────────────────────────────────────
+for _name in ("Term", "TermRule"):
+    _Model = registry.model("academics", _name)
+    if _Model is not None:
+        post_save.connect(term_cache.invalidate, sender=_Model, dispatch_uid=f"academics_term_cache_{_name}_save")
+        post_delete.connect(term_cache.invalidate, sender=_Model, dispatch_uid=f"academics_term_cache_{_name}_delete")
+
+
+# ────────────────────────────────────────────────────────────────
+# Catálogo de ofertas: cambios de cursos o de la parte de catálogo de un
+# grupo invalidan la foto; capacidad y contadores van por el overlay.
+# ────────────────────────────────────────────────────────────────
+@receiver(post_save, sender=Course, dispatch_uid="academics_catalog_course_save")
+@receiver(post_delete, sender=Course, dispatch_uid="academics_catalog_course_delete")
+@receiver(post_delete, sender=CourseGroup, dispatch_uid="academics_catalog_group_delete")
+def catalog_row_changed(sender, **kwargs):
+    catalog.invalidate()
+
+
+@receiver(pre_save, sender=CourseGroup, dispatch_uid="academics_catalog_group_presave")
+def coursegroup_presave(sender, instance, raw=False, **kwargs):
+    instance._catalog_dirty = raw or catalog.catalog_changed(instance)
+
+
+@receiver(post_save, sender=CourseGroup, dispatch_uid="academics_catalog_group_save")
+def coursegroup_saved(sender, instance, created, **kwargs):
+    if created or getattr(instance, "_catalog_dirty", True):
+        catalog.invalidate()
+
+
+@receiver(post_save, sender=CourseGroup, dispatch_uid="academics_hot_group_capacity")
+def hot_group_saved(sender, instance, created, raw=False, **kwargs):
+    # Grupo caliente editado (p. ej. nueva capacidad): se reparte de nuevo el sobrante
+    if not created and not raw and instance.is_hot:
+        rebalance(instance.pk)
+
+
+# ────────────────────────────────────────────────────────────────
+# Máscara de horario: cualquier cambio de Schedule recalcula la del grupo
+# (y la del grupo anterior si el horario se movió de grupo)
+# ────────────────────────────────────────────────────────────────
+Schedule = registry.model("attendance", "Schedule")
+if Schedule is not None:
+    @receiver(pre_save, sender=Schedule, dispatch_uid="academics_schedule_mask_presave")
+    def schedule_presave(sender, instance, **kwargs):
+        instance._old_group_id = (
+            sender.objects.filter(pk=instance.pk).values_list("course_group_id", flat=True).first()
+            if instance.pk else None
+        )
+
+    @receiver(post_save, sender=Schedule, dispatch_uid="academics_schedule_mask_save")
+    @receiver(post_delete, sender=Schedule, dispatch_uid="academics_schedule_mask_delete")
+    def schedule_changed(sender, instance, **kwargs):
+        ids = {instance.course_group_id, getattr(instance, "_old_group_id", None)} - {None}
+        schedule_mask.refresh_group_masks(ids)
+
+
+# ────────────────────────────────────────────────────────────────
+# Elegibilidad: índice de prerrequisitos y cursos aprobados por alumno
+# ────────────────────────────────────────────────────────────────
+for _name in ("CoursePrerequisite", "CourseCorequisite"):
+    _Model = registry.model("academics", _name)
+    if _Model is not None:
+        post_save.connect(eligibility.invalidate_index, sender=_Model, dispatch_uid=f"academics_eligibility_{_name}_save")
+        post_delete.connect(eligibility.invalidate_index, sender=_Model, dispatch_uid=f"academics_eligibility_{_name}_delete")
+
+
+# GPA del alumno (límite de créditos por promedio)
+_Profile = registry.model("academics", "StudentProfile")
+if _Profile is not None:
+    post_save.connect(credit_rules.invalidate_gpa, sender=_Profile, dispatch_uid="academics_credits_profile_save")
+    post_delete.connect(credit_rules.invalidate_gpa, sender=_Profile, dispatch_uid="academics_credits_profile_delete")
+
+
+@receiver(post_save, sender=Grade, dispatch_uid="academics_eligibility_grade_save")
+@receiver(post_delete, sender=Grade, dispatch_uid="academics_eligibility_grade_delete")
+def grade_changed(sender, instance, **kwargs):
+    eligibility.invalidate_student(instance.student_id)
+
+
+@receiver(post_save, sender=Assessment, dispatch_uid="academics_eligibility_assessment_save")
+@receiver(post_delete, sender=Assessment, dispatch_uid="academics_eligibility_assessment_delete")
+def assessment_changed(sender, **kwargs):
+    eligibility.invalidate_passed()
+
+
+# ────────────────────────────────────────────────────────────────
+# Notas finales: se anota qué recalcular; corre al confirmar la transacción
+# ────────────────────────────────────────────────────────────────
+post_save.connect(final_grades.grade_changed, sender=Grade, dispatch_uid="academics_final_grade_save")
+post_delete.connect(final_grades.grade_changed, sender=Grade, dispatch_uid="academics_final_grade_delete")
+post_save.connect(final_grades.assessment_changed, sender=Assessment, dispatch_uid="academics_final_assessment_save")
+post_delete.connect(final_grades.assessment_changed, sender=Assessment, dispatch_uid="academics_final_assessment_delete")
+
+
+# ────────────────────────────────────────────────────────────────
+# Historial de notas (GradeEvent): en la misma transacción que el cambio;
+# el borrado de una evaluación anota sus notas en un solo bulk_create
+# ────────────────────────────────────────────────────────────────
+if registry.model("academics", "GradeEvent") is not None:
+    pre_save.connect(grade_history.grade_presave, sender=Grade, dispatch_uid="academics_grade_history_presave")
+    post_save.connect(grade_history.grade_saved, sender=Grade, dispatch_uid="academics_grade_history_save")
+    post_delete.connect(grade_history.grade_deleted, sender=Grade, dispatch_uid="academics_grade_history_delete")
+    pre_delete.connect(grade_history.assessment_deleting, sender=Assessment, dispatch_uid="academics_grade_history_assessment_predelete")
+    post_delete.connect(grade_history.assessment_deleted, sender=Assessment, dispatch_uid="academics_grade_history_assessment_delete")
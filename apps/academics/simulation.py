@@ -0,0 +1,300 @@
+# apps/academics/simulation.py
+from __future__ import annotations
+
+import multiprocessing
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connection, connections
+from django.db.models import Count, Exists, F, OuterRef
+
+from .models import Course, CourseGroup, Enrollment
+from .registry import registry
+from .services_capacity import reserve_seats, sync_hot_counters
+from .services_enrollment import EnrollmentError, add_to_cart, confirm_cart, remove_from_cart
+from .term_cache import term_cache
+
+# ────────────────────────────────────────────────────────────────
+# Simulación del día de matrícula (comando simulate_registration)
+#
+# seed() crea un término sintético con prefijo propio (alumnos, docente,
+# cursos, grupos); run() reparte los alumnos entre N hilos o procesos que
+# arrancan a la vez y recorren el flujo add_to_cart → (remove) →
+# confirm_cart; check() verifica invariantes; cleanup() borra lo sembrado,
+# y solo eso: seed() se niega si el prefijo ya está en uso y anota los ids
+# que creó, y cleanup() borra por esos ids, nunca por prefijo.
+# Sin EnrollmentCart el flujo se reduce a reserve_seats (la confirmación
+# directa), para poder medir igual el motor de capacidad.
+# ────────────────────────────────────────────────────────────────
+LOCK_MARKERS = ("lock", "deadlock", "could not serialize", "try restarting transaction")
+MIN_PREFIX = 4
+BATCH_SIZE = 1000
+
+
+class SimulationError(RuntimeError):
+    """La simulación no puede sembrar con ese prefijo."""
+
+
+def _course_prefix(prefix: str) -> str:
+    return prefix[:3].upper()
+
+
+def check_prefix(prefix: str) -> None:
+    if len(prefix) < MIN_PREFIX:
+        raise SimulationError(f"El prefijo debe tener al menos {MIN_PREFIX} caracteres.")
+
+
+def seed(prefix: str, students: int, courses: int, groups_per_course: int, capacity: int) -> dict:
+    """
+    Siembra datos sintéticos; retorna {"students": [pk], "teacher": pk,
+    "courses": [pk], "groups": {course_pk: [pk]}}. Lanza SimulationError si
+    ya hay usuarios o cursos con esos nombres (corrida anterior con --keep,
+    o datos reales).
+    """
+    check_prefix(prefix)
+    User = get_user_model()
+    Role = registry.model("users", "Role")
+    student_role = teacher_role = None
+    if Role is not None and registry.has_field(User, "role"):
+        student_role, _ = Role.objects.get_or_create(name="Alumno")
+        teacher_role, _ = Role.objects.get_or_create(name="Docente")
+
+    def user(username, role):
+        u = User(username=username, password="!")  # contraseña inutilizable
+        if role is not None:
+            u.role = role
+        return u
+
+    if User.objects.filter(username__startswith=prefix).exists():
+        raise SimulationError(f"Ya hay usuarios con el prefijo {prefix!r}; usa otro --prefix.")
+    codes = [f"{_course_prefix(prefix)}{i:04d}" for i in range(courses)]
+    if Course.objects.filter(code__in=codes).exists():
+        raise SimulationError(f"Ya hay cursos con códigos {_course_prefix(prefix)}NNNN; usa otro --prefix.")
+
+    teacher = user(f"{prefix}teacher", teacher_role)
+    teacher.save()
+    usernames = [f"{prefix}s{i:05d}" for i in range(students)]
+    User.objects.bulk_create([user(name, student_role) for name in usernames], batch_size=BATCH_SIZE)
+    Course.objects.bulk_create(
+        [Course(code=code, name=f"Curso simulado {i}", teacher=teacher) for i, code in enumerate(codes)]
+    )
+    # Los ids se leen por nombre exacto (MariaDB no los devuelve en bulk_create)
+    course_ids = list(Course.objects.filter(code__in=codes, teacher=teacher).values_list("pk", flat=True))
+    CourseGroup.objects.bulk_create(
+        [
+            CourseGroup(course_id=cid, section=chr(ord("A") + g), capacity=capacity)
+            for cid in course_ids
+            for g in range(groups_per_course)
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    groups = defaultdict(list)
+    for pk, cid in CourseGroup.objects.filter(course_id__in=course_ids).values_list("pk", "course_id"):
+        groups[cid].append(pk)
+    student_ids = []
+    for i in range(0, len(usernames), BATCH_SIZE):
+        student_ids += User.objects.filter(username__in=usernames[i:i + BATCH_SIZE]).values_list("pk", flat=True)
+    return {"students": sorted(student_ids), "teacher": teacher.pk, "courses": course_ids, "groups": dict(groups)}
+
+
+def cleanup(seeded: dict) -> None:
+    """Borra exactamente lo que creó seed(), por id."""
+    User = get_user_model()
+    Course.objects.filter(pk__in=seeded["courses"]).delete()  # cascada: grupos, matrículas, colas
+    users = [*seeded["students"], seeded["teacher"]]
+    for i in range(0, len(users), BATCH_SIZE):
+        User.objects.filter(pk__in=users[i:i + BATCH_SIZE]).delete()
+
+
+# ────────────────────────────────────────────────────────────────
+# Ejecución
+# ────────────────────────────────────────────────────────────────
+class _QueryCounter:
+    def __init__(self):
+        self.n = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.n += 1
+        return execute(sql, params, many, context)
+
+
+def _is_lock_error(exc) -> bool:
+    return isinstance(exc, DatabaseError) and any(m in str(exc).lower() for m in LOCK_MARKERS)
+
+
+def _timed(samples: dict, counter: _QueryCounter, op: str, fn, *args, **kwargs):
+    before = counter.n
+    t0 = time.perf_counter()
+    outcome = "ok"
+    try:
+        fn(*args, **kwargs)
+    except EnrollmentError:
+        outcome = "rejected"  # regla de negocio (sin cupo, etc.): resultado válido
+    except Exception as exc:
+        outcome = "lock" if _is_lock_error(exc) else "error"
+    samples[op].append((time.perf_counter() - t0, counter.n - before, outcome))
+
+
+def _add(user, term, gid):
+    # Igual que la vista: el grupo se lee fresco antes de agregar
+    add_to_cart(user, term, CourseGroup.objects.get(pk=gid))
+
+
+def _remove(user, term, gid):
+    remove_from_cart(user, term, CourseGroup.objects.get(pk=gid))
+
+
+def _student_flow(user, term, plan, samples, counter, cart_mode: bool, drop_ratio: float, rnd):
+    if not cart_mode:
+        _timed(samples, counter, "confirm", reserve_seats, user, plan)
+        return
+    for gid in plan:
+        _timed(samples, counter, "add", _add, user, term, gid)
+    if plan and rnd.random() < drop_ratio:
+        _timed(samples, counter, "remove", _remove, user, term, rnd.choice(plan))
+    _timed(samples, counter, "confirm", confirm_cart, user, term)
+
+
+def _worker(student_ids, groups, picks, drop_ratio, seed_value, barrier, cart_mode):
+    """Corre en un hilo o en un proceso hijo; retorna {op: [(seg, consultas, resultado)]}."""
+    User = get_user_model()
+    rnd = random.Random(seed_value)
+    samples = defaultdict(list)
+    counter = _QueryCounter()
+    course_ids = list(groups)
+    term = term_cache.current_term()
+    users = list(User.objects.filter(pk__in=student_ids))
+    try:
+        barrier.wait(timeout=120)
+        with connection.execute_wrapper(counter):
+            for user in users:
+                chosen = rnd.sample(course_ids, min(picks, len(course_ids)))
+                plan = [rnd.choice(groups[cid]) for cid in chosen]
+                _student_flow(user, term, plan, samples, counter, cart_mode, drop_ratio, rnd)
+    finally:
+        connections.close_all()
+    return dict(samples)
+
+
+def _process_entry(queue, *args):
+    try:
+        queue.put(_worker(*args))
+    except Exception:
+        queue.put({})  # el padre no debe quedar esperando a un hijo caído
+
+
+def run(seeded: dict, workers: int, mode: str, picks: int, drop_ratio: float, seed_value: int) -> dict:
+    """Lanza la carga y retorna {"samples": {...}, "wall": segundos, "mode": ...}."""
+    cart_mode = registry.model("academics", "EnrollmentCart") is not None
+    slices = [seeded["students"][i::workers] for i in range(workers)]
+    slices = [s for s in slices if s]
+    args = [(s, seeded["groups"], picks, drop_ratio, seed_value + i) for i, s in enumerate(slices)]
+    if mode == "process" and "fork" not in multiprocessing.get_all_start_methods():
+        mode = "thread"  # sin fork los hijos no heredan Django configurado
+
+    results = []
+    t0 = time.perf_counter()
+    if mode == "process":
+        ctx = multiprocessing.get_context("fork")
+        barrier = ctx.Barrier(len(args))
+        queue = ctx.Queue()
+        connections.close_all()  # los hijos no deben compartir la conexión del padre
+        procs = [ctx.Process(target=_process_entry, args=(queue, *a, barrier, cart_mode)) for a in args]
+        for p in procs:
+            p.start()
+        results = [queue.get() for _ in procs]
+        for p in procs:
+            p.join()
+    else:
+        barrier = threading.Barrier(len(args))
+        lock = threading.Lock()
+
+        def target(a):
+            out = _worker(*a, barrier, cart_mode)
+            with lock:
+                results.append(out)
+
+        threads = [threading.Thread(target=target, args=(a,)) for a in args]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    wall = time.perf_counter() - t0
+
+    merged = defaultdict(list)
+    for r in results:
+        for op, rows in r.items():
+            merged[op].extend(rows)
+    return {"samples": dict(merged), "wall": wall, "mode": mode, "cart_mode": cart_mode}
+
+
+# ────────────────────────────────────────────────────────────────
+# Métricas e invariantes
+# ────────────────────────────────────────────────────────────────
+def _pct(sorted_values, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def summarize(result: dict) -> dict:
+    ops = {}
+    total = 0
+    for op, rows in sorted(result["samples"].items()):
+        lat = sorted(r[0] for r in rows)
+        outcomes = defaultdict(int)
+        for r in rows:
+            outcomes[r[2]] += 1
+        total += len(rows)
+        ops[op] = {
+            "count": len(rows),
+            "p50_ms": _pct(lat, 50) * 1000,
+            "p95_ms": _pct(lat, 95) * 1000,
+            "p99_ms": _pct(lat, 99) * 1000,
+            "queries_avg": sum(r[1] for r in rows) / len(rows) if rows else 0.0,
+            **{k: outcomes[k] for k in ("ok", "rejected", "lock", "error")},
+        }
+    return {
+        "mode": result["mode"],
+        "flow": "cart" if result["cart_mode"] else "reserve_seats",
+        "wall_s": result["wall"],
+        "ops_per_s": total / result["wall"] if result["wall"] else 0.0,
+        "ops": ops,
+    }
+
+
+def lock_wait_counters() -> dict:
+    """Contadores de espera por bloqueos del motor, si los expone (MariaDB/MySQL)."""
+    if connection.vendor != "mysql":
+        return {}
+    with connection.cursor() as cur:
+        cur.execute("SHOW GLOBAL STATUS WHERE Variable_name IN ('Innodb_row_lock_waits', 'Innodb_row_lock_time')")
+        return {name: int(value) for name, value in cur.fetchall()}
+
+
+def check(seeded: dict) -> dict:
+    """Invariantes tras la carga sobre los grupos sembrados."""
+    group_ids = [pk for pks in seeded["groups"].values() for pk in pks]
+    sync_hot_counters()  # los grupos calientes llevan el total en sus fragmentos
+    groups = CourseGroup.objects.filter(pk__in=group_ids).annotate(real=Count("enrollments"))
+    out = {
+        "oversubscribed": groups.filter(real__gt=F("capacity")).count(),
+        "counter_drift": groups.exclude(enrolled_count=F("real")).count(),
+        "orphan_reservations": 0,
+    }
+    CapReservation = registry.model("academics", "CapReservation")
+    if CapReservation is not None:
+        # Reserva que sobrevive a la matrícula del mismo grupo, o sin item en el carrito
+        qs = CapReservation.objects.filter(course_group_id__in=group_ids)
+        enrolled = Enrollment.objects.filter(student=OuterRef("student"), course_group=OuterRef("course_group"))
+        orphan = qs.filter(Exists(enrolled))
+        CartItem = registry.model("academics", "CartItem")
+        if CartItem is not None:
+            in_cart = CartItem.objects.filter(cart__student=OuterRef("student"), course_group=OuterRef("course_group"))
+            orphan = orphan | qs.exclude(Exists(in_cart))
+        out["orphan_reservations"] = orphan.distinct().count()
+    return out
@@ -0,0 +1,93 @@
+# apps/academics/term_cache.py
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .registry import registry
+
+# ────────────────────────────────────────────────────────────────
+# Caché del término activo y sus reglas (TermRule)
+#
+# Cada proceso guarda en memoria el término actual y las reglas por
+# término. Guardar/borrar un Term o TermRule (signals.py) cambia un sello
+# de versión en la caché compartida de Django; cada proceso compara su
+# sello como máximo cada TERM_CACHE_RECHECK segundos y, si cambió, descarta
+# lo que tenía. Con una caché compartida (DatabaseCache, FileBasedCache,
+# memcached) todos los workers quedan consistentes en ese plazo.
+# ────────────────────────────────────────────────────────────────
+VERSION_KEY = "academics:term_cache:version"
+_MISSING = object()
+
+
+class TermCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self._term = _MISSING
+        self._rules: dict = {}
+
+    def _shared_version(self) -> str:
+        return cache.get_or_set(VERSION_KEY, lambda: uuid.uuid4().hex, timeout=None)
+
+    def _sync(self):
+        """Descarta lo local si otro proceso (o este) invalidó la versión."""
+        recheck = getattr(settings, "TERM_CACHE_RECHECK", 2)
+        now = time.monotonic()
+        if now - self._checked_at < recheck:
+            return
+        version = self._shared_version()
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._term = _MISSING
+                self._rules = {}
+            self._checked_at = now
+
+    def current_term(self):
+        """Último Term por start_date, o None si no hay (o no existe el modelo)."""
+        Term = registry.model("academics", "Term")
+        if Term is None:
+            return None
+        self._sync()
+        term = self._term
+        if term is _MISSING:
+            term = Term.objects.order_by("-start_date").first()
+            with self._lock:
+                self._term = term
+        return term
+
+    def term_rule(self, term):
+        """TermRule del término (primera), o None."""
+        TermRule = registry.model("academics", "TermRule")
+        if TermRule is None or term is None:
+            return None
+        self._sync()
+        rule = self._rules.get(term.pk, _MISSING)
+        if rule is _MISSING:
+            rule = TermRule.objects.filter(term=term).first()
+            with self._lock:
+                self._rules[term.pk] = rule
+        return rule
+
+    def invalidate(self, *args, **kwargs):
+        """Receptor de post_save/post_delete de Term y TermRule."""
+        # Tras el commit: otro worker no debe recargar datos aún sin confirmar
+        transaction.on_commit(self._bump)
+
+    def _bump(self):
+        cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        with self._lock:
+            self._version = None
+            self._checked_at = 0.0
+            self._term = _MISSING
+            self._rules = {}
+
+
+term_cache = TermCache()
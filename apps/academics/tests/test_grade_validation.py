@@ -0,0 +1,41 @@
+# apps/academics/tests/test_grade_validation.py
+from __future__ import annotations
+
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+
+from apps.academics.grade_validation import validate_upload
+from apps.academics.models import Assessment, Course, CourseGroup
+
+HEADER = b"student_username,assessment,points\n"
+
+
+class GradeValidationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.teacher = User.objects.create_user("val_t", is_staff=True)
+        course = Course.objects.create(code="VAL1", name="Validación", teacher=cls.teacher)
+        cls.group = CourseGroup.objects.create(course=course, section="A")
+        Assessment.objects.create(course_group=cls.group, title="PC1", total_points=20)
+        cls.student = User.objects.create_user("val_s")
+
+    def test_header_only_file(self):
+        result = validate_upload(self.group, BytesIO(HEADER))
+        self.assertEqual((result["rows"], result["invalid"]), (0, 0))
+        self.assertTrue(result["report"].empty)
+
+    def test_header_only_dry_run(self):
+        self.client.force_login(self.teacher)
+        url = reverse("academics:import_grades", args=[self.group.pk])
+        resp = self.client.post(url, {"file": SimpleUploadedFile("notas.csv", HEADER), "dry_run": "1"})
+        self.assertRedirects(resp, url, fetch_redirect_response=False)
+
+    def test_score_over_total(self):
+        result = validate_upload(self.group, BytesIO(HEADER + b"val_s,PC1,25\n"))
+        self.assertEqual(result["invalid"], 1)
+        self.assertEqual(result["report"]["error"].tolist(), ["puntaje mayor que el total (20)"])
@@ -1,26 +1,46 @@
 # apps/academics/urls.py
 from django.urls import path
-from .views_enrollment_cart import offerings, cart_view, cart_add, cart_remove, cart_confirm
-from .views_import import import_students, import_enrollments
-from .views_reports import occupancy_report, occupancy_csv
-from .views_grades import import_grades, grades_csv   # <- grades_csv lo agregamos abajo
+from .views_enrollment_cart import (
+    offerings, offerings_seats, cart_view, cart_add, cart_remove, cart_renew, cart_confirm,
+    waitlist_join, waitlist_leave, waiting_room_status, waiting_room_stats,
+)
+from .views_import import import_students, import_enrollments, import_job_status, import_job_errors, import_job_changes
+from .views_reports import occupancy_report, occupancy_csv, enrollments_export
+from .views_grades import import_grades, grades_csv, term_grades_csv, gradebook_export
 from .views_stats import group_stats_view              # <- nombre EXACTO al tuyo
 
 app_name = "academics"
 
 urlpatterns = [
     path("offerings/", offerings, name="academics_offerings"),
+    path("offerings/seats.json", offerings_seats, name="academics_offerings_seats"),
     path("cart/", cart_view, name="academics_cart"),
     path("cart/add/<int:group_id>/", cart_add, name="academics_cart_add"),
     path("cart/remove/<int:group_id>/", cart_remove, name="academics_cart_remove"),
+    path("cart/renew/", cart_renew, name="academics_cart_renew"),
     path("cart/confirm/", cart_confirm, name="academics_cart_confirm"),
+    path("waitlist/join/<int:group_id>/", waitlist_join, name="academics_waitlist_join"),
+    path("waitlist/leave/<int:group_id>/", waitlist_leave, name="academics_waitlist_leave"),
+    path("waiting-room/status/", waiting_room_status, name="waiting_room_status"),
+    path("secretary/waiting-room/stats/", waiting_room_stats, name="waiting_room_stats"),
 
     path("secretary/import/students/", import_students, name="import_students"),
     path("secretary/import/enrollments/", import_enrollments, name="import_enrollments"),
+    path("imports/<int:pk>/", import_job_status, name="import_job_status"),
+    path("imports/<int:pk>/errors.csv", import_job_errors, name="import_job_errors"),
+    path("imports/<int:pk>/changes.csv", import_job_changes, name="import_job_changes"),
     path("secretary/reports/occupancy/", occupancy_report, name="occupancy_report"),
     path("secretary/reports/occupancy.csv", occupancy_csv, name="occupancy_csv"),
+    path("secretary/reports/occupancy.xlsx", occupancy_csv, {"fmt": "xlsx"}, name="occupancy_xlsx"),
+    path("secretary/reports/enrollments.<str:fmt>", enrollments_export, name="enrollments_export"),
+    path("secretary/grades/term.csv", term_grades_csv, name="term_grades_csv"),
+    path("secretary/grades/term.xlsx", term_grades_csv, {"fmt": "xlsx"}, name="term_grades_xlsx"),
+    path("secretary/gradebook/term.<str:fmt>", gradebook_export, {"scope": "term"}, name="gradebook_term"),
 
     path("teacher/grades/import/<int:group_id>/", import_grades, name="import_grades"),
     path("group/<int:group_id>/grades.csv", grades_csv, name="grades_csv"),
+    path("group/<int:group_id>/grades.xlsx", grades_csv, {"fmt": "xlsx"}, name="grades_xlsx"),
+    path("group/<int:pk>/gradebook.<str:fmt>", gradebook_export, {"scope": "group"}, name="gradebook_group"),
+    path("course/<int:pk>/gradebook.<str:fmt>", gradebook_export, {"scope": "course"}, name="gradebook_course"),
     path("group/<int:group_id>/stats/view/", group_stats_view, name="coursegroup_stats_view"),
 ]
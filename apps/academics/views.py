@@ -1,7 +1,9 @@
 from django.contrib.auth.decorators import login_required
 from django.db.models import Avg, Max, Min
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404
+from .exports import csv_response, grade_rows
+from .final_grades import finals_for_student, group_average
 from .models import CourseGroup, Grade
 
 @login_required(login_url="/accounts/login/")
@@ -39,6 +41,8 @@ def coursegroup_stats(request, group_id: int):
             "max": float(stats["mx"] or 0),
             "min": float(stats["mn"] or 0),
         },
+        # Promedio de las notas finales (FinalGrade, escala 0-20)
+        "final_avg": group_average(cg),
     })
 
 # --- Página HTML con gráfico de barras ---
@@ -60,6 +64,7 @@ def group_stats_view(request, group_id: int):
     ctx = {
         "course_group": cg,
         "enrolled": enrolled,
+        "overall": group_average(cg),
         "stats": {"avg": float(stats["avg"] or 0), "mx": float(stats["mx"] or 0), "mn": float(stats["mn"] or 0)},
         "labels": labels,
         "scores": scores,
@@ -78,17 +83,16 @@ def my_performance(request):
             "assessment__course_group__course"
         )
     )
+    # avg: nota final materializada (FinalGrade), una consulta por índice
+    finals = finals_for_student(request.user)
     resumen = {}
     for g in qs:
         key = f"{g.assessment.course_group.course.code}-{g.assessment.course_group.section}"
-        resumen.setdefault(key, {"items": [], "avg": 0})
+        resumen.setdefault(key, {"items": [], "avg": finals.get(g.assessment.course_group_id, 0)})
         resumen[key]["items"].append({"assessment": g.assessment.title, "score": float(g.score)})
-    for k, v in resumen.items():
-        if v["items"]:
-            v["avg"] = sum(i["score"] for i in v["items"]) / len(v["items"])
     return JsonResponse(resumen)
 
-# --- Exportar notas del grupo a CSV ---
+# --- Exportar notas del grupo a CSV (streaming) ---
 @login_required(login_url="/accounts/login/")
 def export_group_grades_csv(request, group_id: int):
     """
@@ -97,21 +101,11 @@ def export_group_grades_csv(request, group_id: int):
     """
     cg = get_object_or_404(CourseGroup.objects.select_related("course"), pk=group_id)
     rows = (
-        Grade.objects
-        .filter(assessment__course_group=cg)
-        .select_related("student", "assessment")
-        .order_by("student__username", "assessment__title")
+        (uname, curso, secc, evalt, float(score))
+        for uname, curso, secc, evalt, score in grade_rows([cg.pk])
+    )
+    return csv_response(
+        f"notas_{cg.course.code}_{cg.section}.csv",
+        ["username", "curso", "seccion", "evaluacion", "score"],
+        rows,
     )
-
-    lines = ["username,curso,seccion,evaluacion,score"]
-    for g in rows:
-        uname = g.student.username.replace(",", " ")
-        curso = cg.course.code
-        secc = cg.section
-        evalt = g.assessment.title.replace(",", " ")
-        lines.append(f"{uname},{curso},{secc},{evalt},{float(g.score)}")
-
-    content = "\n".join(lines)
-    response = HttpResponse(content, content_type="text/csv; charset=utf-8")
-    response["Content-Disposition"] = f'attachment; filename="notas_{cg.course.code}_{cg.section}.csv"'
-    return response
@@ -2,31 +2,37 @@
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.shortcuts import render, redirect, get_object_or_404
+from django.core.paginator import Paginator
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.urls import reverse
-from django.apps import apps
+
+from . import catalog
+from .idempotency import idempotent
+from .registry import registry
+from .services_reservations import active
+from .term_cache import term_cache
+from .waiting_room import admission_required, check_admission, room_stats
 
 # ────────────────────────────────────────────────────────────────
 # Carga segura de modelos (no revienta si el modelo no existe)
 # ────────────────────────────────────────────────────────────────
-try:
-    Term = apps.get_model("academics", "Term")           # puede no existir aún
-except LookupError:
-    Term = None
+CourseGroup = registry.model("academics", "CourseGroup")
 
-try:
-    CourseGroup = apps.get_model("academics", "CourseGroup")
-except LookupError:
-    CourseGroup = None
+OFFERINGS_PER_PAGE = 50
 
 # ────────────────────────────────────────────────────────────────
 # Servicios de matrícula (asumimos que existen en tu app)
 # ────────────────────────────────────────────────────────────────
 from .services_enrollment import (
+    GroupFullError,
     add_to_cart,
     remove_from_cart,
+    renew_cart,
     confirm_cart,
     get_or_create_cart,
 )
+from .services_waitlist import join_waitlist, leave_waitlist, position
 
 # ────────────────────────────────────────────────────────────────
 # Helpers
@@ -35,12 +41,13 @@ def is_student(u):
     """Ajusta esta verificación a tu sistema de roles/permisos."""
     return hasattr(u, "role") and u.role and getattr(u.role, "name", "") == "Alumno"
 
+def is_staff(u):
+    return bool(getattr(u, "is_staff", False))
+
 def _current_term():
-    """Devuelve el último término si existe; si no, None (no rompe)."""
-    if Term is None:
-        return None
+    """Devuelve el último término si existe; si no, None (no rompe). Cacheado por proceso."""
     try:
-        return Term.objects.order_by("-start_date").first()
+        return term_cache.current_term()
     except Exception:
         return None
 
@@ -59,22 +66,45 @@ def _redir(name_with_ns: str, name_no_ns: str, *args, **kwargs):
 # ────────────────────────────────────────────────────────────────
 @login_required
 @user_passes_test(is_student)
+@admission_required
 def offerings(request):
+    """
+    Catálogo paginado (?page=N) y filtrable por código (?code=CS1).
+    La foto del catálogo sale de la caché; los cupos, del overlay.
+    Responde 304 si la página (catálogo + cupos) no cambió.
+    """
     term = _current_term()
     if CourseGroup is None:
         messages.error(request, "El modelo CourseGroup aún no está disponible.")
         return _redir("academics:academics_cart", "academics_cart")
 
-    # Query base
-    qs = CourseGroup.objects.select_related("course")
-    # Si tu modelo Course tiene FK hacia teacher/professor, lo intentamos:
-    try:
-        qs = qs.select_related("course__teacher")
-    except Exception:
-        pass
+    code = (request.GET.get("code") or "").strip()
+    rows = catalog.filter_by_code(catalog.catalog_snapshot(term), code)
+    page = Paginator(rows, OFFERINGS_PER_PAGE).get_page(request.GET.get("page"))
+    seats = catalog.seat_overlay(r["id"] for r in page)
+
+    etag = catalog.page_etag(
+        catalog.catalog_version(), getattr(term, "pk", None), code.upper(), page.number,
+        sorted((pk, s["capacity"], s["enrolled"]) for pk, s in seats.items()),
+    )
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
 
-    groups = qs.order_by("course__code", "section")
-    return render(request, "academics/offerings_cart.html", {"groups": groups, "term": term})
+    groups = [{**r, **seats.get(r["id"], {})} for r in page]
+    resp = render(request, "academics/offerings_cart.html", {
+        "groups": groups, "page_obj": page, "code": code, "term": term,
+    })
+    resp["ETag"] = etag
+    patch_cache_control(resp, private=True, no_cache=True)
+    return resp
+
+@login_required
+@user_passes_test(is_student)
+def offerings_seats(request):
+    """Overlay de cupos en JSON para refrescar la página sin recargar el catálogo (?ids=1,2,3)."""
+    ids = [int(x) for x in (request.GET.get("ids") or "").split(",") if x.strip().isdigit()][:OFFERINGS_PER_PAGE]
+    return JsonResponse({str(pk): s for pk, s in catalog.seat_overlay(ids).items()})
 
 # ────────────────────────────────────────────────────────────────
 # Ver carrito
@@ -86,8 +116,8 @@ def cart_view(request):
     if term is None:
         messages.warning(request, "Aún no hay término activo configurado.")
     cart = get_or_create_cart(request.user, term)
-    # Items con joins útiles para la plantilla
-    items = cart.items.select_related("course_group", "course_group__course")
+    # Items vigentes (los expirados se tratan como libres) con joins útiles para la plantilla
+    items = active(cart.items.select_related("course_group", "course_group__course"))
     return render(request, "academics/cart.html", {"cart": cart, "items": items, "term": term})
 
 # ────────────────────────────────────────────────────────────────
@@ -95,6 +125,8 @@ def cart_view(request):
 # ────────────────────────────────────────────────────────────────
 @login_required
 @user_passes_test(is_student)
+@idempotent
+@admission_required
 def cart_add(request, group_id: int):
     if CourseGroup is None:
         messages.error(request, "El modelo CourseGroup aún no está disponible.")
@@ -109,6 +141,9 @@ def cart_add(request, group_id: int):
     try:
         add_to_cart(request.user, term, group)
         messages.success(request, "Reservado en carrito.")
+    except GroupFullError as e:
+        # En vez de reintentar, el alumno puede entrar a la lista de espera
+        messages.error(request, f"{e} Puedes unirte a la lista de espera del grupo.")
     except Exception as e:
         messages.error(request, str(e))
 
@@ -138,23 +173,84 @@ def cart_remove(request, group_id: int):
 
     return _redir("academics:academics_cart", "academics_cart")
 
+# ────────────────────────────────────────────────────────────────
+# Renovar todas las reservas del carrito (una llamada en vez de una por item)
+# ────────────────────────────────────────────────────────────────
+@login_required
+@user_passes_test(is_student)
+def cart_renew(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "Usa POST."}, status=405)
+    try:
+        n = renew_cart(request.user, _current_term())
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({"renewed": n})
+
 # ────────────────────────────────────────────────────────────────
 # Confirmar matrícula (procesa carrito completo)
 # ────────────────────────────────────────────────────────────────
 @login_required
 @user_passes_test(is_student)
+@idempotent
+@admission_required
 def cart_confirm(request):
     term = _current_term()
     if term is None:
         messages.error(request, "No hay término activo.")
         return _redir("academics:academics_cart", "academics_cart")
 
+    # "Todas las secciones o ninguna" (checkbox opcional en el formulario)
+    all_or_none = request.POST.get("all_or_none") in {"1", "true", "on"}
     try:
-        n = confirm_cart(request.user, term)
+        n, expired = confirm_cart(request.user, term, all_or_none=all_or_none)
         messages.success(request, f"Matrícula confirmada: {n} secciones.")
+        if expired:
+            messages.warning(
+                request, f"Venció la reserva de {', '.join(expired)}; vuelve a agregarlos al carrito."
+            )
     except Exception as e:
         messages.error(request, str(e))
 
     # Ajusta el destino si tienes vista de "mis matrículas"
     return _redir("academics:academics_cart", "academics_cart")
     # Ej.: return _redir("academics:academics_my_enrollments", "academics_my_enrollments")
+
+# ────────────────────────────────────────────────────────────────
+# Lista de espera por grupo (un turno por alumno, sin reintentos)
+# ────────────────────────────────────────────────────────────────
+@login_required
+@user_passes_test(is_student)
+def waitlist_join(request, group_id: int):
+    group = get_object_or_404(CourseGroup, pk=group_id)
+    try:
+        entry = join_waitlist(request.user, group)
+        pos = position(entry)
+        if pos:
+            messages.success(request, f"En lista de espera: posición {pos}. Te reservaremos el cupo cuando se libere.")
+        else:
+            messages.info(request, "Ya tienes un cupo ofrecido en este grupo; confírmalo desde tu carrito.")
+    except Exception as e:
+        messages.error(request, str(e))
+    return _redir("academics:academics_cart", "academics_cart")
+
+@login_required
+@user_passes_test(is_student)
+def waitlist_leave(request, group_id: int):
+    group = get_object_or_404(CourseGroup, pk=group_id)
+    leave_waitlist(request.user, group)
+    messages.success(request, "Saliste de la lista de espera.")
+    return _redir("academics:academics_cart", "academics_cart")
+
+# ────────────────────────────────────────────────────────────────
+# Sala de espera: sondeo del alumno y métricas para Secretaría
+# ────────────────────────────────────────────────────────────────
+@login_required
+def waiting_room_status(request):
+    position = check_admission(request)
+    return JsonResponse({"admitted": position == 0, "position": position})
+
+@login_required
+@user_passes_test(is_staff)
+def waiting_room_stats(request):
+    return JsonResponse(room_stats())
@@ -1,13 +1,21 @@
 # apps/academics/views_grades.py
 from __future__ import annotations
-import csv
-from io import TextIOWrapper
+
+from datetime import datetime, time
 
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.core.exceptions import PermissionDenied
 from django.http import HttpResponse, Http404
 from django.contrib import messages
+from django.middleware.csrf import get_token
 from django.shortcuts import redirect
-from django.apps import apps
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from . import grade_validation, gradebook
+from .exports import csv_response, grade_rows, table_response, workbook_response
+from .registry import registry
+from .term_cache import term_cache
+from .views_import import enqueue_upload, reject_upload
 
 # ────────────────────────────────────────────────────────────────
 # Helpers
@@ -23,45 +31,18 @@ def is_teacher(user) -> bool:
         return True
     return bool(getattr(user, "is_staff", False))
 
+def is_staff(user) -> bool:
+    """Exportaciones de Secretaría (todo un término)."""
+    return bool(getattr(user, "is_staff", False))
+
 def _gm(app_label: str, model_name: str):
     """get_model tolerante: None si no existe el modelo todavía."""
-    try:
-        return apps.get_model(app_label, model_name)
-    except LookupError:
-        return None
+    return registry.model(app_label, model_name)
 
 # Modelos (opcionales; el módulo debe importar aunque falten)
 Grade = _gm("academics", "Grade")
 Assessment = _gm("academics", "Assessment")
 CourseGroup = _gm("academics", "CourseGroup")
-User = _gm("auth", "User")
-
-def _get_assessment_label(a) -> str:
-    if a is None:
-        return ""
-    # title > name > str(a)
-    return getattr(a, "title", getattr(a, "name", str(a)))
-
-def _get_points_from_grade(g) -> str:
-    if g is None:
-        return ""
-    if hasattr(g, "score"):
-        return getattr(g, "score")
-    if hasattr(g, "value"):
-        return getattr(g, "value")
-    return ""
-
-def _find_assessment_by_group_and_label(group, label):
-    """Busca Assessment por group + (title|name)==label."""
-    if Assessment is None or group is None or not label:
-        return None
-    qs = Assessment.objects.filter(course_group=group)
-    # probar por title y name
-    a = qs.filter(title=label).first() if any(f.name == "title" for f in Assessment._meta.get_fields()) else None
-    if a:
-        return a
-    a = qs.filter(name=label).first() if any(f.name == "name" for f in Assessment._meta.get_fields()) else None
-    return a
 
 def _get_group_or_404(group_id: int):
     if CourseGroup is None:
@@ -69,59 +50,120 @@ def _get_group_or_404(group_id: int):
     return CourseGroup.objects.filter(pk=group_id).first() or (_ for _ in ()).throw(Http404("Grupo no encontrado"))
 
 # ────────────────────────────────────────────────────────────────
-# 1) Exportar CSV de notas de un grupo
-#    GET /academics/group/<group_id>/grades.csv
+# 1) Exportar notas de un grupo (CSV o XLSX)
+#    GET /academics/group/<group_id>/grades.<csv|xlsx>
 # columnas: student_username, assessment, points
 # ────────────────────────────────────────────────────────────────
 @login_required
 @user_passes_test(is_teacher)
-def grades_csv(request, group_id: int):
+def grades_csv(request, group_id: int, fmt: str = "csv"):
     group = _get_group_or_404(group_id)
+    # Streaming: tuplas de values_list().iterator(), sin instancias ni select_related.
+    # Si no hay Grade o Assessment todavía, solo sale la cabecera.
+    rows = ((username, label, points) for username, _code, _section, label, points in grade_rows([group.pk]))
+    return table_response(fmt, f"group_{group_id}_grades", ["student_username", "assessment", "points"], rows, "notas")
 
-    # Si no hay Grade o Assessment todavía, devolvemos solo cabecera
-    if Grade is None or Assessment is None:
-        resp = HttpResponse("student_username,assessment,points\n", content_type="text/csv")
-        resp["Content-Disposition"] = f'attachment; filename="group_{group_id}_grades.csv"'
-        return resp
-
-    # Traer todas las calificaciones del grupo
-    # Grade tiene FK a Assessment -> course_group
-    grades_qs = Grade.objects.select_related("student", "assessment").filter(
-        assessment__course_group=group
-    )
-
-    # Generar CSV
-    resp = HttpResponse(content_type="text/csv")
-    resp["Content-Disposition"] = f'attachment; filename="group_{group_id}_grades.csv"'
-    writer = csv.writer(resp)
-    writer.writerow(["student_username", "assessment", "points"])
-
-    for g in grades_qs:
-        student = getattr(g, "student", None)
-        username = getattr(student, "username", str(student)) if student else ""
-        assessment_label = _get_assessment_label(getattr(g, "assessment", None))
-        points = _get_points_from_grade(g)
-        writer.writerow([username, assessment_label, points])
+# ────────────────────────────────────────────────────────────────
+# 1b) Exportar notas de todo un término (Secretaría)
+#     GET /academics/secretary/grades/term.<csv|xlsx>[?term=<id>]
+# columnas: username, curso, seccion, evaluacion, score
+# Sin campo term en CourseGroup se exportan todos los grupos.
+# ────────────────────────────────────────────────────────────────
+@login_required
+@user_passes_test(is_staff)
+def term_grades_csv(request, fmt: str = "csv"):
+    if CourseGroup is None:
+        raise Http404("CourseGroup no está disponible aún.")
+    groups = CourseGroup.objects.all()
+    name = "notas_todas"
+    if registry.has_field(CourseGroup, "term"):
+        term_id = request.GET.get("term") or getattr(term_cache.current_term(), "pk", None)
+        if not str(term_id or "").isdigit():
+            raise Http404("Término no encontrado")
+        groups = groups.filter(term_id=term_id)
+        name = f"notas_termino_{term_id}"
+    group_ids = groups.order_by("course__code", "section").values_list("pk", flat=True)
+    return table_response(fmt, name, ["username", "curso", "seccion", "evaluacion", "score"], grade_rows(group_ids), "notas")
 
-    return resp
+# ────────────────────────────────────────────────────────────────
+# 1c) Registro de notas (alumno × evaluación + final ponderado)
+#     GET /academics/group/<id>/gradebook.<csv|xlsx>
+#     GET /academics/course/<id>/gradebook.<csv|xlsx>
+#     GET /academics/secretary/gradebook/term.<csv|xlsx>[?term=<id>]
+#     ?as_of=AAAA-MM-DD[THH:MM] → notas tal como estaban en esa fecha
+#     (desde el historial GradeEvent; una fecha sola es el fin de ese día)
+# ────────────────────────────────────────────────────────────────
+def _as_of(value: str | None):
+    if not value:
+        return None
+    try:
+        when = parse_datetime(value)
+        day = parse_date(value) if when is None else None
+    except ValueError:  # bien formada pero inexistente (2026-02-30)
+        when = day = None
+    if when is None:
+        if day is None:
+            raise Http404("Fecha as_of inválida")
+        when = datetime.combine(day, time.max)
+    return timezone.make_aware(when) if timezone.is_naive(when) else when
+
+@login_required
+@user_passes_test(is_teacher)
+def gradebook_export(request, scope: str, fmt: str, pk: int | None = None):
+    if CourseGroup is None or scope not in gradebook.SCOPES or fmt not in {"csv", "xlsx"}:
+        raise Http404("Registro no disponible")
+    if scope == "term":
+        if not is_staff(request.user):
+            raise PermissionDenied
+        pk = request.GET.get("term") or None
+        if pk is not None and not str(pk).isdigit():
+            raise Http404("Término no encontrado")
+    as_of = _as_of(request.GET.get("as_of"))
+    groups = gradebook.scope_groups(scope, pk, term=term_cache.current_term())
+    if scope == "group" and not groups.exists():
+        raise Http404("Grupo no encontrado")
+
+    book = gradebook.build_gradebook(groups, as_of=as_of)
+    name = f"registro_{scope}_{pk or 'actual'}{as_of.strftime('_%Y%m%d') if as_of else ''}.{fmt}"
+    if fmt == "csv":
+        header, rows = gradebook.csv_rows(book)
+        return csv_response(name, header, rows)
+    return workbook_response(name, lambda out: gradebook.write_xlsx(book, out))
 
 # ────────────────────────────────────────────────────────────────
 # 2) Importar CSV de notas para un grupo
 #    GET: formulario mínimo (HTML inline)
-#    POST: espera un archivo CSV con columnas:
+#    POST: espera un archivo CSV o XLSX con columnas:
 #          student_username, assessment, points
-#    Intenta crear/actualizar Grade por (student, assessment).
+#    El archivo se encola (jobs.py) y se redirige a su estado; el worker
+#    crea/actualiza Grade por (student, assessment) por bloques.
+#    Con dry_run=1 solo se valida (grade_validation.py): sin errores
+#    vuelve al formulario, con errores descarga el reporte por fila.
 # ────────────────────────────────────────────────────────────────
+def _dry_run(request, group, upload):
+    rejected = reject_upload(request, "grades", upload, {"group_id": group.pk})
+    if rejected is not None:
+        return rejected
+    result = grade_validation.validate_upload(group, upload.file)
+    if not result["invalid"]:
+        messages.success(request, f"Validación sin errores: {result['rows']} filas listas para importar.")
+        return redirect(request.path)
+    header, rows = grade_validation.report_rows(result)
+    resp = csv_response(f"validacion_grupo_{group.pk}.csv", header, rows)
+    resp["X-Rows-Total"] = str(result["rows"])
+    resp["X-Rows-Invalid"] = str(result["invalid"])
+    return resp
+
 @login_required
 @user_passes_test(is_teacher)
 def import_grades(request, group_id: int):
     group = _get_group_or_404(group_id)
 
     # Si faltan modelos, no rompemos: avisamos y devolvemos formulario
-    if request.method == "GET" or Grade is None or Assessment is None or User is None:
-        if Grade is None or Assessment is None or User is None:
+    if request.method == "GET" or Grade is None or Assessment is None:
+        if Grade is None or Assessment is None:
             msg = (
-                "<p><strong>Advertencia:</strong> Los modelos necesarios (Grade/Assessment/User) "
+                "<p><strong>Advertencia:</strong> Los modelos necesarios (Grade/Assessment) "
                 "no están disponibles aún. El formulario se muestra solo de referencia.</p>"
             )
         else:
@@ -131,10 +173,13 @@ def import_grades(request, group_id: int):
             <h1>Importar notas — Grupo {group_id}</h1>
             {msg}
             <form method="post" enctype="multipart/form-data">
-                <p><input type="file" name="file" accept=".csv" required></p>
-                <p><button type="submit">Subir CSV</button></p>
+                <input type="hidden" name="csrfmiddlewaretoken" value="{get_token(request)}">
+                <p><input type="file" name="file" accept=".csv,.xlsx" required></p>
+                <p><label><input type="checkbox" name="dry_run" value="1"> Solo validar (no guarda nada;
+                   descarga un reporte con las filas que tienen error)</label></p>
+                <p><button type="submit">Subir archivo</button></p>
             </form>
-            <p>Formato esperado (cabeceras obligatorias): <code>student_username,assessment,points</code></p>
+            <p>CSV o XLSX (primera hoja). Cabeceras obligatorias: <code>student_username,assessment,points</code></p>
             """,
             content_type="text/html",
         )
@@ -142,79 +187,12 @@ def import_grades(request, group_id: int):
     # POST real (con modelos disponibles)
     if request.method == "POST":
         if "file" not in request.FILES:
-            messages.error(request, "No enviaste archivo CSV.")
+            messages.error(request, "No enviaste archivo CSV o XLSX.")
             return redirect(request.path)
-
-        # Decodificar CSV (asumimos UTF-8; ajusta si usas otro encoding)
-        f = TextIOWrapper(request.FILES["file"].file, encoding="utf-8", newline="")
-        reader = csv.DictReader(f)
-
-        required = {"student_username", "assessment", "points"}
-        if not required.issubset({h.strip() for h in reader.fieldnames or []}):
-            messages.error(request, "CSV inválido: faltan cabeceras (student_username, assessment, points).")
-            return redirect(request.path)
-
-        created, updated, skipped = 0, 0, 0
-
-        for row in reader:
-            username = (row.get("student_username") or "").strip()
-            assess_label = (row.get("assessment") or "").strip()
-            points_raw = (row.get("points") or "").strip()
-
-            if not username or not assess_label:
-                skipped += 1
-                continue
-
-            # Buscar usuario
-            student = User.objects.filter(username=username).first()
-            if not student:
-                skipped += 1
-                continue
-
-            # Buscar assessment por label y group
-            assess = _find_assessment_by_group_and_label(group, assess_label)
-            if not assess:
-                skipped += 1
-                continue
-
-            # Preparar kwargs flexibles para Grade: score o value
-            kwargs = {"student": student, "assessment": assess}
-            try:
-                # crear o actualizar
-                g, was_created = Grade.objects.get_or_create(**kwargs)
-                # setear puntos
-                if hasattr(g, "score"):
-                    g.score = _parse_points(points_raw)
-                elif hasattr(g, "value"):
-                    g.value = _parse_points(points_raw)
-                g.save()
-                created += int(was_created)
-                updated += int(not was_created)
-            except Exception:
-                skipped += 1
-                continue
-
-        messages.success(
-            request,
-            f"Importación terminada. Nuevas: {created}, Actualizadas: {updated}, Omitidas: {skipped}.",
-        )
-        return redirect(request.path)
+        if request.POST.get("dry_run"):
+            return _dry_run(request, group, request.FILES["file"])
+        # Se valida la cabecera aquí; las filas las procesa run_import_worker
+        return enqueue_upload(request, "grades", request.FILES["file"], group_id=group.pk)
 
     # Método no permitido
     return HttpResponse(status=405)
-
-# ────────────────────────────────────────────────────────────────
-# Utilidades
-# ────────────────────────────────────────────────────────────────
-def _parse_points(s: str):
-    """Convierte el valor de 'points' a número (float / int). Si falla, deja en blanco."""
-    if s is None:
-        return None
-    s = s.strip().replace(",", ".")
-    try:
-        # intenta int si parece entero
-        if s.isdigit() or (s.startswith("-") and s[1:].isdigit()):
-            return int(s)
-        return float(s)
-    except Exception:
-        return None
@@ -2,10 +2,15 @@
 from __future__ import annotations
 
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
 from django.contrib import messages
+from django.middleware.csrf import get_token
 from django.shortcuts import redirect
-from django.apps import apps
+from django.urls import reverse
+from django.utils.html import escape
+from . import grade_history, jobs
+from .exports import csv_response
+from .registry import registry
 
 # ────────────────────────────────────────────────────────────────
 # Helpers
@@ -17,66 +22,143 @@ def is_staff(user) -> bool:
 
 def _gm(app_label: str, model_name: str):
     """get_model tolerante: None si no existe el modelo todavía."""
-    try:
-        return apps.get_model(app_label, model_name)
-    except LookupError:
-        return None
+    return registry.model(app_label, model_name)
 
 # Carga opcional de modelos (no son obligatorios para que el módulo importe)
 User = _gm("auth", "User")
 Enrollment = _gm("academics", "Enrollment")
 CourseGroup = _gm("academics", "CourseGroup")
+ImportJob = _gm("academics", "ImportJob")
+
+def upload_form(request, title: str, columns: str, field: str = "file") -> HttpResponse:
+    """Formulario mínimo de carga (HTML inline, con token CSRF)."""
+    return HttpResponse(
+        f"""
+        <h1>{escape(title)}</h1>
+        <form method="post" enctype="multipart/form-data">
+            <input type="hidden" name="csrfmiddlewaretoken" value="{get_token(request)}">
+            <p><input type="file" name="{field}" accept=".csv,.xlsx" required></p>
+            <p><button type="submit">Subir archivo</button></p>
+        </form>
+        <p>CSV o XLSX (primera hoja) con columnas: <code>{escape(columns)}</code>. El archivo se procesa en segundo plano.</p>
+        """,
+        content_type="text/html",
+    )
+
+def reject_upload(request, kind: str, upload, params=None):
+    """Redirección al formulario con el error si el archivo no se puede leer o le faltan columnas; si no, None."""
+    try:
+        missing = jobs.missing_columns(kind, upload.file, params)
+    except jobs.JobError as exc:
+        messages.error(request, str(exc))
+        return redirect(request.path)
+    if missing:
+        messages.error(request, f"Archivo inválido: faltan cabeceras ({', '.join(missing)}).")
+        return redirect(request.path)
+    return None
+
+def enqueue_upload(request, kind: str, upload, **params):
+    """
+    Valida la cabecera del CSV/XLSX, encola el trabajo y redirige a su estado.
+    Si faltan columnas, vuelve al formulario con el error.
+    """
+    if ImportJob is None:
+        messages.error(request, "La cola de importaciones no está disponible.")
+        return redirect(request.path)
+    rejected = reject_upload(request, kind, upload, params)
+    if rejected is not None:
+        return rejected
+    job = jobs.enqueue(kind, upload, request.user, **params)
+    messages.success(request, f"Importación #{job.pk} en cola.")
+    return redirect("academics:import_job_status", pk=job.pk)
 
 # ────────────────────────────────────────────────────────────────
-# Importar estudiantes (placeholder funcional)
+# Importar estudiantes
+#    POST: CSV/XLSX username[,first_name,last_name,email] → cola (jobs.py)
 # ────────────────────────────────────────────────────────────────
 
 @login_required
 @user_passes_test(is_staff)
 def import_students(request):
-    """
-    Placeholder seguro para importación de estudiantes.
-    - No requiere templates.
-    - No truena si faltan modelos.
-    - Para POST: simplemente confirma recepción del archivo.
-    """
     if request.method == "POST":
-        if request.FILES:
-            messages.success(request, "Archivo recibido. (Procesamiento pendiente)")
-        else:
-            messages.warning(request, "No se envió archivo. (Envía un CSV en multipart/form-data)")
-        return redirect(request.path)
-
-    # GET simple (sin template)
-    return HttpResponse(
-        "<h1>Importar estudiantes</h1>"
-        "<p>Endpoint operativo. Envía un POST con archivo CSV (multipart/form-data).</p>",
-        content_type="text/html",
-    )
+        if "file" not in request.FILES:
+            messages.warning(request, "No se envió archivo. (Envía un CSV o XLSX en multipart/form-data)")
+            return redirect(request.path)
+        return enqueue_upload(request, "students", request.FILES["file"])
+    return upload_form(request, "Importar estudiantes", "username,first_name,last_name,email")
 
 # ────────────────────────────────────────────────────────────────
-# Importar matrículas (placeholder funcional)
+# Importar matrículas
+#    POST: CSV/XLSX student_username,course_code,section → cola (jobs.py)
+#    Grupos del término actual; no controla cupo (como el admin).
 # ────────────────────────────────────────────────────────────────
 
 @login_required
 @user_passes_test(is_staff)
 def import_enrollments(request):
-    """
-    Placeholder seguro para importación de matrículas.
-    - No requiere templates.
-    - No truena si faltan modelos (Enrollment/CourseGroup pueden ser None).
-    """
     if request.method == "POST":
-        if request.FILES:
-            # Aquí iría tu parsing CSV real; por ahora solo confirmamos recepción
-            messages.success(request, "Archivo de matrículas recibido. (Procesamiento pendiente)")
-        else:
-            messages.warning(request, "No se envió archivo. (Envía un CSV en multipart/form-data)")
-        return redirect(request.path)
+        if "file" not in request.FILES:
+            messages.warning(request, "No se envió archivo. (Envía un CSV o XLSX en multipart/form-data)")
+            return redirect(request.path)
+        return enqueue_upload(request, "enrollments", request.FILES["file"])
+    return upload_form(request, "Importar matrículas", "student_username,course_code,section")
+
+# ────────────────────────────────────────────────────────────────
+# Estado de una importación en cola
+#    GET /academics/imports/<id>/         (HTML; se recarga mientras corre)
+#    GET /academics/imports/<id>/?format=json
+#    GET /academics/imports/<id>/errors.csv  (filas omitidas y su razón)
+#    GET /academics/imports/<id>/changes.csv (notas que cambió, del historial)
+# Solo quien la subió o staff.
+# ────────────────────────────────────────────────────────────────
+
+def _job_or_404(request, pk: int):
+    if ImportJob is None:
+        raise Http404("La cola de importaciones no está disponible.")
+    job = ImportJob.objects.filter(pk=pk).first()
+    if job is None or not (is_staff(request.user) or job.created_by_id == request.user.pk):
+        raise Http404("Importación no encontrada")
+    return job
+
+@login_required
+def import_job_status(request, pk: int):
+    job = _job_or_404(request, pk)
+    data = jobs.status(job)
+    errors_url = reverse("academics:import_job_errors", args=[job.pk]) if data["has_errors"] else None
+    if request.GET.get("format") == "json" or "application/json" in request.headers.get("Accept", ""):
+        data["error_file_url"] = request.build_absolute_uri(errors_url) if errors_url else None
+        return JsonResponse(data)
 
-    # GET simple (sin template)
+    running = job.status in {ImportJob.QUEUED, ImportJob.RUNNING}
+    refresh = '<meta http-equiv="refresh" content="2">' if running else ""
+    percent = f" ({data['percent']}%)" if data["percent"] is not None else ""
+    speed = f"{data['rows_per_second']} filas/s" if data["rows_per_second"] is not None else "—"
+    errors = f'<p><a href="{errors_url}">Descargar filas omitidas</a></p>' if errors_url else ""
+    if job.kind == ImportJob.GRADES and job.status == ImportJob.DONE:
+        errors += f'<p><a href="{reverse("academics:import_job_changes", args=[job.pk])}">Descargar notas cambiadas</a></p>'
     return HttpResponse(
-        "<h1>Importar matrículas</h1>"
-        "<p>Endpoint operativo. Envía un POST con archivo CSV (multipart/form-data).</p>",
+        f"""
+        {refresh}
+        <h1>Importación #{job.pk} — {escape(job.get_kind_display())}</h1>
+        <p>Estado: <strong>{escape(data["status_display"])}</strong></p>
+        <p>Filas: {data["rows_done"]} / {data["rows_total"]}{percent} · {speed}</p>
+        <p>Nuevas: {data["created"]}, Actualizadas: {data["updated"]}, Omitidas: {data["skipped"]}</p>
+        <p>{escape(job.message)}</p>
+        {errors}
+        """,
         content_type="text/html",
     )
+
+@login_required
+def import_job_errors(request, pk: int):
+    job = _job_or_404(request, pk)
+    if not job.error_file:
+        raise Http404("La importación no tiene filas omitidas")
+    return FileResponse(job.error_file.open("rb"), as_attachment=True, filename=f"importacion_{job.pk}_errores.csv")
+
+@login_required
+def import_job_changes(request, pk: int):
+    job = _job_or_404(request, pk)
+    if job.kind != ImportJob.GRADES:
+        raise Http404("Solo las importaciones de notas tienen historial")
+    return csv_response(f"importacion_{job.pk}_cambios.csv", grade_history.CHANGE_COLUMNS, grade_history.import_changes(job))
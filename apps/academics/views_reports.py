@@ -1,11 +1,11 @@
 # apps/academics/views_reports.py
 from __future__ import annotations
-import csv
-from io import StringIO
 
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.http import HttpResponse
-from django.apps import apps
+from django.http import Http404, HttpResponse
+from .exports import CHUNK_SIZE, ENROLLMENT_COLUMNS, enrollment_rows, table_response
+from .registry import registry
+from .term_cache import term_cache
 
 # ────────────────────────────────────────────────────────────────
 # Helpers
@@ -15,10 +15,7 @@ def is_staff(user) -> bool:
     return bool(getattr(user, "is_staff", False))
 
 def _gm(app_label: str, model_name: str):
-    try:
-        return apps.get_model(app_label, model_name)
-    except LookupError:
-        return None
+    return registry.model(app_label, model_name)
 
 CourseGroup = _gm("academics", "CourseGroup")
 Enrollment  = _gm("academics", "Enrollment")
@@ -26,7 +23,7 @@ Enrollment  = _gm("academics", "Enrollment")
 def _get_enrolled_count_field():
     """Si el modelo tiene un campo calculado/propiedad, la usamos; si no, contamos en vivo."""
     # Campo típico en algunos diseños
-    if CourseGroup and any(f.name == "enrolled_count" for f in CourseGroup._meta.get_fields()):
+    if CourseGroup and registry.has_field(CourseGroup, "enrolled_count"):
         return "enrolled_count"
     return None
 
@@ -55,16 +52,9 @@ def occupancy_report(request):
             enrolled = getattr(g, enrolled_field, "")
         else:
             # Fallback contando en vivo
-            if Enrollment:
-                # FK puede llamarse group o course_group
-                if any(f.name == "group" for f in Enrollment._meta.get_fields()):
-                    enrolled = Enrollment.objects.filter(group=g).count()
-                elif any(f.name == "course_group" for f in Enrollment._meta.get_fields()):
-                    enrolled = Enrollment.objects.filter(course_group=g).count()
-                else:
-                    enrolled = ""
-            else:
-                enrolled = ""
+            # FK puede llamarse group o course_group
+            fk = registry.group_fk(Enrollment)
+            enrolled = Enrollment.objects.filter(**{fk: g}).count() if fk else ""
 
         # available_slots (si existe) o calculado si capacity/enrolled son ints
         if hasattr(g, "available_slots"):
@@ -89,24 +79,15 @@ def occupancy_report(request):
     return HttpResponse("\n".join(html), content_type="text/html")
 
 # ────────────────────────────────────────────────────────────────
-# CSV
+# Exportaciones (CSV en streaming o XLSX write_only, ver exports.py)
+#    GET /academics/secretary/reports/occupancy.<csv|xlsx>
+#    GET /academics/secretary/reports/enrollments.<csv|xlsx>[?term=<id>]
 # ────────────────────────────────────────────────────────────────
-@login_required
-@user_passes_test(is_staff)
-def occupancy_csv(request):
-    if CourseGroup is None:
-        resp = HttpResponse("course_code,section,capacity,enrolled,available\n", content_type="text/csv")
-        resp["Content-Disposition"] = 'attachment; filename="occupancy.csv"'
-        return resp
+OCCUPANCY_COLUMNS = ["course_code", "section", "capacity", "enrolled", "available"]
 
-    qs = CourseGroup.objects.select_related("course").all().order_by("course__code", "section")
+def _occupancy_rows(qs):
     enrolled_field = _get_enrolled_count_field()
-
-    buffer = StringIO()
-    writer = csv.writer(buffer)
-    writer.writerow(["course_code", "section", "capacity", "enrolled", "available"])
-
-    for g in qs:
+    for g in qs.iterator(chunk_size=CHUNK_SIZE):
         course_code = getattr(getattr(g, "course", None), "code", "")
         section     = getattr(g, "section", "")
         capacity    = getattr(g, "capacity", "")
@@ -114,15 +95,8 @@ def occupancy_csv(request):
         if enrolled_field:
             enrolled = getattr(g, enrolled_field, "")
         else:
-            if Enrollment:
-                if any(f.name == "group" for f in Enrollment._meta.get_fields()):
-                    enrolled = Enrollment.objects.filter(group=g).count()
-                elif any(f.name == "course_group" for f in Enrollment._meta.get_fields()):
-                    enrolled = Enrollment.objects.filter(course_group=g).count()
-                else:
-                    enrolled = ""
-            else:
-                enrolled = ""
+            fk = registry.group_fk(Enrollment)
+            enrolled = Enrollment.objects.filter(**{fk: g}).count() if fk else ""
 
         if hasattr(g, "available_slots"):
             available = getattr(g, "available_slots")
@@ -132,8 +106,28 @@ def occupancy_csv(request):
             except Exception:
                 available = ""
 
-        writer.writerow([course_code, section, capacity, enrolled, available])
+        yield course_code, section, capacity, enrolled, available
 
-    resp = HttpResponse(buffer.getvalue(), content_type="text/csv")
-    resp["Content-Disposition"] = 'attachment; filename="occupancy.csv"'
-    return resp
+@login_required
+@user_passes_test(is_staff)
+def occupancy_csv(request, fmt: str = "csv"):
+    if CourseGroup is None:
+        return table_response(fmt, "occupancy", OCCUPANCY_COLUMNS, [], "ocupacion")
+    qs = CourseGroup.objects.select_related("course").all().order_by("course__code", "section")
+    return table_response(fmt, "occupancy", OCCUPANCY_COLUMNS, _occupancy_rows(qs), "ocupacion")
+
+@login_required
+@user_passes_test(is_staff)
+def enrollments_export(request, fmt: str = "csv"):
+    if CourseGroup is None or Enrollment is None or fmt not in {"csv", "xlsx"}:
+        raise Http404("Matrículas no disponibles")
+    groups = CourseGroup.objects.all()
+    name = "matriculas"
+    if registry.has_field(CourseGroup, "term"):
+        term_id = request.GET.get("term") or getattr(term_cache.current_term(), "pk", None)
+        if not str(term_id or "").isdigit():
+            raise Http404("Término no encontrado")
+        groups = groups.filter(term_id=term_id)
+        name = f"matriculas_termino_{term_id}"
+    group_ids = groups.order_by("course__code", "section").values_list("pk", flat=True)
+    return table_response(fmt, name, ENROLLMENT_COLUMNS, enrollment_rows(group_ids), "matriculas")
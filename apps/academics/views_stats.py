@@ -4,7 +4,8 @@ from collections import Counter
 
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.http import HttpResponse, Http404
-from django.apps import apps
+from .final_grades import group_average
+from .registry import registry
 
 # ────────────────────────────────────────────────────────────────
 # Helpers
@@ -16,18 +17,10 @@ def is_teacher(user) -> bool:
     return bool(getattr(user, "is_staff", False))
 
 def _gm(app_label: str, model_name: str):
-    try:
-        return apps.get_model(app_label, model_name)
-    except LookupError:
-        return None
+    return registry.model(app_label, model_name)
 
 def _has_field(Model, name: str) -> bool:
-    if Model is None:
-        return False
-    try:
-        return any(f.name == name for f in Model._meta.get_fields())
-    except Exception:
-        return False
+    return registry.has_field(Model, name)
 
 def _get_group_or_404(group_id: int):
     CG = _gm("academics", "CourseGroup")
@@ -51,32 +44,32 @@ User              = _gm("auth", "User")
 # ────────────────────────────────────────────────────────────────
 
 def _enrolled_count_for_group(group) -> int:
-    if Enrollment is None:
-        return 0
+    # Contador denormalizado (ver services_capacity); sin consulta extra
+    if _has_field(CourseGroup, "enrolled_count"):
+        return group.enrolled_count
     # FK puede llamarse group o course_group
-    if _has_field(Enrollment, "group"):
-        return Enrollment.objects.filter(group=group).count()
-    if _has_field(Enrollment, "course_group"):
-        return Enrollment.objects.filter(course_group=group).count()
-    return 0
+    fk = registry.group_fk(Enrollment)
+    if fk is None:
+        return 0
+    return Enrollment.objects.filter(**{fk: group}).count()
 
 def _grades_for_group(group):
     """Devuelve lista de puntos (float/int) y etiquetas de evaluación para el grupo."""
     if Grade is None or Assessment is None:
         return []
 
-    # Grades relacionados a assessments del grupo
-    qs = Grade.objects.select_related("assessment").filter(
+    # score o value, resuelto una vez en el registro
+    points_field = registry.points_field(Grade)
+    if points_field is None:
+        return []
+
+    # Grades relacionados a assessments del grupo (solo la columna de puntos)
+    qs = Grade.objects.filter(
         **({"assessment__course_group": group} if _has_field(Assessment, "course_group") else {})
-    )
+    ).values_list(points_field, flat=True)
 
     pts = []
-    for g in qs:
-        p = None
-        if hasattr(g, "score"):
-            p = g.score
-        elif hasattr(g, "value"):
-            p = g.value
+    for p in qs:
         if p is not None:
             try:
                 pts.append(float(p))
@@ -95,12 +88,10 @@ def _attendance_stats_for_group(group):
         return (0, 0)
 
     # filtro base por grupo (según FK real)
-    if _has_field(AttendanceRecord, "group"):
-        base = AttendanceRecord.objects.filter(group=group)
-    elif _has_field(AttendanceRecord, "course_group"):
-        base = AttendanceRecord.objects.filter(course_group=group)
-    else:
+    fk = registry.group_fk(AttendanceRecord)
+    if fk is None:
         return (0, 0)
+    base = AttendanceRecord.objects.filter(**{fk: group})
 
     total = base.count()
     if total == 0:
@@ -158,6 +149,7 @@ def group_stats_view(request, group_id: int):
     avg = round(sum(points) / grade_count, 2) if grade_count else None
     mx  = round(max(points), 2) if grade_count else None
     mn  = round(min(points), 2) if grade_count else None
+    overall = group_average(group)  # promedio de FinalGrade (0-20)
 
     # Distribución simple por decenas (0–10, 10–20, ... 90–100)
     buckets = Counter()
@@ -177,6 +169,7 @@ def group_stats_view(request, group_id: int):
         f"<li><strong>Matriculados:</strong> {enrolled}</li>",
         f"<li><strong>Registros de asistencia:</strong> {att_total} " + (f"(presentes: {att_present}, tasa: {att_rate:.1f}%)" if att_total else "(N/D)") + "</li>",
         f"<li><strong>Notas cargadas:</strong> {grade_count} " + (f"(prom.: {avg}, máx.: {mx}, mín.: {mn})" if grade_count else "(N/D)") + "</li>",
+        f"<li><strong>Promedio final del grupo:</strong> {overall if overall is not None else 'N/D'}</li>",
         "</ul>",
         "<h2>Distribución de notas (por decenas)</h2>",
         "<table border='1' cellpadding='4' cellspacing='0'>",
@@ -0,0 +1,254 @@
+# apps/academics/waiting_room.py
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils import timezone
+
+# ────────────────────────────────────────────────────────────────
+# Sala de espera para el día de matrícula
+#
+# Solo WAITING_ROOM_MAX_ACTIVE sesiones pueden usar a la vez las vistas
+# decoradas con @admission_required. El resto recibe su posición en una
+# cola FIFO y consulta `waiting_room_status` hasta ser admitido. Una sesión
+# admitida libera su lugar tras WAITING_ROOM_ACTIVE_TTL segundos sin
+# actividad; una sesión en cola que deja de consultar sale tras
+# WAITING_ROOM_QUEUE_TTL segundos.
+#
+# Backends:
+#   "local" → memoria del proceso (un solo worker / desarrollo)
+#   "db"    → tabla AdmissionTicket (varios workers, sin broker externo).
+#             Las admisiones se serializan con SELECT ... FOR UPDATE sobre
+#             una fila fija de la tabla (el "torniquete"): dos workers no
+#             ven los mismos lugares libres. Las colas vencidas se limpian
+#             a lo más cada EXPIRE_EVERY segundos por proceso.
+# ────────────────────────────────────────────────────────────────
+RATE_WINDOW = 60  # segundos usados para medir el ritmo de admisión
+
+
+def _conf(name: str, default):
+    return getattr(settings, f"WAITING_ROOM_{name}", default)
+
+
+class LocalStore:
+    """Cola en memoria protegida con un lock; válida para un solo proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active: dict[str, float] = {}
+        self._queue: OrderedDict[str, float] = OrderedDict()
+        self._admissions: deque[float] = deque()
+
+    def _expire(self, now: float, active_ttl: int, queue_ttl: int):
+        for key in [k for k, seen in self._active.items() if seen < now - active_ttl]:
+            del self._active[key]
+        for key in [k for k, seen in self._queue.items() if seen < now - queue_ttl]:
+            del self._queue[key]
+        while self._admissions and self._admissions[0] < now - RATE_WINDOW:
+            self._admissions.popleft()
+
+    def check(self, key: str, max_active: int, active_ttl: int, queue_ttl: int) -> int:
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now, active_ttl, queue_ttl)
+            if key in self._active:
+                self._active[key] = now
+                return 0
+            self._queue[key] = now  # las claves existentes conservan su lugar
+            while self._queue and len(self._active) < max_active:
+                head, _ = self._queue.popitem(last=False)
+                self._active[head] = now
+                self._admissions.append(now)
+            if key in self._active:
+                return 0
+            for pos, k in enumerate(self._queue, start=1):
+                if k == key:
+                    return pos
+            return 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire(time.monotonic(), _conf("ACTIVE_TTL", 300), _conf("QUEUE_TTL", 60))
+            return {
+                "active": len(self._active),
+                "depth": len(self._queue),
+                "admitted_last_window": len(self._admissions),
+            }
+
+
+class DbStore:
+    """Cola en la tabla AdmissionTicket; compartida por todos los workers."""
+
+    # No reescribimos last_seen de una sesión admitida en cada petición
+    TOUCH_EVERY = 15
+    # Barrido de turnos vencidos: a lo más uno cada tantos segundos por proceso
+    EXPIRE_EVERY = 5
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_expire = 0.0
+
+    def _model(self):
+        from .models import AdmissionTicket
+        return AdmissionTicket
+
+    def _expire(self, T, now, active_ttl: int, queue_ttl: int):
+        with self._lock:
+            tick = time.monotonic()
+            if tick < self._next_expire:
+                return
+            self._next_expire = tick + self.EXPIRE_EVERY
+        T.objects.filter(state=T.ACTIVE, last_seen__lt=now - timedelta(seconds=active_ttl)).delete()
+        T.objects.filter(state=T.WAITING, last_seen__lt=now - timedelta(seconds=queue_ttl)).delete()
+
+    def _lock_gate(self, T):
+        """Bloquea la fila del torniquete (la crea la primera vez). Dentro de una transacción."""
+        def lock():
+            return list(T.objects.select_for_update().filter(session_key=T.GATE_KEY).values_list("pk", flat=True))
+
+        if lock():
+            return
+        try:
+            with transaction.atomic():
+                T.objects.create(session_key=T.GATE_KEY, state=T.GATE, enqueued_at=timezone.now(), last_seen=timezone.now())
+        except IntegrityError:
+            lock()  # la creó otro worker: se espera su turno
+
+    def _admit(self, T, now, max_active: int):
+        # Sala llena (lo normal en plena carga): no hace falta el torniquete
+        if T.objects.filter(state=T.ACTIVE).count() >= max_active:
+            return
+        self._lock_gate(T)
+        free = max_active - T.objects.filter(state=T.ACTIVE).count()
+        if free <= 0:
+            return
+        head = list(
+            T.objects.filter(state=T.WAITING)
+            .order_by("enqueued_at", "pk")
+            .values_list("pk", flat=True)[:free]
+        )
+        T.objects.filter(pk__in=head, state=T.WAITING).update(
+            state=T.ACTIVE, admitted_at=now, last_seen=now
+        )
+
+    def check(self, key: str, max_active: int, active_ttl: int, queue_ttl: int) -> int:
+        T = self._model()
+        now = timezone.now()
+        ticket = T.objects.filter(session_key=key).first()
+        if ticket and ticket.state == T.ACTIVE and ticket.last_seen >= now - timedelta(seconds=active_ttl):
+            if ticket.last_seen < now - timedelta(seconds=self.TOUCH_EVERY):
+                T.objects.filter(pk=ticket.pk).update(last_seen=now)
+            return 0
+
+        with transaction.atomic():
+            if ticket is not None and ticket.state == T.WAITING:
+                T.objects.filter(pk=ticket.pk).update(last_seen=now)
+            else:
+                # nuevo, o admitido que expiró: entra al final de la cola
+                T.objects.filter(session_key=key).delete()
+                try:
+                    with transaction.atomic():
+                        ticket = T.objects.create(session_key=key, enqueued_at=now, last_seen=now)
+                except IntegrityError:
+                    ticket = T.objects.get(session_key=key)
+            self._expire(T, now, active_ttl, queue_ttl)
+            self._admit(T, now, max_active)
+
+        state = T.objects.filter(pk=ticket.pk).values_list("state", flat=True).first()
+        if state != T.WAITING:
+            return 0
+        ahead = T.objects.filter(state=T.WAITING, enqueued_at__lt=ticket.enqueued_at).count()
+        ahead += T.objects.filter(state=T.WAITING, enqueued_at=ticket.enqueued_at, pk__lt=ticket.pk).count()
+        return ahead + 1
+
+    def stats(self) -> dict:
+        T = self._model()
+        since = timezone.now() - timedelta(seconds=RATE_WINDOW)
+        return {
+            "active": T.objects.filter(state=T.ACTIVE).count(),
+            "depth": T.objects.filter(state=T.WAITING).count(),
+            "admitted_last_window": T.objects.filter(admitted_at__gte=since).count(),
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = DbStore() if _conf("BACKEND", "local") == "db" else LocalStore()
+        return _store
+
+
+def _session_key(request) -> str:
+    if request.session.session_key is None:
+        request.session.save()
+    return request.session.session_key
+
+
+def check_admission(request) -> int:
+    """0 si la sesión está admitida; si no, su posición (1 = siguiente)."""
+    return get_store().check(
+        _session_key(request),
+        max_active=_conf("MAX_ACTIVE", 300),
+        active_ttl=_conf("ACTIVE_TTL", 300),
+        queue_ttl=_conf("QUEUE_TTL", 60),
+    )
+
+
+def room_stats() -> dict:
+    data = get_store().stats()
+    data.update(
+        backend=_conf("BACKEND", "local"),
+        max_active=_conf("MAX_ACTIVE", 300),
+        admit_rate_per_min=round(data["admitted_last_window"] * 60 / RATE_WINDOW, 1),
+    )
+    return data
+
+
+def _waiting_response(request, position: int) -> HttpResponse:
+    status_url = reverse("academics:waiting_room_status")
+    html = f"""
+    <h1>Sala de espera</h1>
+    <p>Hay mucha demanda en este momento. Tu posición en la cola: <strong id="pos">{position}</strong></p>
+    <p>Esta página se actualizará sola cuando sea tu turno; no la recargues.</p>
+    <script>
+    (function poll() {{
+        fetch("{status_url}", {{credentials: "same-origin"}})
+            .then(r => r.json())
+            .then(d => {{
+                if (d.admitted) {{ window.location.reload(); return; }}
+                document.getElementById("pos").textContent = d.position;
+                setTimeout(poll, 5000);
+            }})
+            .catch(() => setTimeout(poll, 10000));
+    }})();
+    </script>
+    """
+    resp = HttpResponse(html, content_type="text/html", status=503)
+    resp["Retry-After"] = "5"
+    return resp
+
+
+def admission_required(view):
+    """Deja pasar solo a sesiones admitidas cuando WAITING_ROOM_ENABLED está activo."""
+    @wraps(view)
+    def _wrapped(request, *args, **kwargs):
+        if not _conf("ENABLED", False):
+            return view(request, *args, **kwargs)
+        position = check_admission(request)
+        if position:
+            return _waiting_response(request, position)
+        return view(request, *args, **kwargs)
+    return _wrapped
@@ -5,14 +5,11 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.http import HttpResponse, Http404
 from django.contrib import messages
 from django.shortcuts import redirect
-from django.apps import apps
+from apps.academics.registry import registry
 
 # ── helpers ─────────────────────────────────────────────────────
 def _gm(app_label: str, model_name: str):
-    try:
-        return apps.get_model(app_label, model_name)
-    except LookupError:
-        return None
+    return registry.model(app_label, model_name)
 
 def is_student(user) -> bool:
     # Ajusta a tu esquema real de roles. Mientras, acepta usuarios logueados.
@@ -78,19 +75,19 @@ def checkin_form(request, session_id: int):
         # Crear registro de asistencia tolerante a campos
         ar = AttendanceRecord()
         # FKs tolerantes según cómo se llamen
-        if any(f.name == "session" for f in AttendanceRecord._meta.get_fields()):
+        if registry.has_field(AttendanceRecord, "session"):
             setattr(ar, "session", ses)
-        if any(f.name == "group" for f in AttendanceRecord._meta.get_fields()) and getattr(ses, "group_id", None):
+        if registry.has_field(AttendanceRecord, "group") and getattr(ses, "group_id", None):
             setattr(ar, "group", getattr(ses, "group"))
-        if any(f.name == "course_group" for f in AttendanceRecord._meta.get_fields()) and getattr(ses, "course_group_id", None):
+        if registry.has_field(AttendanceRecord, "course_group") and getattr(ses, "course_group_id", None):
             setattr(ar, "course_group", getattr(ses, "course_group"))
         # alumno actual
-        if any(f.name == "student" for f in AttendanceRecord._meta.get_fields()):
+        if registry.has_field(AttendanceRecord, "student"):
             setattr(ar, "student", request.user)
         # status / present
-        if any(f.name == "status" for f in AttendanceRecord._meta.get_fields()):
+        if registry.has_field(AttendanceRecord, "status"):
             setattr(ar, "status", status)
-        if any(f.name == "present" for f in AttendanceRecord._meta.get_fields()):
+        if registry.has_field(AttendanceRecord, "present"):
             setattr(ar, "present", status in {"present", "Present", "P", "p", "true", "True", "1"})
         # timestamp si existe se deja que auto_now_add lo maneje; si no, ignoramos
 
@@ -4,21 +4,13 @@ from datetime import date
 
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.http import HttpResponse
-from django.apps import apps
+from apps.academics.registry import registry
 
 def _gm(app_label: str, model_name: str):
-    try:
-        return apps.get_model(app_label, model_name)
-    except LookupError:
-        return None
+    return registry.model(app_label, model_name)
 
 def _has_field(Model, name: str) -> bool:
-    if Model is None:
-        return False
-    try:
-        return any(f.name == name for f in Model._meta.get_fields())
-    except Exception:
-        return False
+    return registry.has_field(Model, name)
 
 def is_teacher(user) -> bool:
     return bool(getattr(user, "is_staff", False) or getattr(user, "is_superuser", False))
@@ -16,6 +16,17 @@ env = environ.Env(
     ALLOWED_HOSTS=(str, "127.0.0.1,localhost"),
     LANGUAGE_CODE=(str, "es"),
     TIME_ZONE=(str, "America/Lima"),
+    CACHE_URL=(str, "locmemcache://"),
+    WAITING_ROOM_ENABLED=(bool, False),
+    WAITING_ROOM_BACKEND=(str, "local"),
+    WAITING_ROOM_MAX_ACTIVE=(int, 300),
+    WAITING_ROOM_ACTIVE_TTL=(int, 300),
+    WAITING_ROOM_QUEUE_TTL=(int, 60),
+    IDEMPOTENCY_BACKEND=(str, "cache"),
+    AUDIT_SYNC=(bool, False),
+    AUDIT_BUFFER_SIZE=(int, 200),
+    AUDIT_FLUSH_INTERVAL=(float, 2.0),
+    IMPORT_JOBS_SYNC=(bool, False),
 )
 environ.Env.read_env(os.path.join(BASE_DIR, ".env"))
 
@@ -44,6 +55,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "apps.academics.middleware.GradeHistoryMiddleware",  # autor de los cambios de nota
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -83,6 +95,10 @@ DATABASES = {
     }
 }
 
+# Caché compartida. Con varios workers usa una compartida, p. ej.
+# CACHE_URL=dbcache://sisacad_cache (requiere `manage.py createcachetable`)
+CACHES = {"default": env.cache("CACHE_URL")}
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
@@ -97,9 +113,48 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 STATICFILES_DIRS = [BASE_DIR / "static"]
+# Archivos subidos (importaciones en cola y sus reportes de errores); no se
+# publican: se descargan por vistas con permisos
+MEDIA_ROOT = BASE_DIR / "media"
+MEDIA_URL = "media/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "users.User"
 LOGIN_URL = "/admin/login/"
 LOGIN_REDIRECT_URL = "/"
 LOGOUT_REDIRECT_URL = "/"
+
+# Sala de espera del día de matrícula (apps/academics/waiting_room.py)
+# BACKEND: "local" (memoria del proceso) o "db" (compartido entre workers)
+WAITING_ROOM_ENABLED = env("WAITING_ROOM_ENABLED")
+WAITING_ROOM_BACKEND = env("WAITING_ROOM_BACKEND")
+WAITING_ROOM_MAX_ACTIVE = env("WAITING_ROOM_MAX_ACTIVE")
+WAITING_ROOM_ACTIVE_TTL = env("WAITING_ROOM_ACTIVE_TTL")
+WAITING_ROOM_QUEUE_TTL = env("WAITING_ROOM_QUEUE_TTL")
+
+# Idempotencia de POST de matrícula (apps/academics/idempotency.py)
+# BACKEND: "cache" (caché de Django) o "db" (tabla IdempotencyRecord)
+IDEMPOTENCY_BACKEND = env("IDEMPOTENCY_BACKEND")
+IDEMPOTENCY_TTL = 600   # segundos que se guarda el resultado
+IDEMPOTENCY_WAIT = 5    # segundos que un reintento espera a la primera petición
+
+# Auditoría de intentos de matrícula (apps/academics/audit.py)
+# SYNC=True escribe cada intento en el acto (tests); si no, búfer por proceso
+AUDIT_SYNC = env("AUDIT_SYNC")
+AUDIT_BUFFER_SIZE = env("AUDIT_BUFFER_SIZE")
+AUDIT_FLUSH_INTERVAL = env("AUDIT_FLUSH_INTERVAL")
+
+# Importaciones en segundo plano (apps/academics/jobs.py, run_import_worker)
+# SYNC=True procesa el archivo en la misma petición (tests, desarrollo)
+IMPORT_JOBS_SYNC = env("IMPORT_JOBS_SYNC")
+IMPORT_JOBS_STALE = 300       # segundos sin heartbeat para dar por muerto al worker
+IMPORT_JOBS_MAX_ATTEMPTS = 3  # intentos antes de marcar el trabajo como fallido
+
+# Grupos calientes (services_capacity.shard_group): fragmentos de cupo por grupo
+SEAT_SHARD_COUNT = 8
+
+# Elegibilidad (apps/academics/eligibility.py): nota mínima aprobatoria (escala 0-20)
+ELIGIBILITY_PASSING_GRADE = 10.5
+
+# Caché de término/reglas: segundos entre comprobaciones del sello de versión
+TERM_CACHE_RECHECK = 2